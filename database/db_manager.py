@@ -2,8 +2,11 @@ import mysql.connector
 from datetime import datetime
 import bcrypt
 import os
+import time
 from dotenv import load_dotenv
 import json
+from utils.blob_store import BlobStore
+from utils.user_index import UserSearchIndex
 
 # Load environment variables
 load_dotenv()
@@ -17,15 +20,38 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME'),
     'port': int(os.getenv('DB_PORT', 3306))
 }
+# Optional compression of compressible uploads: 'zlib' or 'lzma', empty stores files as they are
+UPLOAD_COMPRESSION = os.getenv('UPLOAD_COMPRESSION') or None
 
 class DatabaseManager:
-    def __init__(self):
-        """Initialize database connection."""
+    CHAT_HOT_MONTHS = 3  # Months of chat history kept in chat_messages (current month included)
+    CHAT_ARCHIVE_BATCH = 500  # Messages moved to the archive per transaction
+    MAX_MESSAGE_ID = 2147483647
+    FILE_ACCESS_FLUSH_INTERVAL = 60  # Seconds file opens are collected before last_accessed is written
+    DEFAULT_STORAGE_QUOTA = 20 * 1024 ** 3  # Bytes per user unless user_storage.quota_bytes is set
+    TRASH_RETENTION_DAYS = 30  # Trashed files are purged after this many days
+    TRASH_PURGE_BATCH = 200  # Files deleted per purge transaction
+    # Optional keys of add_file/add_files; stored_size and compression describe the blob on disk
+    FILE_DEFAULTS = {'blob_hash': None, 'stored_size': None, 'compression': None, 'folder_id': None}
+    INSERT_FILE = """
+        INSERT INTO files (name, path, size, type, user_id, uploaded_at, blob_hash, stored_size, compression,
+                           folder_id)
+        VALUES (%(name)s, %(path)s, %(size)s, %(type)s, %(user_id)s, %(uploaded_at)s, %(blob_hash)s,
+                %(stored_size)s, %(compression)s, %(folder_id)s)
+    """
+
+    def __init__(self, init_tables=True):
+        """Initialize database connection. Worker connections can skip the table setup."""
+        self.user_index = None
+        self.blob_store = None
+        self.pending_file_access = {}  # file id -> time of the last open, see record_file_access
+        self.file_access_flushed = time.monotonic()
         try:
             self.connection = mysql.connector.connect(**DB_CONFIG)
             self.cursor = self.connection.cursor(dictionary=True)
             print("Successfully connected to MariaDB")
-            self._init_tables()
+            if init_tables:
+                self._init_tables()
         except Exception as e:
             print(f"Database connection error: {e}")
             raise Exception(f"Failed to connect to MariaDB: {e}")
@@ -94,6 +120,113 @@ class DatabaseManager:
                 )
             """)
 
+            # Content addressed file contents, shared by all files rows with the same hash
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS file_blobs (
+                    hash CHAR(64) PRIMARY KEY,
+                    size BIGINT NOT NULL,
+                    ref_count INT NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_file_blobs_size (size)
+                )
+            """)
+            self.cursor.execute("""
+                ALTER TABLE files
+                ADD COLUMN IF NOT EXISTS blob_hash CHAR(64) NULL
+            """)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_blob_hash
+                ON files (blob_hash)
+            """)
+            # Transparent compression: size stays the logical size, stored_size is on disk
+            for table in ('files', 'file_blobs'):
+                self.cursor.execute(f"""
+                    ALTER TABLE {table}
+                    ADD COLUMN IF NOT EXISTS stored_size BIGINT NULL,
+                    ADD COLUMN IF NOT EXISTS compression VARCHAR(10) NULL
+                """)
+            # Views of the file manager: drive and trash by upload time, recent by access time
+            self.cursor.execute("""
+                ALTER TABLE files
+                ADD COLUMN IF NOT EXISTS last_accessed TIMESTAMP NULL
+            """)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_user_trash
+                ON files (user_id, in_trash, uploaded_at)
+            """)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_user_accessed
+                ON files (user_id, last_accessed)
+            """)
+            # Trash purge: expired trash in deletion order
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_trash_deleted
+                ON files (in_trash, deleted_at)
+            """)
+            # Path lookups of the upload reconciliation (prefix, the column is too long for a full index)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_path
+                ON files (path(255))
+            """)
+            # Folders as a materialized path of ids ('/3/17/42/'), so a subtree is one
+            # index range: path LIKE '/3/17/%'
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS folders (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    user_id INT NOT NULL,
+                    parent_id INT NULL,
+                    name VARCHAR(255) NOT NULL,
+                    path VARCHAR(1000) CHARACTER SET ascii NOT NULL DEFAULT '',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    in_trash BOOLEAN DEFAULT FALSE,
+                    deleted_at TIMESTAMP NULL,
+                    INDEX idx_folders_parent (user_id, parent_id, in_trash, name),
+                    INDEX idx_folders_path (user_id, path),
+                    INDEX idx_folders_trash_deleted (in_trash, deleted_at),
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                    FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE
+                )
+            """)
+            self.cursor.execute("""
+                ALTER TABLE files
+                ADD COLUMN IF NOT EXISTS folder_id INT NULL
+            """)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_folder
+                ON files (user_id, folder_id, in_trash, uploaded_at)
+            """)
+            self.cursor.execute("""
+                ALTER TABLE files
+                ADD CONSTRAINT fk_files_folder FOREIGN KEY IF NOT EXISTS (folder_id)
+                REFERENCES folders(id) ON DELETE SET NULL
+            """)
+            # Versions: the files row is the current version, earlier ones live in
+            # file_versions and keep their blob referenced
+            self.cursor.execute("""
+                ALTER TABLE files
+                ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1
+            """)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_name
+                ON files (user_id, folder_id, name)
+            """)
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS file_versions (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    file_id INT NOT NULL,
+                    version INT NOT NULL,
+                    blob_hash CHAR(64) NULL,
+                    path VARCHAR(1024),
+                    size BIGINT,
+                    stored_size BIGINT NULL,
+                    compression VARCHAR(10) NULL,
+                    uploaded_at TIMESTAMP NULL,
+                    UNIQUE KEY uq_file_versions (file_id, version),
+                    INDEX idx_file_versions_path (path(255)),
+                    FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE
+                )
+            """)
+
             # File favorites table
             self.cursor.execute("""
                 CREATE TABLE IF NOT EXISTS file_favorites (
@@ -104,6 +237,23 @@ class DatabaseManager:
                     FOREIGN KEY (user_id) REFERENCES users(id)
                 )
             """)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_file_favorites_user
+                ON file_favorites (user_id, file_id)
+            """)
+
+            # Storage usage per user, kept up to date with every files change
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_storage (
+                    user_id INT PRIMARY KEY,
+                    used_bytes BIGINT NOT NULL DEFAULT 0,
+                    trash_bytes BIGINT NOT NULL DEFAULT 0,
+                    file_count INT NOT NULL DEFAULT 0,
+                    quota_bytes BIGINT NULL,
+                    reconciled_at TIMESTAMP NULL,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            """)
 
             # Todos table
             self.cursor.execute("""
@@ -146,6 +296,55 @@ class DatabaseManager:
                 )
             """)
 
+            # Project members: creators, todo assignees and users added explicitly
+            self.cursor.execute("""
+                SELECT COUNT(*) as count
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'project_members'
+            """)
+            project_members_exist = self.cursor.fetchone()['count'] > 0
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS project_members (
+                    project_id INT,
+                    user_id INT,
+                    PRIMARY KEY (project_id, user_id),
+                    INDEX idx_project_members_user (user_id, project_id),
+                    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            """)
+            if not project_members_exist:
+                # Only when the table is new; later removals must not come back on the next start
+                self.cursor.execute("""
+                    INSERT IGNORE INTO project_members (project_id, user_id)
+                    SELECT id, created_by FROM projects WHERE created_by IS NOT NULL
+                    UNION
+                    SELECT t.project_id, ta.user_id FROM todos t
+                    JOIN todo_assignees ta ON ta.todo_id = t.id
+                    WHERE t.project_id IS NOT NULL
+                """)
+
+            # File shares with a user or with all members of a project. A share only grants
+            # access to the one files row, the content is never copied.
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS file_shares (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    file_id INT NOT NULL,
+                    user_id INT NULL,
+                    project_id INT NULL,
+                    shared_by INT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE KEY uq_file_shares_user (user_id, file_id),
+                    UNIQUE KEY uq_file_shares_project (project_id, file_id),
+                    INDEX idx_file_shares_file (file_id),
+                    FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+                    FOREIGN KEY (shared_by) REFERENCES users(id) ON DELETE SET NULL
+                )
+            """)
+
             # Chat messages table
             self.cursor.execute("""
                 CREATE TABLE IF NOT EXISTS chat_messages (
@@ -158,6 +357,106 @@ class DatabaseManager:
                     FOREIGN KEY (recipient_id) REFERENCES users(id)
                 )
             """)
+            # Serves unread counting (recipient, sender, id > watermark)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chat_messages_recipient
+                ON chat_messages (recipient_id, user_id, id)
+            """)
+
+            # Client generated id of a message; resending the same message is a no-op
+            self.cursor.execute("""
+                ALTER TABLE chat_messages
+                ADD COLUMN IF NOT EXISTS client_uuid CHAR(36) NULL
+            """)
+            self.cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_messages_client_uuid
+                ON chat_messages (client_uuid)
+            """)
+
+            # Archive queries select old messages by time
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chat_messages_timestamp
+                ON chat_messages (timestamp)
+            """)
+
+            # Chat archive: compressed, one partition per month (YYYYMM).
+            # Partitioned tables cannot take part in foreign keys, reactions are stored inline as JSON.
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_messages_archive (
+                    id INT NOT NULL,
+                    archive_month INT NOT NULL,
+                    user_id INT,
+                    recipient_id INT,
+                    message TEXT,
+                    timestamp TIMESTAMP NULL,
+                    reactions TEXT,
+                    PRIMARY KEY (archive_month, id),
+                    INDEX idx_chat_archive_conversation (user_id, recipient_id, timestamp, id)
+                ) ROW_FORMAT=COMPRESSED
+                PARTITION BY RANGE (archive_month) (
+                    PARTITION p_future VALUES LESS THAN MAXVALUE
+                )
+            """)
+
+            # Chat read watermarks table
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_read_watermarks (
+                    user_id INT,
+                    peer_id INT,
+                    last_read_id INT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, peer_id),
+                    FOREIGN KEY (user_id) REFERENCES users(id),
+                    FOREIGN KEY (peer_id) REFERENCES users(id)
+                )
+            """)
+
+            # Chat channels (group conversations)
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_channels (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    created_by INT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+                )
+            """)
+
+            # Channel members; last_read_id is the read watermark of the member
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_channel_members (
+                    channel_id INT,
+                    user_id INT,
+                    last_read_id INT NOT NULL DEFAULT 0,
+                    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (channel_id, user_id),
+                    INDEX idx_chat_channel_members_user (user_id),
+                    FOREIGN KEY (channel_id) REFERENCES chat_channels(id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            """)
+
+            # Channel messages are stored once per channel and read per member (fan-out on read)
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_channel_messages (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    channel_id INT NOT NULL,
+                    user_id INT,
+                    message TEXT NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_chat_channel_messages_channel (channel_id, id),
+                    FOREIGN KEY (channel_id) REFERENCES chat_channels(id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+                )
+            """)
+            self.cursor.execute("""
+                ALTER TABLE chat_channel_messages
+                ADD COLUMN IF NOT EXISTS client_uuid CHAR(36) NULL
+            """)
+            self.cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_channel_messages_client_uuid
+                ON chat_channel_messages (client_uuid)
+            """)
 
             # Chat reactions table
             self.cursor.execute("""
@@ -170,6 +469,11 @@ class DatabaseManager:
                     FOREIGN KEY (user_id) REFERENCES users(id)
                 )
             """)
+            # Covering index for batched reaction aggregation
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_chat_reactions_message
+                ON chat_reactions (message_id, reaction_emoji, user_id)
+            """)
 
             # Time records table
             self.cursor.execute("""
@@ -209,19 +513,372 @@ class DatabaseManager:
             raise
 
     def add_file(self, file_info):
-        """Add a new file."""
+        """
+        Add a single file through add_files, so an existing name becomes a new version.
+        A blob_hash in file_info adds a reference to that stored blob. Returns the file id.
+        """
+        if not self.add_files([file_info]):
+            return None
+        try:
+            self.cursor.execute("""
+                SELECT id FROM files
+                WHERE user_id = %s AND folder_id <=> %s AND name = %s AND in_trash = FALSE
+                ORDER BY id DESC
+                LIMIT 1
+            """, (file_info['user_id'], file_info.get('folder_id'), file_info['name']))
+            row = self.cursor.fetchone()
+            return row['id'] if row else None
+        except Exception as e:
+            print("Database error:", e)
+            return None
+
+    def add_files(self, file_infos):
+        """
+        Add several files (same keys as add_file) in one transaction.
+        Blob references are counted per hash, so a batch may contain the same content twice.
+        A file with the name of an existing file of the user in the same folder becomes
+        its new version; the previous one moves to file_versions.
+        """
+        if not file_infos:
+            return True
+        now = datetime.now()
+        file_infos = [{**self.FILE_DEFAULTS, 'uploaded_at': now, **info} for info in file_infos]
+        blobs = {}
+        for info in file_infos:
+            if info['blob_hash']:
+                blob, count = blobs.get(info['blob_hash'], (info, 0))
+                blobs[info['blob_hash']] = (blob, count + 1)
+        self._ensure_connection()
+        try:
+            if blobs:
+                self.cursor.executemany("""
+                    INSERT INTO file_blobs (hash, size, stored_size, compression, ref_count)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE ref_count = ref_count + VALUES(ref_count)
+                """, [(digest, blob['size'], blob['stored_size'], blob['compression'], count)
+                      for digest, (blob, count) in blobs.items()])
+                self._check_blobs(blobs)
+
+            current = self._lock_current_files(file_infos)
+            new_infos = []
+            new_keys = set()
+            versions = []
+            for info in file_infos:
+                # Later files of the batch with the same name are versions of the first
+                key = self._file_key(info)
+                if key in current or key in new_keys:
+                    versions.append(info)
+                else:
+                    new_infos.append(info)
+                    new_keys.add(key)
+            if new_infos:
+                self.cursor.executemany(self.INSERT_FILE, new_infos)
+            missing = [info for info in versions if self._file_key(info) not in current]
+            if missing:
+                current.update(self._lock_current_files(missing))
+
+            usage = {}
+            for info in new_infos:
+                used, count = usage.get(info['user_id'], (0, 0))
+                usage[info['user_id']] = (used + (info['size'] or 0), count + 1)
+            for info in versions:
+                file = current[self._file_key(info)]
+                self._add_file_version(file['id'], info)
+                # Quotas count the current versions, like reconcile_storage_usage
+                used, count = usage.get(info['user_id'], (0, 0))
+                usage[info['user_id']] = (used + (info['size'] or 0) - (file['size'] or 0), count)
+                file['size'] = info['size']
+            self._change_storage_usage([(user_id, used, 0, count) for user_id, (used, count) in usage.items()])
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+            return False
+
+    def _check_blobs(self, hashes):
+        """
+        Make sure referenced blobs are still on disk, after their file_blobs rows were locked.
+        A deletion that released the last reference removes the blob only after checking
+        for new references under the same row lock (see _unlink_deleted), so a blob found
+        here stays. A missing one was removed meanwhile and has to be stored again.
+        """
+        blob_store = self.get_blob_store()
+        missing = [digest for digest in hashes if not blob_store.exists(digest)]
+        if missing:
+            raise FileNotFoundError(f"Blobs wurden inzwischen gelöscht: {', '.join(missing)}")
+
+    @staticmethod
+    def _file_key(file):
+        folder_id = file.get('folder_id')
+        return str(file['user_id']), None if folder_id is None else str(folder_id), file['name']
+
+    def _lock_current_files(self, file_infos):
+        """{(user, folder, name): {'id', 'size'}} of the files outside the trash these uploads replace."""
+        keys = list({self._file_key(info) for info in file_infos})
+        conditions = ' OR '.join(['(user_id = %s AND folder_id <=> %s AND name = %s)'] * len(keys))
+        self.cursor.execute(f"""
+            SELECT id, user_id, folder_id, name, size FROM files
+            WHERE in_trash = FALSE AND ({conditions})
+            ORDER BY id
+            FOR UPDATE
+        """, [value for key in keys for value in key])
+        # Names that existed more than once before versioning: the newest one is continued
+        return {self._file_key(row): {'id': row['id'], 'size': row['size']} for row in self.cursor.fetchall()}
+
+    def _add_file_version(self, file_id, info):
+        """Archive the current version of a file and make info (an add_files entry) the current one."""
+        self.cursor.execute("""
+            INSERT INTO file_versions (file_id, version, blob_hash, path, size, stored_size, compression, uploaded_at)
+            SELECT id, version, blob_hash, path, size, stored_size, compression, uploaded_at
+            FROM files WHERE id = %s
+        """, (file_id,))
+        self.cursor.execute("""
+            UPDATE files
+            SET path = %(path)s, size = %(size)s, type = %(type)s, blob_hash = %(blob_hash)s,
+                stored_size = %(stored_size)s, compression = %(compression)s,
+                uploaded_at = %(uploaded_at)s, version = version + 1
+            WHERE id = %(file_id)s
+        """, {**info, 'file_id': file_id})
+
+    def get_file_versions(self, file_id, user_id):
+        """All versions of a file of user_id, the current one first (is_current)."""
         self._ensure_connection()
         try:
             self.cursor.execute("""
-                INSERT INTO files (name, path, size, type, user_id, uploaded_at)
-                VALUES (%(name)s, %(path)s, %(size)s, %(type)s, %(user_id)s, %(uploaded_at)s)
-            """, file_info)
+                SELECT version, blob_hash, path, size, stored_size, compression, uploaded_at,
+                       TRUE AS is_current
+                FROM files WHERE id = %(file_id)s AND user_id = %(user_id)s
+                UNION ALL
+                SELECT v.version, v.blob_hash, v.path, v.size, v.stored_size, v.compression, v.uploaded_at,
+                       FALSE AS is_current
+                FROM file_versions v
+                JOIN files f ON f.id = v.file_id
+                WHERE v.file_id = %(file_id)s AND f.user_id = %(user_id)s
+                ORDER BY version DESC
+            """, {'file_id': file_id, 'user_id': user_id})
+            versions = self.cursor.fetchall()
+            for version in versions:
+                version['is_current'] = bool(version['is_current'])
+            return versions
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    def restore_file_version(self, file_id, user_id, version):
+        """Make an earlier version current again, as a new version on top of the others."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT v.blob_hash, v.path, v.size, v.stored_size, v.compression, f.type, f.user_id,
+                       f.size AS current_size
+                FROM file_versions v
+                JOIN files f ON f.id = v.file_id
+                WHERE v.file_id = %s AND v.version = %s AND f.user_id = %s
+                FOR UPDATE
+            """, (file_id, version, user_id))
+            row = self.cursor.fetchone()
+            if row is None:
+                self.connection.rollback()
+                return False
+            # The blob is now referenced by the old version row and the files row
+            if row['blob_hash']:
+                self.cursor.execute("UPDATE file_blobs SET ref_count = ref_count + 1 WHERE hash = %s",
+                                    (row['blob_hash'],))
+            self._add_file_version(file_id, {**row, 'uploaded_at': datetime.now()})
+            self._change_storage_usage([(row['user_id'], (row['size'] or 0) - (row['current_size'] or 0), 0, 0)])
             self.connection.commit()
-            return self.cursor.lastrowid
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+            return False
+
+    def _change_storage_usage(self, changes):
+        """
+        Apply (user_id, used_delta, trash_delta, count_delta) to user_storage.
+        Runs inside the caller's transaction, so counters and files change together.
+        """
+        changes = [change for change in changes if change[0] is not None]
+        if changes:
+            self.cursor.executemany("""
+                INSERT INTO user_storage (user_id, used_bytes, trash_bytes, file_count)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    used_bytes = used_bytes + VALUES(used_bytes),
+                    trash_bytes = trash_bytes + VALUES(trash_bytes),
+                    file_count = file_count + VALUES(file_count)
+            """, changes)
+
+    def get_storage_usage(self, user_id):
+        """used_bytes (trash included), trash_bytes, file_count and quota_bytes of a user."""
+        self._ensure_connection()
+        usage = {'used_bytes': 0, 'trash_bytes': 0, 'file_count': 0, 'quota_bytes': self.DEFAULT_STORAGE_QUOTA}
+        try:
+            self.cursor.execute("""
+                SELECT used_bytes, trash_bytes, file_count, quota_bytes
+                FROM user_storage
+                WHERE user_id = %s
+            """, (user_id,))
+            row = self.cursor.fetchone()
+            if row:
+                usage.update({key: value for key, value in row.items() if value is not None})
+        except Exception as e:
+            print("Database error:", e)
+        return usage
+
+    def check_storage_quota(self, user_id, additional_bytes):
+        """True if additional_bytes still fit into the quota of the user."""
+        usage = self.get_storage_usage(user_id)
+        return usage['used_bytes'] + additional_bytes <= usage['quota_bytes']
+
+    def reconcile_storage_usage(self):
+        """
+        Recompute the counters of all users from the files table and fix any drift.
+        One grouped scan; meant for a background connection (see main.py).
+        Returns the number of users whose counters were corrected, or None on failure.
+        """
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT COALESCE(f.user_id, s.user_id) AS user_id,
+                       COALESCE(f.used_bytes, 0) AS used_bytes,
+                       COALESCE(f.trash_bytes, 0) AS trash_bytes,
+                       COALESCE(f.file_count, 0) AS file_count
+                FROM (
+                    SELECT user_id, SUM(size) AS used_bytes,
+                           SUM(IF(in_trash, size, 0)) AS trash_bytes, COUNT(*) AS file_count
+                    FROM files
+                    WHERE user_id IS NOT NULL
+                    GROUP BY user_id
+                ) f
+                LEFT JOIN user_storage s ON s.user_id = f.user_id
+                WHERE s.user_id IS NULL OR s.used_bytes <> f.used_bytes
+                   OR s.trash_bytes <> f.trash_bytes OR s.file_count <> f.file_count
+                UNION
+                SELECT s.user_id, 0, 0, 0
+                FROM user_storage s
+                WHERE (s.used_bytes <> 0 OR s.trash_bytes <> 0 OR s.file_count <> 0)
+                AND NOT EXISTS (SELECT 1 FROM files f WHERE f.user_id = s.user_id)
+            """)
+            drifted = self.cursor.fetchall()
+            for row in drifted:
+                # Recount inside a transaction that locks the user's files, so concurrent changes wait
+                self.cursor.execute("""
+                    SELECT COALESCE(SUM(size), 0) AS used_bytes,
+                           COALESCE(SUM(IF(in_trash, size, 0)), 0) AS trash_bytes,
+                           COUNT(*) AS file_count
+                    FROM files
+                    WHERE user_id = %s
+                    LOCK IN SHARE MODE
+                """, (row['user_id'],))
+                actual = self.cursor.fetchone()
+                self.cursor.execute("""
+                    INSERT INTO user_storage (user_id, used_bytes, trash_bytes, file_count, reconciled_at)
+                    VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    ON DUPLICATE KEY UPDATE
+                        used_bytes = VALUES(used_bytes),
+                        trash_bytes = VALUES(trash_bytes),
+                        file_count = VALUES(file_count),
+                        reconciled_at = VALUES(reconciled_at)
+                """, (row['user_id'], actual['used_bytes'], actual['trash_bytes'], actual['file_count']))
+                self.connection.commit()
+            if drifted:
+                print(f"Speicherzähler von {len(drifted)} Benutzern korrigiert")
+            return len(drifted)
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+            return None
+
+    def get_blob_store(self):
+        """Shared content addressed store below the upload path."""
+        if self.blob_store is None:
+            self.blob_store = BlobStore(os.path.join(self.get_upload_path(), 'blobs'), UPLOAD_COMPRESSION)
+        return self.blob_store
+
+    def get_blob_sizes(self, hashes):
+        """{hash: size on disk} of the hashes that have a file_blobs row."""
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        self._ensure_connection()
+        try:
+            placeholders = ', '.join(['%s'] * len(hashes))
+            self.cursor.execute(f"""
+                SELECT hash, COALESCE(stored_size, size) AS size FROM file_blobs
+                WHERE hash IN ({placeholders})
+            """, hashes)
+            return {row['hash']: row['size'] for row in self.cursor.fetchall()}
         except Exception as e:
             print("Database error:", e)
             return None
 
+    def get_blobs_after(self, after_hash, limit):
+        """Next file_blobs rows in hash order (keyset pagination for scans)."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT hash, size FROM file_blobs
+                WHERE hash > %s
+                ORDER BY hash
+                LIMIT %s
+            """, (after_hash or '', limit))
+            return self.cursor.fetchall()
+        except Exception as e:
+            print("Database error:", e)
+            return None
+
+    def get_unhashed_files_after(self, after_id, limit):
+        """Next files rows stored before the blob store (no blob_hash), in id order."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT id, path, size FROM files
+                WHERE blob_hash IS NULL AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (after_id or 0, limit))
+            return self.cursor.fetchall()
+        except Exception as e:
+            print("Database error:", e)
+            return None
+
+    def get_existing_file_paths(self, paths):
+        """The paths out of paths that a files or file_versions row points to."""
+        paths = list(paths)
+        if not paths:
+            return set()
+        self._ensure_connection()
+        try:
+            placeholders = ', '.join(['%s'] * len(paths))
+            self.cursor.execute(f"""
+                SELECT path FROM files WHERE path IN ({placeholders})
+                UNION
+                SELECT path FROM file_versions WHERE path IN ({placeholders})
+            """, paths + paths)
+            return {row['path'] for row in self.cursor.fetchall()}
+        except Exception as e:
+            print("Database error:", e)
+            return None
+
+    def get_existing_blob_sizes(self, sizes):
+        """Sizes out of sizes that at least one stored blob has; only those can be duplicates."""
+        sizes = list(set(sizes))
+        if not sizes:
+            return set()
+        self._ensure_connection()
+        try:
+            placeholders = ', '.join(['%s'] * len(sizes))
+            self.cursor.execute(f"""
+                SELECT DISTINCT size FROM file_blobs
+                WHERE size IN ({placeholders})
+            """, sizes)
+            return {row['size'] for row in self.cursor.fetchall()}
+        except Exception as e:
+            print("Database error:", e)
+            return set()
+
     def get_files(self, user_id=None):
         """Get files, optionally filtered by user_id."""
         self._ensure_connection()
@@ -256,6 +913,176 @@ class DatabaseManager:
             print("Database error:", e)
             return []
 
+    def _get_file_view(self, user_id, where, order_column, limit=None, favorites_only=False,
+                       params=None, after=None):
+        """
+        Files of one view of the file manager, ordered by order_column (newest first) and id.
+        is_favorite is set from a join on the caller's favorites, favorites_only turns that
+        join into the filter. params are named parameters used in where.
+        With after (the last file of the previous page) the next page is returned.
+        """
+        self._ensure_connection()
+        try:
+            params = {**(params or {}), 'user_id': user_id}
+            keyset, params = self._file_keyset(order_column, after, params)
+            query = f"""
+                SELECT f.*, ff.user_id IS NOT NULL AS is_favorite
+                FROM files f
+                {'' if favorites_only else 'LEFT '}JOIN file_favorites ff
+                    ON ff.file_id = f.id AND ff.user_id = %(user_id)s
+                WHERE f.user_id = %(user_id)s AND {where} {keyset}
+                ORDER BY {order_column} DESC, f.id DESC
+            """
+            if limit:
+                query += " LIMIT %(limit)s"
+                params['limit'] = limit
+            self.cursor.execute(query, params)
+            files = self.cursor.fetchall()
+            for file in files:
+                file['is_favorite'] = bool(file['is_favorite'])
+            return files
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    @staticmethod
+    def _file_keyset(order_column, after, params):
+        """WHERE condition and params for the rows after the file after in (order_column, id) DESC order."""
+        if after is None:
+            return "", params
+        condition = f"""AND ({order_column} < %(after_value)s
+                 OR ({order_column} = %(after_value)s AND f.id < %(after_id)s))"""
+        return condition, {**params, 'after_value': after[order_column.split('.')[-1]], 'after_id': after['id']}
+
+    def get_drive_files(self, user_id, folder_id=None, limit=None, after=None):
+        """My Drive: files of the user in one folder (None is the top level), newest first."""
+        return self._get_file_view(user_id, "f.folder_id <=> %(folder_id)s AND f.in_trash = FALSE",
+                                   "f.uploaded_at", limit=limit, params={'folder_id': folder_id}, after=after)
+
+    def get_favorite_files(self, user_id, limit=None, after=None):
+        """Favorites of the user, outside the trash."""
+        return self._get_file_view(user_id, "f.in_trash = FALSE", "f.uploaded_at",
+                                   limit=limit, favorites_only=True, after=after)
+
+    def get_recent_files(self, user_id, limit=50):
+        """Most recently opened files (see record_file_access)."""
+        self.flush_file_access()
+        return self._get_file_view(user_id, "f.in_trash = FALSE AND f.last_accessed IS NOT NULL",
+                                   "f.last_accessed", limit=limit)
+
+    def get_shared_files(self, user_id, limit=None, after=None):
+        """
+        Shared with me: files other users shared with user_id directly or with one of
+        its projects, newest first. One query; both grant paths are index lookups
+        (uq_file_shares_user, project_members -> uq_file_shares_project).
+        limit and after page through the list like _get_file_view.
+        """
+        self._ensure_connection()
+        try:
+            keyset, params = self._file_keyset("f.uploaded_at", after, {'user_id': user_id})
+            query = f"""
+                SELECT f.*, u.username AS owner_name, ff.user_id IS NOT NULL AS is_favorite
+                FROM (
+                    SELECT file_id FROM file_shares WHERE user_id = %(user_id)s
+                    UNION
+                    SELECT s.file_id FROM project_members pm
+                    JOIN file_shares s ON s.project_id = pm.project_id
+                    WHERE pm.user_id = %(user_id)s
+                ) shared
+                JOIN files f ON f.id = shared.file_id
+                LEFT JOIN users u ON u.id = f.user_id
+                LEFT JOIN file_favorites ff ON ff.file_id = f.id AND ff.user_id = %(user_id)s
+                WHERE f.in_trash = FALSE AND f.user_id <> %(user_id)s {keyset}
+                ORDER BY f.uploaded_at DESC, f.id DESC
+            """
+            if limit:
+                query += " LIMIT %(limit)s"
+                params['limit'] = limit
+            self.cursor.execute(query, params)
+            files = self.cursor.fetchall()
+            for file in files:
+                file['is_favorite'] = bool(file['is_favorite'])
+                file['shared'] = True
+            return files
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    def get_file_shares(self, file_id, owner_id):
+        """Users and projects a file of owner_id is shared with."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT s.user_id, s.project_id, u.username, p.name AS project_name
+                FROM file_shares s
+                JOIN files f ON f.id = s.file_id
+                LEFT JOIN users u ON u.id = s.user_id
+                LEFT JOIN projects p ON p.id = s.project_id
+                WHERE s.file_id = %s AND f.user_id = %s
+            """, (file_id, owner_id))
+            return self.cursor.fetchall()
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    def set_file_shares(self, file_id, owner_id, user_ids=(), project_ids=()):
+        """
+        Share a file of owner_id with exactly these users and projects.
+        Only rows of file_shares change; storage usage stays with the owner.
+        """
+        self._ensure_connection()
+        try:
+            self.cursor.execute("SELECT id FROM files WHERE id = %s AND user_id = %s FOR UPDATE",
+                                (file_id, owner_id))
+            if self.cursor.fetchone() is None:
+                self.connection.rollback()
+                return False
+            self.cursor.execute("DELETE FROM file_shares WHERE file_id = %s", (file_id,))
+            grants = [(file_id, user_id, None, owner_id) for user_id in user_ids if str(user_id) != str(owner_id)]
+            grants += [(file_id, None, project_id, owner_id) for project_id in project_ids]
+            if grants:
+                self.cursor.executemany("""
+                    INSERT INTO file_shares (file_id, user_id, project_id, shared_by)
+                    VALUES (%s, %s, %s, %s)
+                """, grants)
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+            return False
+
+    def record_file_access(self, file_id):
+        """
+        Note that a file was opened. Opens are collected in memory and written with one
+        batched UPDATE at most every FILE_ACCESS_FLUSH_INTERVAL seconds.
+        """
+        self.pending_file_access[file_id] = datetime.now()
+        if time.monotonic() - self.file_access_flushed >= self.FILE_ACCESS_FLUSH_INTERVAL:
+            self.flush_file_access()
+
+    def flush_file_access(self):
+        """Write the collected file opens to files.last_accessed."""
+        self.file_access_flushed = time.monotonic()
+        if not self.pending_file_access:
+            return True
+        pending = self.pending_file_access
+        self.pending_file_access = {}
+        self._ensure_connection()
+        try:
+            self.cursor.executemany("""
+                UPDATE files SET last_accessed = %s
+                WHERE id = %s
+            """, [(accessed, file_id) for file_id, accessed in pending.items()])
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            # Keep the opens for the next attempt unless newer ones arrived meanwhile
+            for file_id, accessed in pending.items():
+                self.pending_file_access.setdefault(file_id, accessed)
+            return False
+
     def add_to_favorites(self, file_id, user_id):
         """Add a file to user's favorites."""
         self._ensure_connection()
@@ -275,86 +1102,529 @@ class DatabaseManager:
         self._ensure_connection()
         try:
             self.cursor.execute("""
-                DELETE FROM file_favorites
-                WHERE file_id = %s AND user_id = %s
-            """, (file_id, user_id))
+                DELETE FROM file_favorites
+                WHERE file_id = %s AND user_id = %s
+            """, (file_id, user_id))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def move_to_trash(self, file_id, user_id):
+        """Move a file to trash."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                UPDATE files
+                SET in_trash = TRUE, deleted_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND user_id = %s AND in_trash = FALSE
+            """, (file_id, user_id))
+            moved = self.cursor.rowcount > 0
+            if moved:
+                self._change_trash_usage(file_id, user_id, 1)
+            self.connection.commit()
+            return moved
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def restore_from_trash(self, file_id, user_id):
+        """Restore a file from trash. If its folder is still in the trash it goes to the top level."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                UPDATE files f
+                LEFT JOIN folders d ON d.id = f.folder_id
+                SET f.in_trash = FALSE, f.deleted_at = NULL,
+                    f.folder_id = IF(d.in_trash, NULL, f.folder_id)
+                WHERE f.id = %s AND f.user_id = %s AND f.in_trash = TRUE
+            """, (file_id, user_id))
+            restored = self.cursor.rowcount > 0
+            if restored:
+                self._change_trash_usage(file_id, user_id, -1)
+            self.connection.commit()
+            return restored
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def _change_trash_usage(self, file_id, user_id, direction):
+        self.cursor.execute("SELECT size FROM files WHERE id = %s", (file_id,))
+        row = self.cursor.fetchone()
+        if row and row['size']:
+            self._change_storage_usage([(user_id, 0, direction * row['size'], 0)])
+
+    def get_trash(self, user_id, limit=None, after=None):
+        """
+        Get files in user's trash, most recently deleted first.
+        Files of a trashed folder are listed with the folder (get_trashed_folders).
+        """
+        return self._get_file_view(user_id, """f.in_trash = TRUE AND NOT EXISTS (
+            SELECT 1 FROM folders d WHERE d.id = f.folder_id AND d.in_trash = TRUE)""", "f.deleted_at",
+                                   limit=limit, after=after)
+
+    def create_folder(self, user_id, name, parent_id=None):
+        """Create a folder below parent_id (None is the top level) and return its id."""
+        self._ensure_connection()
+        try:
+            parent_path = '/'
+            if parent_id is not None:
+                parent = self._get_folder(parent_id, user_id)
+                if parent is None or parent['in_trash']:
+                    return None
+                parent_path = parent['path']
+            self.cursor.execute("""
+                INSERT INTO folders (user_id, parent_id, name)
+                VALUES (%s, %s, %s)
+            """, (user_id, parent_id, name))
+            folder_id = self.cursor.lastrowid
+            self.cursor.execute("UPDATE folders SET path = %s WHERE id = %s",
+                                (f"{parent_path}{folder_id}/", folder_id))
+            self.connection.commit()
+            return folder_id
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+            return None
+
+    def _get_folder(self, folder_id, user_id, for_update=False):
+        self.cursor.execute(f"""
+            SELECT id, user_id, parent_id, name, path, in_trash, deleted_at FROM folders
+            WHERE id = %s AND user_id = %s
+            {'FOR UPDATE' if for_update else ''}
+        """, (folder_id, user_id))
+        return self.cursor.fetchone()
+
+    def get_folders(self, user_id, parent_id=None):
+        """Subfolders of parent_id (None is the top level) outside the trash, by name."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT * FROM folders
+                WHERE user_id = %s AND parent_id <=> %s AND in_trash = FALSE
+                ORDER BY name
+            """, (user_id, parent_id))
+            return self.cursor.fetchall()
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    def get_all_folders(self, user_id):
+        """All folders of the user outside the trash (id, parent_id, name, path), e.g. for a move target."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT id, parent_id, name, path FROM folders
+                WHERE user_id = %s AND in_trash = FALSE
+            """, (user_id,))
+            return self.cursor.fetchall()
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    def get_folder_path(self, folder_id, user_id):
+        """Folders from the top level down to folder_id, e.g. for a breadcrumb bar."""
+        if folder_id is None:
+            return []
+        self._ensure_connection()
+        try:
+            folder = self._get_folder(folder_id, user_id)
+            if folder is None:
+                return []
+            ids = [int(part) for part in folder['path'].strip('/').split('/')]
+            placeholders = ', '.join(['%s'] * len(ids))
+            self.cursor.execute(f"""
+                SELECT id, name, parent_id FROM folders
+                WHERE id IN ({placeholders})
+            """, ids)
+            folders = {row['id']: row for row in self.cursor.fetchall()}
+            return [folders[i] for i in ids if i in folders]
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    def get_folder_sizes(self, user_id, folder_ids):
+        """
+        {folder id: {'size': ..., 'file_count': ...}} over the whole subtree of each folder,
+        trash excluded. One query: each folder joins its subtree by path prefix.
+        """
+        folder_ids = list(folder_ids)
+        if not folder_ids:
+            return {}
+        self._ensure_connection()
+        try:
+            placeholders = ', '.join(['%s'] * len(folder_ids))
+            self.cursor.execute(f"""
+                SELECT c.id, COALESCE(SUM(f.size), 0) AS size, COUNT(f.id) AS file_count
+                FROM folders c
+                JOIN folders d ON d.user_id = c.user_id AND d.path LIKE CONCAT(c.path, '%%')
+                    AND d.in_trash = FALSE
+                LEFT JOIN files f ON f.user_id = d.user_id AND f.folder_id = d.id AND f.in_trash = FALSE
+                WHERE c.user_id = %s AND c.id IN ({placeholders})
+                GROUP BY c.id
+            """, [user_id, *folder_ids])
+            return {row['id']: {'size': int(row['size']), 'file_count': row['file_count']}
+                    for row in self.cursor.fetchall()}
+        except Exception as e:
+            print("Database error:", e)
+            return {}
+
+    def rename_folder(self, folder_id, user_id, name):
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                UPDATE folders SET name = %s
+                WHERE id = %s AND user_id = %s
+            """, (name, folder_id, user_id))
+            self.connection.commit()
+            return self.cursor.rowcount > 0
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def move_folder(self, folder_id, user_id, parent_id=None):
+        """
+        Move a folder with its subtree below parent_id (None is the top level).
+        The paths of the subtree are rewritten with one UPDATE; files keep their folder_id.
+        """
+        self._ensure_connection()
+        try:
+            folder = self._get_folder(folder_id, user_id, for_update=True)
+            if folder is None:
+                return False
+            parent_path = '/'
+            if parent_id is not None:
+                parent = self._get_folder(parent_id, user_id)
+                # A folder cannot move into its own subtree
+                if parent is None or parent['in_trash'] or parent['path'].startswith(folder['path']):
+                    self.connection.rollback()
+                    return False
+                parent_path = parent['path']
+            new_path = f"{parent_path}{folder_id}/"
+            self.cursor.execute("""
+                UPDATE folders
+                SET path = CONCAT(%s, SUBSTRING(path, %s))
+                WHERE user_id = %s AND path LIKE %s
+            """, (new_path, len(folder['path']) + 1, user_id, folder['path'] + '%'))
+            self.cursor.execute("UPDATE folders SET parent_id = %s WHERE id = %s", (parent_id, folder_id))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+            return False
+
+    def move_file(self, file_id, user_id, folder_id=None):
+        """Move a file into folder_id (None is the top level)."""
+        self._ensure_connection()
+        try:
+            if folder_id is not None:
+                folder = self._get_folder(folder_id, user_id)
+                if folder is None or folder['in_trash']:
+                    return False
+            self.cursor.execute("""
+                UPDATE files SET folder_id = %s
+                WHERE id = %s AND user_id = %s
+            """, (folder_id, file_id, user_id))
+            self.connection.commit()
+            return self.cursor.rowcount > 0
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def move_folder_to_trash(self, folder_id, user_id):
+        """
+        Move a folder, its subfolders and their files to the trash with three statements.
+        Everything gets the same deleted_at, which restore_folder uses to tell it apart
+        from files that were trashed on their own before.
+        """
+        self._ensure_connection()
+        try:
+            folder = self._get_folder(folder_id, user_id, for_update=True)
+            if folder is None or folder['in_trash']:
+                self.connection.rollback()
+                return False
+            subtree = (user_id, folder['path'] + '%')
+            deleted_at = datetime.now().replace(microsecond=0)
+            self._change_subtree_trash_usage(subtree, in_trash=False, direction=1)
+            self.cursor.execute("""
+                UPDATE files f
+                JOIN folders d ON d.id = f.folder_id
+                SET f.in_trash = TRUE, f.deleted_at = %s
+                WHERE d.user_id = %s AND d.path LIKE %s AND f.user_id = d.user_id AND f.in_trash = FALSE
+            """, (deleted_at, *subtree))
+            self.cursor.execute("""
+                UPDATE folders SET in_trash = TRUE, deleted_at = %s
+                WHERE user_id = %s AND path LIKE %s AND in_trash = FALSE
+            """, (deleted_at, *subtree))
             self.connection.commit()
             return True
         except Exception as e:
             print("Database error:", e)
+            self.connection.rollback()
             return False
 
-    def move_to_trash(self, file_id, user_id):
-        """Move a file to trash."""
+    def restore_folder(self, folder_id, user_id):
+        """Restore a trashed folder with everything that was trashed together with it."""
         self._ensure_connection()
         try:
+            folder = self._get_folder(folder_id, user_id, for_update=True)
+            if folder is None or not folder['in_trash']:
+                self.connection.rollback()
+                return False
+            if folder['parent_id'] is not None:
+                parent = self._get_folder(folder['parent_id'], user_id)
+                if parent is None or parent['in_trash']:
+                    # The parent stays in the trash, the restored folder goes to the top level
+                    new_path = f"/{folder_id}/"
+                    self.cursor.execute("""
+                        UPDATE folders
+                        SET path = CONCAT(%s, SUBSTRING(path, %s))
+                        WHERE user_id = %s AND path LIKE %s
+                    """, (new_path, len(folder['path']) + 1, user_id, folder['path'] + '%'))
+                    self.cursor.execute("UPDATE folders SET parent_id = NULL WHERE id = %s", (folder_id,))
+                    folder['path'] = new_path
+            subtree = (user_id, folder['path'] + '%')
+            self._change_subtree_trash_usage(subtree, in_trash=True, direction=-1,
+                                             deleted_at=folder['deleted_at'])
             self.cursor.execute("""
-                UPDATE files
-                SET in_trash = TRUE, deleted_at = CURRENT_TIMESTAMP
-                WHERE id = %s AND user_id = %s
-            """, (file_id, user_id))
+                UPDATE files f
+                JOIN folders d ON d.id = f.folder_id
+                SET f.in_trash = FALSE, f.deleted_at = NULL
+                WHERE d.user_id = %s AND d.path LIKE %s AND f.user_id = d.user_id
+                    AND f.in_trash = TRUE AND f.deleted_at = %s
+            """, (*subtree, folder['deleted_at']))
+            self.cursor.execute("""
+                UPDATE folders SET in_trash = FALSE, deleted_at = NULL
+                WHERE user_id = %s AND path LIKE %s AND in_trash = TRUE AND deleted_at = %s
+            """, (*subtree, folder['deleted_at']))
             self.connection.commit()
-            return self.cursor.rowcount > 0
+            return True
         except Exception as e:
             print("Database error:", e)
+            self.connection.rollback()
             return False
 
-    def restore_from_trash(self, file_id, user_id):
-        """Restore a file from trash."""
+    def _change_subtree_trash_usage(self, subtree, in_trash, direction, deleted_at=None):
+        """Move the sizes of the files in a subtree (user_id, path pattern) in or out of trash_bytes."""
+        self.cursor.execute(f"""
+            SELECT f.user_id, SUM(f.size) AS size
+            FROM files f
+            JOIN folders d ON d.id = f.folder_id
+            WHERE d.user_id = %s AND d.path LIKE %s AND f.user_id = d.user_id AND f.in_trash = %s
+                {'AND f.deleted_at = %s' if deleted_at else ''}
+            GROUP BY f.user_id
+        """, (*subtree, in_trash, *([deleted_at] if deleted_at else [])))
+        self._change_storage_usage([(row['user_id'], 0, direction * int(row['size'] or 0), 0)
+                                    for row in self.cursor.fetchall()])
+
+    def get_trashed_folders(self, user_id):
+        """Folders the user moved to the trash (not their subfolders), most recently deleted first."""
         self._ensure_connection()
         try:
             self.cursor.execute("""
-                UPDATE files
-                SET in_trash = FALSE, deleted_at = NULL
-                WHERE id = %s AND user_id = %s
-            """, (file_id, user_id))
-            self.connection.commit()
-            return self.cursor.rowcount > 0
+                SELECT c.* FROM folders c
+                LEFT JOIN folders p ON p.id = c.parent_id
+                WHERE c.user_id = %s AND c.in_trash = TRUE AND (p.id IS NULL OR p.in_trash = FALSE)
+                ORDER BY c.deleted_at DESC
+            """, (user_id,))
+            return self.cursor.fetchall()
         except Exception as e:
             print("Database error:", e)
-            return False
+            return []
 
-    def get_trash(self, user_id):
-        """Get files in user's trash."""
+    def delete_folder(self, folder_id, user_id):
+        """Delete a folder with its subtree and all files in it permanently."""
         self._ensure_connection()
         try:
+            folder = self._get_folder(folder_id, user_id, for_update=True)
+            if folder is None:
+                self.connection.rollback()
+                return False
+            subtree = (user_id, folder['path'] + '%')
             self.cursor.execute("""
-                SELECT f.*, 
-                       GROUP_CONCAT(ff.user_id) as favorite_users
+                SELECT f.id, f.blob_hash, f.path, f.user_id, f.size, f.in_trash
                 FROM files f
-                LEFT JOIN file_favorites ff ON f.id = ff.file_id
-                WHERE f.user_id = %s AND f.in_trash = TRUE
-                GROUP BY f.id
-            """, (user_id,))
-            files = self.cursor.fetchall()
-            
-            # Convert favorite_users string to list
-            for file in files:
-                if file['favorite_users']:
-                    file['favorites'] = [int(uid) for uid in file['favorite_users'].split(',')]
-                else:
-                    file['favorites'] = []
-                del file['favorite_users']
-            
-            return files
+                JOIN folders d ON d.id = f.folder_id
+                WHERE d.user_id = %s AND d.path LIKE %s
+                FOR UPDATE
+            """, subtree)
+            orphaned, legacy_paths = self._delete_file_rows(self.cursor.fetchall())
+            # Deepest first, so no row still has children when it is deleted
+            self.cursor.execute("""
+                DELETE FROM folders
+                WHERE user_id = %s AND path LIKE %s
+                ORDER BY LENGTH(path) DESC
+            """, subtree)
+            self.connection.commit()
+            self._unlink_deleted(orphaned, legacy_paths)
+            return True
         except Exception as e:
             print("Database error:", e)
-            return []
+            self.connection.rollback()
+            return False
 
     def delete_file(self, file_id):
-        """Delete a file permanently."""
+        """Delete a file permanently. Its blob is removed with the last reference."""
         self._ensure_connection()
         try:
-            # First delete from favorites
-            self.cursor.execute("DELETE FROM file_favorites WHERE file_id = %s", (file_id,))
-            # Then delete the file
-            self.cursor.execute("DELETE FROM files WHERE id = %s", (file_id,))
+            self.cursor.execute("""
+                SELECT id, blob_hash, path, user_id, size, in_trash FROM files
+                WHERE id = %s FOR UPDATE
+            """, (file_id,))
+            orphaned, legacy_paths = self._delete_file_rows(self.cursor.fetchall())
             self.connection.commit()
+
+            # Only touch the disk after the database agreed nobody uses the blob
+            self._unlink_deleted(orphaned, legacy_paths)
             return True
         except Exception as e:
             print("Database error:", e)
+            self.connection.rollback()
             return False
 
+    def purge_trash(self, retention_days=None, batch_size=None):
+        """
+        Permanently delete files that have been in the trash longer than retention_days.
+        Works in transactions of batch_size rows so no lock is held for long, and unlinks
+        the freed blobs after each commit; meant for a background connection (see main.py).
+        Expired trashed folders are deleted afterwards, deepest first.
+        Returns {'files': ..., 'folders': ..., 'bytes': logical size, 'reclaimed_bytes': freed on disk}.
+        """
+        retention_days = self.TRASH_RETENTION_DAYS if retention_days is None else retention_days
+        batch_size = batch_size or self.TRASH_PURGE_BATCH
+        result = {'files': 0, 'folders': 0, 'bytes': 0, 'reclaimed_bytes': 0}
+        self._ensure_connection()
+        try:
+            while True:
+                self.cursor.execute("""
+                    SELECT id, blob_hash, path, user_id, size, in_trash FROM files
+                    WHERE in_trash = TRUE AND deleted_at < NOW() - INTERVAL %s DAY
+                    ORDER BY deleted_at
+                    LIMIT %s
+                    FOR UPDATE
+                """, (retention_days, batch_size))
+                rows = self.cursor.fetchall()
+                if not rows:
+                    break
+                orphaned, legacy_paths = self._delete_file_rows(rows)
+                self.connection.commit()
+
+                result['files'] += len(rows)
+                result['bytes'] += sum(row['size'] or 0 for row in rows)
+                result['reclaimed_bytes'] += self._unlink_deleted(orphaned, legacy_paths)
+                if len(rows) < batch_size:
+                    break
+            # Their files expired with them (same deleted_at) and are gone by now
+            while True:
+                self.cursor.execute("""
+                    DELETE FROM folders
+                    WHERE in_trash = TRUE AND deleted_at < NOW() - INTERVAL %s DAY
+                    ORDER BY LENGTH(path) DESC
+                    LIMIT %s
+                """, (retention_days, batch_size))
+                deleted = self.cursor.rowcount
+                self.connection.commit()
+                result['folders'] += deleted
+                if deleted < batch_size:
+                    break
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+        return result
+
+    def _delete_file_rows(self, rows):
+        """
+        Delete locked files rows (id, blob_hash, path, user_id, size, in_trash) with their
+        versions, favorites, storage counters and blob references, inside the caller's transaction.
+        Returns (hashes of blobs without references, paths of deleted pre-blob-store uploads).
+        """
+        if not rows:
+            return [], []
+        ids = [row['id'] for row in rows]
+        placeholders = ', '.join(['%s'] * len(ids))
+        # Earlier versions go with the file (ON DELETE CASCADE) and release their blobs too
+        self.cursor.execute(f"""
+            SELECT blob_hash, path FROM file_versions
+            WHERE file_id IN ({placeholders})
+        """, ids)
+        versions = self.cursor.fetchall()
+        self.cursor.execute(f"DELETE FROM file_favorites WHERE file_id IN ({placeholders})", ids)
+        self.cursor.execute(f"DELETE FROM files WHERE id IN ({placeholders})", ids)
+
+        usage = {}
+        references = {}
+        for row in rows:
+            size = row['size'] or 0
+            used, trash, count = usage.get(row['user_id'], (0, 0, 0))
+            usage[row['user_id']] = (used - size, trash - (size if row['in_trash'] else 0), count - 1)
+            if row['blob_hash']:
+                references[row['blob_hash']] = references.get(row['blob_hash'], 0) + 1
+        for version in versions:
+            if version['blob_hash']:
+                references[version['blob_hash']] = references.get(version['blob_hash'], 0) + 1
+        self._change_storage_usage([(user_id, *changes) for user_id, changes in usage.items()])
+
+        orphaned = []
+        if references:
+            self.cursor.executemany("""
+                UPDATE file_blobs SET ref_count = ref_count - %s
+                WHERE hash = %s
+            """, [(count, digest) for digest, count in references.items()])
+            hashes = list(references)
+            placeholders = ', '.join(['%s'] * len(hashes))
+            self.cursor.execute(f"""
+                SELECT hash FROM file_blobs
+                WHERE hash IN ({placeholders}) AND ref_count <= 0
+            """, hashes)
+            orphaned = [row['hash'] for row in self.cursor.fetchall()]
+            if orphaned:
+                placeholders = ', '.join(['%s'] * len(orphaned))
+                self.cursor.execute(f"DELETE FROM file_blobs WHERE hash IN ({placeholders})", orphaned)
+
+        legacy_paths = [row['path'] for row in rows + versions if not row['blob_hash'] and row['path']]
+        return orphaned, legacy_paths
+
+    def _unlink_deleted(self, orphaned, legacy_paths):
+        """Remove the bytes of committed deletions; returns the bytes freed on disk."""
+        reclaimed = 0
+        blob_store = self.get_blob_store() if orphaned else None
+        for digest in orphaned:
+            # An upload may have referenced the blob again since the deletion committed.
+            # The lock (a gap lock while there is no row) holds back new references
+            # until the blob is gone; add_files then notices it in _check_blobs.
+            self.cursor.execute("SELECT 1 FROM file_blobs WHERE hash = %s FOR UPDATE", (digest,))
+            if self.cursor.fetchone() is None:
+                reclaimed += blob_store.remove(digest)
+            self.connection.commit()
+        for path in legacy_paths:
+            # Files from before the blob store own their copy in the upload directory
+            reclaimed += self._remove_legacy_upload(path)
+        return reclaimed
+
+    def _remove_legacy_upload(self, path):
+        upload_path = self.get_upload_path()
+        if os.path.dirname(os.path.abspath(path)) != upload_path:
+            return 0
+        self.cursor.execute("""
+            SELECT 1 FROM files WHERE path = %s
+            UNION ALL
+            SELECT 1 FROM file_versions WHERE path = %s
+            LIMIT 1
+        """, (path, path))
+        if self.cursor.fetchone():
+            return 0
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f"Datei konnte nicht gelöscht werden: {e}")
+            return 0
+
     def search_files(self, user_id, query):
         """Search files by name."""
         self._ensure_connection()
@@ -451,6 +1721,12 @@ class DatabaseManager:
                         INSERT INTO todo_assignees (todo_id, user_id)
                         VALUES (%s, %s)
                     """, (todo_id, assignee))
+                if project_id:
+                    # Assignees see the files shared with the project
+                    self.cursor.executemany("""
+                        INSERT IGNORE INTO project_members (project_id, user_id)
+                        VALUES (%s, %s)
+                    """, [(project_id, assignee) for assignee in assignees])
 
             self.connection.commit()
             return todo_id
@@ -483,6 +1759,13 @@ class DatabaseManager:
                         INSERT INTO todo_assignees (todo_id, user_id)
                         VALUES (%s, %s)
                     """, (todo['id'], assignee))
+                # New assignees see the files shared with the project, like in create_todo
+                self.cursor.execute("""
+                    INSERT IGNORE INTO project_members (project_id, user_id)
+                    SELECT t.project_id, ta.user_id FROM todos t
+                    JOIN todo_assignees ta ON ta.todo_id = t.id
+                    WHERE t.id = %s AND t.project_id IS NOT NULL
+                """, (todo['id'],))
             
             self.connection.commit()
             return True
@@ -511,47 +1794,580 @@ class DatabaseManager:
             print("Database error:", e)
             return []
 
-    def save_chat_message(self, user_id, recipient_id, message):
-        """Save a new chat message"""
+    def get_last_messages(self, user_id, since_id=0):
+        """
+        Get the newest message of every conversation of a user as {peer_id: message}.
+        With since_id only conversations with messages newer than since_id are returned.
+        """
         self._ensure_connection()
         try:
             self.cursor.execute("""
-                INSERT INTO chat_messages (user_id, recipient_id, message)
-                VALUES (%s, %s, %s)
-            """, (user_id, recipient_id, message))
+                SELECT m.id, m.user_id, m.recipient_id, m.message, m.timestamp,
+                       last.peer_id
+                FROM (
+                    SELECT IF(user_id = %s, recipient_id, user_id) as peer_id,
+                           MAX(id) as last_id
+                    FROM chat_messages
+                    WHERE (user_id = %s OR recipient_id = %s) AND id > %s
+                    GROUP BY peer_id
+                ) last
+                JOIN chat_messages m ON m.id = last.last_id
+            """, (user_id, user_id, user_id, since_id))
+            return {row['peer_id']: row for row in self.cursor.fetchall()}
+        except Exception as e:
+            print("Database error:", e)
+            return {}
+
+    def save_chat_message(self, user_id, recipient_id, message, client_uuid=None):
+        """
+        Save a new chat message.
+        A message with an already stored client_uuid is not inserted again; its id is returned.
+        """
+        self._ensure_connection()
+        try:
+            # LAST_INSERT_ID(id) makes lastrowid the id of the existing row on a duplicate
+            self.cursor.execute("""
+                INSERT INTO chat_messages (user_id, recipient_id, message, client_uuid)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+            """, (user_id, recipient_id, message, client_uuid))
             self.connection.commit()
             return self.cursor.lastrowid
         except Exception as e:
             print("Database error:", e)
             return None
 
-    def get_chat_messages(self, sender_id, receiver_id, since_id=0, limit=50):
+    def save_outbox_messages(self, entries):
+        """
+        Store a batch of outbox entries (see utils.chat_outbox) in one transaction.
+        Entries already stored are skipped through their client_uuid, so a batch can be resent.
+        Returns {client_uuid: {'id': ..., 'timestamp': ...}} or None on failure.
+        """
+        direct = [e for e in entries if not e.get('channel_id')]
+        channel = [e for e in entries if e.get('channel_id')]
+        self._ensure_connection()
+        try:
+            if direct:
+                self.cursor.executemany("""
+                    INSERT IGNORE INTO chat_messages (user_id, recipient_id, message, client_uuid)
+                    VALUES (%s, %s, %s, %s)
+                """, [(e['user_id'], e['recipient_id'], e['message'], e['client_uuid']) for e in direct])
+            if channel:
+                # Only members can post; rejected entries are missing from the result
+                self.cursor.executemany("""
+                    INSERT IGNORE INTO chat_channel_messages (channel_id, user_id, message, client_uuid)
+                    SELECT channel_id, user_id, %s, %s
+                    FROM chat_channel_members
+                    WHERE channel_id = %s AND user_id = %s
+                """, [(e['message'], e['client_uuid'], e['channel_id'], e['user_id']) for e in channel])
+            self.connection.commit()
+
+            stored = {}
+            for table, batch in (('chat_messages', direct), ('chat_channel_messages', channel)):
+                if not batch:
+                    continue
+                placeholders = ', '.join(['%s'] * len(batch))
+                self.cursor.execute(f"""
+                    SELECT id, client_uuid, timestamp
+                    FROM {table}
+                    WHERE client_uuid IN ({placeholders})
+                """, [e['client_uuid'] for e in batch])
+                for row in self.cursor.fetchall():
+                    stored[row['client_uuid']] = {'id': row['id'], 'timestamp': row['timestamp']}
+            return stored
+        except Exception as e:
+            print("Database error:", e)
+            return None
+
+    def get_chat_messages(self, sender_id, receiver_id, since_id=0, limit=50, with_reactions=True):
         """
-        Get chat messages between two users, optionally only messages newer than since_id
+        Get chat messages between two users, optionally only messages newer than since_id.
+        Reactions of the page are merged into each message (see get_message_reactions).
         """
         try:
             self._ensure_connection()
             query = """
-                SELECT m.id, m.sender_id, m.receiver_id, m.message, m.timestamp,
+                SELECT m.id, m.user_id, m.recipient_id, m.message, m.timestamp, m.client_uuid,
                        s.username as sender_name, r.username as receiver_name
                 FROM chat_messages m
-                JOIN users s ON m.sender_id = s.id
-                JOIN users r ON m.receiver_id = r.id
-                WHERE ((m.sender_id = %s AND m.receiver_id = %s)
-                OR (m.sender_id = %s AND m.receiver_id = %s))
+                JOIN users s ON m.user_id = s.id
+                JOIN users r ON m.recipient_id = r.id
+                WHERE ((m.user_id = %s AND m.recipient_id = %s)
+                OR (m.user_id = %s AND m.recipient_id = %s))
                 AND m.id > %s
                 ORDER BY m.timestamp ASC
                 LIMIT %s
             """
-            
+
             self.cursor.execute(query, (sender_id, receiver_id, receiver_id, sender_id, since_id, limit))
             messages = self.cursor.fetchall()
+            if with_reactions:
+                self._merge_reactions(messages, sender_id)
             return messages
-                    
+
         except Exception as e:
             print(f"Fehler beim Abrufen der Chat-Nachrichten: {e}")
             return []
 
+    def get_chat_history(self, user_id, peer_id, before=None, limit=50):
+        """
+        Page backwards through a conversation, starting at the newest message.
+        Reads the hot table first and continues into the archive once it runs out,
+        so callers page through the whole history the same way.
+        before is the oldest message already loaded (None for the newest page).
+        Returns up to limit messages older than before, oldest first.
+        """
+        try:
+            self._ensure_connection()
+            if before and before.get('archived'):
+                messages = self._get_archived_messages(user_id, peer_id, before, limit)
+                messages.reverse()
+                return messages
+
+            before_id = before['id'] if before else self.MAX_MESSAGE_ID
+            self.cursor.execute("""
+                SELECT m.id, m.user_id, m.recipient_id, m.message, m.timestamp, m.client_uuid,
+                       s.username as sender_name, r.username as receiver_name
+                FROM chat_messages m
+                JOIN users s ON m.user_id = s.id
+                JOIN users r ON m.recipient_id = r.id
+                WHERE ((m.user_id = %s AND m.recipient_id = %s)
+                OR (m.user_id = %s AND m.recipient_id = %s))
+                AND m.id < %s
+                ORDER BY m.id DESC
+                LIMIT %s
+            """, (user_id, peer_id, peer_id, user_id, before_id, limit))
+            messages = self.cursor.fetchall()
+            self._merge_reactions(messages, user_id)
+
+            if len(messages) < limit:
+                # Everything archived is older than the hot table, whatever its ids
+                messages += self._get_archived_messages(user_id, peer_id, None, limit - len(messages))
+
+            messages.reverse()
+            return messages
+        except Exception as e:
+            print(f"Fehler beim Abrufen des Chat-Verlaufs: {e}")
+            return []
+
+    def _get_archived_messages(self, user_id, peer_id, before, limit):
+        """
+        Archive page of a conversation before the archived message before (None: newest),
+        newest first, with reactions decoded. Pages by (timestamp, id), the order the
+        messages were archived in.
+        """
+        condition, params = "", []
+        if before:
+            condition = "AND (m.timestamp < %s OR (m.timestamp = %s AND m.id < %s))"
+            params = [before['timestamp'], before['timestamp'], before['id']]
+        self.cursor.execute(f"""
+            SELECT m.id, m.user_id, m.recipient_id, m.message, m.timestamp, m.reactions,
+                   s.username as sender_name, r.username as receiver_name
+            FROM chat_messages_archive m
+            JOIN users s ON m.user_id = s.id
+            JOIN users r ON m.recipient_id = r.id
+            WHERE ((m.user_id = %s AND m.recipient_id = %s)
+            OR (m.user_id = %s AND m.recipient_id = %s))
+            {condition}
+            ORDER BY m.timestamp DESC, m.id DESC
+            LIMIT %s
+        """, [user_id, peer_id, peer_id, user_id, *params, limit])
+        messages = self.cursor.fetchall()
+
+        for message in messages:
+            # Stored as {user_id: emoji}
+            reactions = json.loads(message.pop('reactions') or '{}')
+            counts = {}
+            for emoji in reactions.values():
+                counts[emoji] = counts.get(emoji, 0) + 1
+            message['reactions'] = dict(sorted(counts.items(), key=lambda item: -item[1]))
+            message['own_reaction'] = reactions.get(str(user_id))
+            message['archived'] = True
+        return messages
+
+    def archive_chat_history(self, hot_months=None):
+        """
+        Move chat messages older than hot_months (default CHAT_HOT_MONTHS) from
+        chat_messages into the monthly partitions of chat_messages_archive.
+        Runs in batches of CHAT_ARCHIVE_BATCH; returns the number of archived messages.
+        """
+        hot_months = hot_months or self.CHAT_HOT_MONTHS
+        now = datetime.now()
+        month_index = now.year * 12 + now.month - hot_months  # zero based months
+        cutoff = datetime(month_index // 12, month_index % 12 + 1, 1)
+
+        archived = 0
+        try:
+            self._ensure_connection()
+            while True:
+                self.cursor.execute("""
+                    SELECT id, user_id, recipient_id, message, timestamp
+                    FROM chat_messages
+                    WHERE timestamp < %s
+                    ORDER BY timestamp, id
+                    LIMIT %s
+                """, (cutoff, self.CHAT_ARCHIVE_BATCH))
+                messages = self.cursor.fetchall()
+                if not messages:
+                    break
+
+                # Partition DDL commits implicitly, so it runs before the batch transaction
+                for month in sorted({self._archive_month(m['timestamp']) for m in messages}):
+                    self._ensure_archive_partition(month)
+
+                message_ids = [m['id'] for m in messages]
+                placeholders = ', '.join(['%s'] * len(message_ids))
+                self.cursor.execute(f"""
+                    SELECT message_id, user_id, reaction_emoji
+                    FROM chat_reactions
+                    WHERE message_id IN ({placeholders})
+                """, message_ids)
+                reactions = {}
+                for row in self.cursor.fetchall():
+                    reactions.setdefault(row['message_id'], {})[str(row['user_id'])] = row['reaction_emoji']
+
+                self.cursor.executemany("""
+                    INSERT IGNORE INTO chat_messages_archive
+                        (id, archive_month, user_id, recipient_id, message, timestamp, reactions)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, [(m['id'], self._archive_month(m['timestamp']), m['user_id'], m['recipient_id'],
+                       m['message'], m['timestamp'],
+                       json.dumps(reactions[m['id']]) if m['id'] in reactions else None)
+                      for m in messages])
+                self.cursor.execute(f"DELETE FROM chat_reactions WHERE message_id IN ({placeholders})", message_ids)
+                self.cursor.execute(f"DELETE FROM chat_messages WHERE id IN ({placeholders})", message_ids)
+                self.connection.commit()
+                archived += len(messages)
+
+            if archived:
+                print(f"Archived {archived} chat messages older than {cutoff:%Y-%m}")
+            return archived
+        except Exception as e:
+            self.connection.rollback()
+            print("Database error:", e)
+            return archived
+
+    def _archive_month(self, timestamp):
+        return timestamp.year * 100 + timestamp.month
+
+    def _ensure_archive_partition(self, month):
+        """Split a partition for month (YYYYMM) off the open-ended p_future partition."""
+        self.cursor.execute("""
+            SELECT PARTITION_NAME
+            FROM INFORMATION_SCHEMA.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = 'chat_messages_archive'
+        """)
+        months = [int(row['PARTITION_NAME'][1:]) for row in self.cursor.fetchall()
+                  if row['PARTITION_NAME'] != 'p_future']
+        # Months before the newest partition are already covered by a range
+        if months and month <= max(months):
+            return
+
+        next_month = month + 1 if month % 100 < 12 else (month // 100 + 1) * 100 + 1
+        self.cursor.execute(f"""
+            ALTER TABLE chat_messages_archive
+            REORGANIZE PARTITION p_future INTO (
+                PARTITION p{month} VALUES LESS THAN ({next_month}),
+                PARTITION p_future VALUES LESS THAN MAXVALUE
+            )
+        """)
+
+    def get_message_reactions(self, message_ids, user_id):
+        """
+        Get aggregated reactions for a page of messages in one query.
+        Returns {message_id: {'counts': {emoji: count}, 'own': emoji or None}}.
+        """
+        if not message_ids:
+            return {}
+
+        self._ensure_connection()
+        try:
+            placeholders = ', '.join(['%s'] * len(message_ids))
+            self.cursor.execute(f"""
+                SELECT message_id, reaction_emoji,
+                       COUNT(*) as count,
+                       MAX(user_id = %s) as own
+                FROM chat_reactions
+                WHERE message_id IN ({placeholders})
+                GROUP BY message_id, reaction_emoji
+                ORDER BY message_id, count DESC
+            """, (user_id, *message_ids))
+
+            reactions = {}
+            for row in self.cursor.fetchall():
+                entry = reactions.setdefault(row['message_id'], {'counts': {}, 'own': None})
+                entry['counts'][row['reaction_emoji']] = row['count']
+                if row['own']:
+                    entry['own'] = row['reaction_emoji']
+            return reactions
+        except Exception as e:
+            print("Database error:", e)
+            return {}
+
+    def _merge_reactions(self, messages, user_id):
+        """Attach 'reactions' and 'own_reaction' to each message record."""
+        reactions = self.get_message_reactions([m['id'] for m in messages], user_id)
+        for message in messages:
+            entry = reactions.get(message['id'], {})
+            message['reactions'] = entry.get('counts', {})
+            message['own_reaction'] = entry.get('own')
+        return messages
+
+    def mark_conversation_read(self, user_id, peer_id, last_read_id=None):
+        """
+        Move the read watermark of user_id for the conversation with peer_id.
+        Without last_read_id everything received so far is marked as read.
+        The watermark never moves backwards.
+        """
+        self._ensure_connection()
+        try:
+            if last_read_id is None:
+                self.cursor.execute("""
+                    SELECT COALESCE(MAX(id), 0) as last_id
+                    FROM chat_messages
+                    WHERE recipient_id = %s AND user_id = %s
+                """, (user_id, peer_id))
+                last_read_id = self.cursor.fetchone()['last_id']
+
+            self.cursor.execute("""
+                INSERT INTO chat_read_watermarks (user_id, peer_id, last_read_id)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE last_read_id = GREATEST(last_read_id, VALUES(last_read_id))
+            """, (user_id, peer_id, last_read_id))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def get_unread_counts(self, user_id, peer_ids=None):
+        """Get unread message counts per conversation as {peer_id: count}, optionally only for peer_ids."""
+        if peer_ids is not None and not peer_ids:
+            return {}
+        self._ensure_connection()
+        try:
+            condition, params = "", [user_id]
+            if peer_ids is not None:
+                condition = f"AND m.user_id IN ({', '.join(['%s'] * len(peer_ids))})"
+                params += list(peer_ids)
+            self.cursor.execute(f"""
+                SELECT m.user_id as peer_id, COUNT(*) as unread
+                FROM chat_messages m
+                LEFT JOIN chat_read_watermarks w
+                       ON w.user_id = m.recipient_id AND w.peer_id = m.user_id
+                WHERE m.recipient_id = %s {condition}
+                AND m.id > COALESCE(w.last_read_id, 0)
+                GROUP BY m.user_id
+            """, params)
+            return {row['peer_id']: row['unread'] for row in self.cursor.fetchall()}
+        except Exception as e:
+            print("Database error:", e)
+            return {}
+
+    def get_unread_total(self, user_id):
+        """Get the number of unread messages over all conversations and channels."""
+        return (sum(self.get_unread_counts(user_id).values())
+                + sum(self.get_channel_unread_counts(user_id).values()))
+
+    def create_channel(self, name, created_by, member_ids=()):
+        """Create a channel with its creator and member_ids as members. Returns the channel id."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                INSERT INTO chat_channels (name, created_by)
+                VALUES (%s, %s)
+            """, (name, created_by))
+            channel_id = self.cursor.lastrowid
+            # Channel and members in one transaction, never a channel without members
+            self._insert_channel_members(channel_id, {created_by, *member_ids})
+            self.connection.commit()
+            return channel_id
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+            return None
+
+    def add_channel_members(self, channel_id, user_ids):
+        """Add members to a channel; they start with everything already posted marked as read."""
+        self._ensure_connection()
+        try:
+            self._insert_channel_members(channel_id, user_ids)
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            self.connection.rollback()
+            return False
+
+    def _insert_channel_members(self, channel_id, user_ids):
+        """Insert member rows without committing."""
+        self.cursor.execute("""
+            SELECT COALESCE(MAX(id), 0) as last_id
+            FROM chat_channel_messages
+            WHERE channel_id = %s
+        """, (channel_id,))
+        last_id = self.cursor.fetchone()['last_id']
+        self.cursor.executemany("""
+            INSERT IGNORE INTO chat_channel_members (channel_id, user_id, last_read_id)
+            VALUES (%s, %s, %s)
+        """, [(channel_id, user_id, last_id) for user_id in user_ids])
+
+    def is_channel_member(self, channel_id, user_id):
+        """Check whether a user is a member of a channel"""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT 1 FROM chat_channel_members
+                WHERE channel_id = %s AND user_id = %s
+            """, (channel_id, user_id))
+            return self.cursor.fetchone() is not None
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def remove_channel_member(self, channel_id, user_id):
+        """Remove a member from a channel"""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                DELETE FROM chat_channel_members
+                WHERE channel_id = %s AND user_id = %s
+            """, (channel_id, user_id))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def get_user_channels(self, user_id, since_id=None):
+        """
+        Get the channels of a user with their newest message and unread count.
+        With since_id only channels with messages newer than since_id are returned.
+        """
+        self._ensure_connection()
+        try:
+            condition, params = "", [user_id]
+            if since_id is not None:
+                condition, params = "AND m.id > %s", [user_id, since_id]
+            self.cursor.execute(f"""
+                SELECT c.id, c.name,
+                       m.id as last_message_id, m.message as last_message,
+                       m.timestamp as last_timestamp
+                FROM chat_channel_members cm
+                JOIN chat_channels c ON c.id = cm.channel_id
+                LEFT JOIN chat_channel_messages m ON m.id = (
+                    SELECT MAX(id) FROM chat_channel_messages
+                    WHERE channel_id = c.id
+                )
+                WHERE cm.user_id = %s {condition}
+                ORDER BY c.name
+            """, params)
+            channels = self.cursor.fetchall()
+            if not channels:
+                return []
+
+            unread_counts = self.get_channel_unread_counts(user_id)
+            for channel in channels:
+                channel['unread'] = unread_counts.get(channel['id'], 0)
+            return channels
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    def save_channel_message(self, channel_id, user_id, message, client_uuid=None):
+        """
+        Save a channel message; a single row regardless of the number of members.
+        Deduplicated on client_uuid like save_chat_message. Returns None unless
+        user_id is a member of the channel.
+        """
+        if not self.is_channel_member(channel_id, user_id):
+            return None
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                INSERT INTO chat_channel_messages (channel_id, user_id, message, client_uuid)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+            """, (channel_id, user_id, message, client_uuid))
+            self.connection.commit()
+            return self.cursor.lastrowid
+        except Exception as e:
+            print("Database error:", e)
+            return None
+
+    def get_channel_messages(self, channel_id, user_id, since_id=None, before_id=None, limit=50):
+        """
+        Get channel messages oldest first; empty unless user_id is a member.
+        With since_id only newer messages are returned (polling), otherwise the
+        page before before_id (default: the newest page).
+        """
+        self._ensure_connection()
+        try:
+            if since_id is not None:
+                condition, order, bound = "m.id > %s", "ASC", since_id
+            else:
+                condition, order, bound = "m.id < %s", "DESC", before_id or self.MAX_MESSAGE_ID
+            self.cursor.execute(f"""
+                SELECT m.id, m.channel_id, m.user_id, m.message, m.timestamp, m.client_uuid,
+                       u.username as sender_name
+                FROM chat_channel_messages m
+                JOIN chat_channel_members cm ON cm.channel_id = m.channel_id AND cm.user_id = %s
+                JOIN users u ON m.user_id = u.id
+                WHERE m.channel_id = %s AND {condition}
+                ORDER BY m.id {order}
+                LIMIT %s
+            """, (user_id, channel_id, bound, limit))
+            messages = self.cursor.fetchall()
+            if order == "DESC":
+                messages.reverse()
+            return messages
+        except Exception as e:
+            print("Database error:", e)
+            return []
+
+    def mark_channel_read(self, channel_id, user_id, last_read_id=None):
+        """Move the read watermark of a channel member, never backwards."""
+        self._ensure_connection()
+        try:
+            if last_read_id is None:
+                self.cursor.execute("""
+                    SELECT COALESCE(MAX(id), 0) as last_id
+                    FROM chat_channel_messages
+                    WHERE channel_id = %s
+                """, (channel_id,))
+                last_read_id = self.cursor.fetchone()['last_id']
+
+            self.cursor.execute("""
+                UPDATE chat_channel_members
+                SET last_read_id = GREATEST(last_read_id, %s)
+                WHERE channel_id = %s AND user_id = %s
+            """, (last_read_id, channel_id, user_id))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def get_channel_unread_counts(self, user_id):
+        """Get unread message counts per channel as {channel_id: count}."""
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                SELECT cm.channel_id, COUNT(*) as unread
+                FROM chat_channel_members cm
+                JOIN chat_channel_messages m
+                     ON m.channel_id = cm.channel_id
+                     AND m.id > cm.last_read_id
+                     AND m.user_id != cm.user_id
+                WHERE cm.user_id = %s
+                GROUP BY cm.channel_id
+            """, (user_id,))
+            return {row['channel_id']: row['unread'] for row in self.cursor.fetchall()}
+        except Exception as e:
+            print("Database error:", e)
+            return {}
+
     def add_message_reaction(self, message_id, user_id, reaction_emoji):
         """Add a reaction to a chat message"""
         self._ensure_connection()
@@ -603,6 +2419,12 @@ class DatabaseManager:
             traceback.print_exc()
             return []
 
+    def get_user_index(self):
+        """Get the shared user search index, built on first use and kept in sync by the user methods."""
+        if self.user_index is None:
+            self.user_index = UserSearchIndex(self.get_all_users())
+        return self.user_index
+
     def get_users_by_ids(self, user_ids):
         """Get specific users by their IDs."""
         if not user_ids:
@@ -868,6 +2690,9 @@ class DatabaseManager:
                 user_data.get('location', '')
             ))
             self.connection.commit()
+            if self.user_index is not None:
+                user = {k: v for k, v in user_data.items() if k != 'password'}
+                self.user_index.add({**user, 'id': self.cursor.lastrowid, 'is_active': True})
             return True
         except Exception as e:
             print(f"Error creating user: {e}")
@@ -912,6 +2737,11 @@ class DatabaseManager:
                 """
                 self.cursor.execute(query, values)
                 self.connection.commit()
+                if self.user_index is not None:
+                    user = self.user_index.find_by_username(username)
+                    if user:
+                        changes = {k: v for k, v in user_data.items() if k != 'password' and v}
+                        self.user_index.update({**changes, 'id': user['id']})
                 return True
             return False
         except Exception as e:
@@ -923,6 +2753,10 @@ class DatabaseManager:
         try:
             self.cursor.execute("DELETE FROM users WHERE username = %s", (username,))
             self.connection.commit()
+            if self.user_index is not None:
+                user = self.user_index.find_by_username(username)
+                if user:
+                    self.user_index.remove(user['id'])
             return True
         except Exception as e:
             print(f"Error deleting user: {e}")
@@ -976,8 +2810,14 @@ class DatabaseManager:
                 INSERT INTO projects (name, description, created_by)
                 VALUES (%s, %s, %s)
             """, (name, description, created_by))
+            project_id = self.cursor.lastrowid
+            if created_by:
+                self.cursor.execute("""
+                    INSERT INTO project_members (project_id, user_id)
+                    VALUES (%s, %s)
+                """, (project_id, created_by))
             self.connection.commit()
-            return self.cursor.lastrowid
+            return project_id
         except Exception as e:
             print("Database error:", e)
             return None
@@ -997,6 +2837,33 @@ class DatabaseManager:
             print("Database error:", e)
             return False
 
+    def add_project_members(self, project_id, user_ids):
+        """Add users to a project; they see the files shared with it."""
+        self._ensure_connection()
+        try:
+            self.cursor.executemany("""
+                INSERT IGNORE INTO project_members (project_id, user_id)
+                VALUES (%s, %s)
+            """, [(project_id, user_id) for user_id in user_ids])
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
+    def remove_project_member(self, project_id, user_id):
+        self._ensure_connection()
+        try:
+            self.cursor.execute("""
+                DELETE FROM project_members
+                WHERE project_id = %s AND user_id = %s
+            """, (project_id, user_id))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            print("Database error:", e)
+            return False
+
     def delete_project(self, project_id):
         """Delete a project and all its todos."""
         self._ensure_connection()
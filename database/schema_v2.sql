@@ -1,13 +1,24 @@
 -- Drop existing tables if they exist
+DROP TABLE IF EXISTS file_shares;
 DROP TABLE IF EXISTS file_favorites;
+DROP TABLE IF EXISTS file_versions;
+DROP TABLE IF EXISTS user_storage;
+DROP TABLE IF EXISTS chat_read_watermarks;
+DROP TABLE IF EXISTS chat_channel_messages;
+DROP TABLE IF EXISTS chat_channel_members;
+DROP TABLE IF EXISTS chat_channels;
 DROP TABLE IF EXISTS chat_reactions;
+DROP TABLE IF EXISTS chat_messages_archive;
 DROP TABLE IF EXISTS chat_messages;
 DROP TABLE IF EXISTS calendar_events;
 DROP TABLE IF EXISTS time_records;
 DROP TABLE IF EXISTS todo_assignees;
 DROP TABLE IF EXISTS todos;
+DROP TABLE IF EXISTS project_members;
 DROP TABLE IF EXISTS projects;
 DROP TABLE IF EXISTS files;
+DROP TABLE IF EXISTS folders;
+DROP TABLE IF EXISTS file_blobs;
 DROP TABLE IF EXISTS users;
 
 -- Users table
@@ -19,6 +30,23 @@ CREATE TABLE users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Folders; path is the materialized path of ids ('/3/17/42/'), a subtree is one index range
+CREATE TABLE folders (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    parent_id INT NULL,
+    name VARCHAR(255) NOT NULL,
+    path VARCHAR(1000) CHARACTER SET ascii NOT NULL DEFAULT '',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    in_trash BOOLEAN DEFAULT FALSE,
+    deleted_at TIMESTAMP NULL,
+    INDEX idx_folders_parent (user_id, parent_id, in_trash, name),
+    INDEX idx_folders_path (user_id, path),
+    INDEX idx_folders_trash_deleted (in_trash, deleted_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE
+);
+
 -- Files table
 CREATE TABLE files (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -31,7 +59,48 @@ CREATE TABLE files (
     last_accessed TIMESTAMP NULL,
     in_trash BOOLEAN DEFAULT FALSE,
     deleted_at TIMESTAMP NULL,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    blob_hash CHAR(64) NULL,
+    stored_size BIGINT NULL,
+    compression VARCHAR(10) NULL,
+    folder_id INT NULL,
+    version INT NOT NULL DEFAULT 1,
+    INDEX idx_files_blob_hash (blob_hash),
+    INDEX idx_files_user_trash (user_id, in_trash, uploaded_at),
+    INDEX idx_files_user_accessed (user_id, last_accessed),
+    INDEX idx_files_trash_deleted (in_trash, deleted_at),
+    INDEX idx_files_path (path(255)),
+    INDEX idx_files_folder (user_id, folder_id, in_trash, uploaded_at),
+    INDEX idx_files_name (user_id, folder_id, name),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT fk_files_folder FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE SET NULL
+);
+
+-- Earlier versions of a file; the files row is the current version
+CREATE TABLE file_versions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    file_id INT NOT NULL,
+    version INT NOT NULL,
+    blob_hash CHAR(64) NULL,
+    path VARCHAR(1024),
+    size BIGINT,
+    stored_size BIGINT NULL,
+    compression VARCHAR(10) NULL,
+    uploaded_at TIMESTAMP NULL,
+    UNIQUE KEY uq_file_versions (file_id, version),
+    INDEX idx_file_versions_path (path(255)),
+    FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE
+);
+
+-- Content addressed file contents (uploads/blobs/<ab>/<cd>/<sha256>[.gz|.xz|.chunks]), shared by files rows
+-- size is the uncompressed size, stored_size the size on disk if compressed or chunked
+CREATE TABLE file_blobs (
+    hash CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    stored_size BIGINT NULL,
+    compression VARCHAR(10) NULL,
+    ref_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_file_blobs_size (size)
 );
 
 -- File favorites table
@@ -39,10 +108,22 @@ CREATE TABLE file_favorites (
     file_id INT,
     user_id INT,
     PRIMARY KEY (file_id, user_id),
+    INDEX idx_file_favorites_user (user_id, file_id),
     FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Storage usage per user, maintained by every files change (trash included in used_bytes)
+CREATE TABLE user_storage (
+    user_id INT PRIMARY KEY,
+    used_bytes BIGINT NOT NULL DEFAULT 0,
+    trash_bytes BIGINT NOT NULL DEFAULT 0,
+    file_count INT NOT NULL DEFAULT 0,
+    quota_bytes BIGINT NULL,
+    reconciled_at TIMESTAMP NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 -- Projects table
 CREATE TABLE projects (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -53,6 +134,33 @@ CREATE TABLE projects (
     FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
 );
 
+-- Project members; files shared with a project are visible to them
+CREATE TABLE project_members (
+    project_id INT,
+    user_id INT,
+    PRIMARY KEY (project_id, user_id),
+    INDEX idx_project_members_user (user_id, project_id),
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- File shares with a user or a project; the shared files row is not copied
+CREATE TABLE file_shares (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    file_id INT NOT NULL,
+    user_id INT NULL,
+    project_id INT NULL,
+    shared_by INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_file_shares_user (user_id, file_id),
+    UNIQUE KEY uq_file_shares_project (project_id, file_id),
+    INDEX idx_file_shares_file (file_id),
+    FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (shared_by) REFERENCES users(id) ON DELETE SET NULL
+);
+
 -- Todos table
 CREATE TABLE todos (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -84,16 +192,84 @@ CREATE TABLE chat_messages (
     recipient_id INT,
     message TEXT NOT NULL,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    client_uuid CHAR(36) NULL,
+    UNIQUE INDEX idx_chat_messages_client_uuid (client_uuid),
+    INDEX idx_chat_messages_recipient (recipient_id, user_id, id),
+    INDEX idx_chat_messages_timestamp (timestamp),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
     FOREIGN KEY (recipient_id) REFERENCES users(id) ON DELETE SET NULL
 );
 
+-- Chat archive (messages older than the hot months, one partition per month YYYYMM)
+-- Reactions are stored inline as JSON {user_id: emoji}; partitioned tables have no foreign keys
+CREATE TABLE chat_messages_archive (
+    id INT NOT NULL,
+    archive_month INT NOT NULL,
+    user_id INT,
+    recipient_id INT,
+    message TEXT,
+    timestamp TIMESTAMP NULL,
+    reactions TEXT,
+    PRIMARY KEY (archive_month, id),
+    INDEX idx_chat_archive_conversation (user_id, recipient_id, timestamp, id)
+) ROW_FORMAT=COMPRESSED
+PARTITION BY RANGE (archive_month) (
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
+-- Chat read watermarks (last message read per user and conversation)
+CREATE TABLE chat_read_watermarks (
+    user_id INT,
+    peer_id INT,
+    last_read_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, peer_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (peer_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Chat channels (group conversations)
+CREATE TABLE chat_channels (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    created_by INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+);
+
+-- Channel members with their read watermark
+CREATE TABLE chat_channel_members (
+    channel_id INT,
+    user_id INT,
+    last_read_id INT NOT NULL DEFAULT 0,
+    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (channel_id, user_id),
+    INDEX idx_chat_channel_members_user (user_id),
+    FOREIGN KEY (channel_id) REFERENCES chat_channels(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Channel messages (stored once per channel)
+CREATE TABLE chat_channel_messages (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    channel_id INT NOT NULL,
+    user_id INT,
+    message TEXT NOT NULL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    client_uuid CHAR(36) NULL,
+    UNIQUE INDEX idx_chat_channel_messages_client_uuid (client_uuid),
+    INDEX idx_chat_channel_messages_channel (channel_id, id),
+    FOREIGN KEY (channel_id) REFERENCES chat_channels(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+);
+
 -- Chat reactions table
 CREATE TABLE chat_reactions (
     message_id INT,
     user_id INT,
     reaction_emoji VARCHAR(32),
     PRIMARY KEY (message_id, user_id),
+    INDEX idx_chat_reactions_message (message_id, reaction_emoji, user_id),
     FOREIGN KEY (message_id) REFERENCES chat_messages(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
@@ -1,15 +1,17 @@
 import sys
 import os
 import logging
+import threading
 from PySide6.QtWidgets import QApplication, QMainWindow, QStackedWidget, QMessageBox
 from PySide6.QtCore import Qt
-from PySide6.QtGui import QPalette, QColor
+from PySide6.QtGui import QPalette, QColor, QPixmapCache
 from dotenv import load_dotenv
 
 from ui.login_window import LoginWindow
 from ui.main_window import MainWindow
 from database.db_manager import DatabaseManager
-from utils.config import DEBUG_MODE
+from utils.config import DEBUG_MODE, PIXMAP_CACHE_LIMIT_KB
+from utils.upload_reconciler import UploadReconciler
 
 # Configure logging
 logging.basicConfig(
@@ -23,6 +25,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class BusinessApp:
+    UPLOAD_SCAN_BATCHES = 50  # Batches of the upload reconciliation run per start
+
     def __init__(self):
         try:
             # Load environment variables
@@ -32,6 +36,7 @@ class BusinessApp:
             # Initialize application
             self.app = QApplication(sys.argv)
             self.app.setStyle('Fusion')
+            QPixmapCache.setCacheLimit(PIXMAP_CACHE_LIMIT_KB)
             
             # Set dark theme
             self.setup_dark_theme()
@@ -40,6 +45,8 @@ class BusinessApp:
             try:
                 self.db = DatabaseManager()
                 self.db.check_users()
+                # Chat archiving, counters, trash purge and upload check run without delaying the start
+                threading.Thread(target=self.run_maintenance, daemon=True).start()
             except Exception as e:
                 logger.error(f"Database initialization failed: {str(e)}")
                 self.show_error_and_exit("Database Error", 
@@ -93,6 +100,23 @@ class BusinessApp:
             }
         """)
 
+    def run_maintenance(self):
+        try:
+            db = DatabaseManager(init_tables=False)
+            # Move chat history out of the hot table into the monthly archive
+            db.archive_chat_history()
+            db.reconcile_storage_usage()
+            purged = db.purge_trash()
+            if purged['files']:
+                logger.info(f"Trash purge: {purged['files']} files, {purged['reclaimed_bytes']} bytes reclaimed")
+            # A slice of the upload scan per start, it continues from its checkpoint next time
+            reconciler = UploadReconciler(db, db.get_blob_store(), db.get_upload_path())
+            report = reconciler.run(max_batches=self.UPLOAD_SCAN_BATCHES)
+            for kind, problem in report['problems'].items():
+                logger.warning(f"Upload check: {problem['count']} {kind} ({problem['bytes']} bytes)")
+        except Exception as e:
+            logger.warning(f"Background maintenance failed: {str(e)}")
+
     def on_login_success(self, user_data):
         self.main_window = MainWindow(self.db, user_data)
         self.main_stack.addWidget(self.main_window)
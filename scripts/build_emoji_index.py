@@ -0,0 +1,41 @@
+"""
+Build resources/emoji_index.tsv from the emoji package.
+
+The chat loads this precomputed index instead of scanning the emoji package
+dictionaries at runtime. Re-run after upgrading the emoji package:
+
+    python scripts/build_emoji_index.py
+"""
+import os
+import emoji
+
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources', 'emoji_index.tsv')
+
+
+def strip_colons(name):
+    return name.strip(':')
+
+
+def main():
+    lines = []
+    for char, data in emoji.EMOJI_DATA.items():
+        if data['status'] != emoji.STATUS['fully_qualified']:
+            continue
+        # Skin tone variants more than double the index and are not offered in the picker
+        if 'skin_tone' in data['en']:
+            continue
+        aliases = ' '.join(strip_colons(alias) for alias in data.get('alias', []))
+        german = strip_colons(data.get('de', ''))
+        # Columns: emoji, english name, aliases, german name
+        lines.append('\t'.join([char, strip_colons(data['en']), aliases, german]))
+
+    lines.sort(key=lambda line: line.split('\t', 2)[1])
+    with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
+        f.write(f"# Generated by scripts/build_emoji_index.py from emoji {emoji.__version__}\n")
+        f.write('\n'.join(lines))
+        f.write('\n')
+    print(f"Wrote {len(lines)} emoji to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
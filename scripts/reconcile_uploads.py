@@ -0,0 +1,37 @@
+"""
+Check the upload directory against the files and file_blobs tables.
+
+Reports orphaned blobs and uploads, missing files and size mismatches. The scan
+continues from its checkpoint (uploads/blobs/reconcile.json) when it was interrupted.
+
+    python scripts/reconcile_uploads.py [--reclaim] [--batches N]
+
+--reclaim deletes orphaned blobs, orphaned uploads and stale temporary files.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import DatabaseManager
+from utils.upload_reconciler import UploadReconciler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reclaim', action='store_true', help="delete orphaned files")
+    parser.add_argument('--batches', type=int, default=None, help="stop after this many batches")
+    args = parser.parse_args()
+
+    db = DatabaseManager(init_tables=False)
+    reconciler = UploadReconciler(db, db.get_blob_store(), db.get_upload_path())
+    report = reconciler.run(reclaim=args.reclaim, max_batches=args.batches)
+    print(json.dumps(report, indent=2))
+    if 'completed_at' not in report:
+        print("Scan unterbrochen, der nächste Aufruf setzt ihn fort.")
+
+
+if __name__ == "__main__":
+    main()
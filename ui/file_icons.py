@@ -0,0 +1,58 @@
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QColor, QPainter, QPixmap, QPixmapCache
+
+FILE_TYPE_COLORS = {
+    'pdf': '#FF5555',  # Red
+    'doc': '#5B95FF',  # Blue
+    'xls': '#4CAF50',  # Green
+    'ppt': '#FF9800',  # Orange
+    'folder-blue': '#5B95FF',
+    'folder-pink': '#FF69B4'
+}
+
+
+def file_type_pixmap(file_type, size=48, dpr=1.0):
+    """
+    Colored square with the file type, the generic icon of a file.
+    Painted once per (type, size, device pixel ratio) and then served from the
+    process-wide QPixmapCache (budget: PIXMAP_CACHE_LIMIT_KB in utils.config).
+    """
+    file_type = (file_type or '').lstrip('.').lower()
+    key = f"filetype:{file_type}:{size}:{dpr}"
+    pixmap = QPixmapCache.find(key)
+    if pixmap is None or pixmap.isNull():
+        pixmap = _paint_file_type_pixmap(file_type, size, dpr)
+        QPixmapCache.insert(key, pixmap)
+    return pixmap
+
+
+def _paint_file_type_pixmap(file_type, size, dpr):
+    # Create a colored rectangle with file type text
+    pixmap = QPixmap(round(size * dpr), round(size * dpr))
+    pixmap.setDevicePixelRatio(dpr)
+    pixmap.fill(Qt.transparent)
+
+    painter = QPainter(pixmap)
+    painter.setRenderHint(QPainter.Antialiasing)
+
+    # Draw rounded rectangle background
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QColor(FILE_TYPE_COLORS.get(file_type, '#999999')))
+    painter.drawRoundedRect(0, 0, size, size, size / 6, size / 6)
+
+    # Draw file type text
+    painter.setPen(QColor('#FFFFFF'))
+    font = painter.font()
+    font.setPointSize(max(6, size // 5))
+    font.setBold(True)
+    painter.setFont(font)
+
+    text = file_type.upper()
+    if 'folder' in file_type:
+        text = ''  # For folders, we don't show text
+
+    text_rect = painter.boundingRect(0, 0, size, size, Qt.AlignCenter, text)
+    painter.drawText(text_rect, Qt.AlignCenter, text)
+
+    painter.end()
+    return pixmap
@@ -9,6 +9,7 @@ from .widgets.timetracker import TimeTrackerWidget
 from .widgets.calendar import CalendarWidget
 from .widgets.files import FilesWidget
 from .widgets.profile_dialog import ProfileDialog
+from .refresh_scheduler import RefreshScheduler
 import os
 
 class MainWindow(QMainWindow):
@@ -121,9 +122,29 @@ class MainWindow(QMainWindow):
 
         content_layout.addWidget(self.tabs)
 
+        # Pause refreshes of hidden tabs and back off while idle
+        self.setup_refresh_scheduler()
+
         # Add content to main layout
         main_layout.addWidget(content)
 
+    def setup_refresh_scheduler(self):
+        self.refresh_scheduler = RefreshScheduler(self)
+
+        chat = self.tab_widgets["chat"]
+        self.refresh_scheduler.register(chat, chat.refresh_timer, chat.refresh_messages)
+
+        dashboard = self.tab_widgets["dashboard"]
+        self.refresh_scheduler.register(dashboard, dashboard.update_timer, dashboard.update_dashboard)
+
+        calendar = self.tab_widgets["calendar"]
+        self.refresh_scheduler.register(calendar, calendar.refresh_timer, calendar.update_calendar_events)
+
+        # The clock must keep ticking once per second while visible
+        timetracker = self.tab_widgets["timetracker"]
+        self.refresh_scheduler.register(timetracker, timetracker.clock_timer,
+                                        timetracker.update_clock, backoff=False)
+
     def load_style(self):
         style_path = os.path.join(os.path.dirname(__file__), 'style.qss')
         with open(style_path, 'r') as f:
@@ -0,0 +1,115 @@
+from PySide6.QtCore import QObject, QEvent, QTimer, QElapsedTimer
+from PySide6.QtWidgets import QApplication, QWidget
+
+
+class RefreshJob:
+    def __init__(self, widget, timer, callback, backoff):
+        self.widget = widget
+        self.timer = timer
+        self.callback = callback
+        self.backoff = backoff
+        self.base_interval = timer.interval()
+        self.suspended = False
+
+
+class RefreshScheduler(QObject):
+    """
+    Drives the refresh timers of the tab widgets.
+    Timers of hidden tabs and minimized windows are stopped, poll intervals
+    double while the user is idle, and a tab that becomes visible again gets
+    an immediate catch-up refresh.
+    """
+    IDLE_AFTER = 60 * 1000  # Milliseconds without input before backing off
+    MAX_BACKOFF = 16  # Upper bound for interval / base interval
+
+    ACTIVITY_EVENTS = frozenset({
+        QEvent.Type.MouseMove,
+        QEvent.Type.MouseButtonPress,
+        QEvent.Type.KeyPress,
+        QEvent.Type.Wheel,
+    })
+    VISIBILITY_EVENTS = frozenset({
+        QEvent.Type.Show,
+        QEvent.Type.Hide,
+        QEvent.Type.WindowStateChange,
+    })
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = []
+        self.backed_off = False
+        self.update_pending = False
+
+        self.idle_clock = QElapsedTimer()
+        self.idle_clock.start()
+
+        app = QApplication.instance()
+        if app:
+            app.installEventFilter(self)
+
+    def register(self, widget, timer, callback, backoff=True):
+        """
+        Take over an already configured timer of widget.
+        callback is used for the catch-up refresh when the widget is shown again.
+        Set backoff to False for timers that must keep their rate (e.g. clocks).
+        """
+        job = RefreshJob(widget, timer, callback, backoff)
+        timer.timeout.connect(lambda: self._on_timeout(job))
+        self.jobs.append(job)
+        self._update_job(job)
+        return job
+
+    def is_idle(self):
+        return self.idle_clock.elapsed() > self.IDLE_AFTER
+
+    def eventFilter(self, obj, event):
+        event_type = event.type()
+        if event_type in self.ACTIVITY_EVENTS:
+            self._on_activity()
+        elif event_type in self.VISIBILITY_EVENTS and isinstance(obj, QWidget):
+            if obj.isWindow() or any(job.widget is obj for job in self.jobs):
+                self._schedule_update()
+        return False
+
+    def _schedule_update(self):
+        # Visibility flags are only final after the event has been handled
+        if not self.update_pending:
+            self.update_pending = True
+            QTimer.singleShot(0, self._update_jobs)
+
+    def _update_jobs(self):
+        self.update_pending = False
+        for job in self.jobs:
+            self._update_job(job)
+
+    def _update_job(self, job):
+        widget = job.widget
+        active = widget.isVisible() and not widget.window().isMinimized()
+
+        if active and job.suspended:
+            job.suspended = False
+            job.timer.start(job.base_interval)
+            job.callback()
+        elif not active and not job.suspended:
+            job.suspended = True
+            job.timer.stop()
+
+    def _on_timeout(self, job):
+        if job.backoff and self.is_idle():
+            interval = min(job.timer.interval() * 2, job.base_interval * self.MAX_BACKOFF)
+            if interval != job.timer.interval():
+                job.timer.setInterval(interval)
+                self.backed_off = True
+
+    def _on_activity(self):
+        self.idle_clock.restart()
+        if not self.backed_off:
+            return
+
+        # Back to the base rate as soon as the user returns
+        self.backed_off = False
+        for job in self.jobs:
+            if job.timer.interval() != job.base_interval:
+                job.timer.setInterval(job.base_interval)
+                if not job.suspended:
+                    job.timer.start()
@@ -0,0 +1,81 @@
+import os
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtGui import QPixmap, QPixmapCache
+
+from utils.thumbnails import ThumbnailCache, is_image_type
+
+
+class ThumbnailLoader(QObject):
+    """
+    Asynchronous thumbnails for files rows.
+    thumbnail() answers from QPixmapCache or returns None and schedules the render;
+    thumbnail_ready(key, size) is emitted once the pixmap is available, so views show
+    a placeholder until then and ask again.
+    """
+    thumbnail_ready = Signal(str, int)
+    _rendered = Signal(str, int, str)  # key, size, thumbnail path; emitted from the pool's thread
+
+    def __init__(self, cache_root, parent=None):
+        super().__init__(parent)
+        self.cache = ThumbnailCache(cache_root)
+        self.pending = {}  # (key, size) -> Future
+        self.failed = set()
+        self._rendered.connect(self._on_rendered)
+
+    def thumbnail(self, file, size):
+        # Compressed or chunked blobs are no image file on disk; they keep the type icon
+        if not is_image_type(file.get('type')) or not file.get('path') or file.get('compression'):
+            return None
+        key = ThumbnailCache.key_for(file)
+        pixmap = self.cached(key, size)
+        if pixmap is not None:
+            return pixmap
+        if (key, size) in self.pending or (key, size) in self.failed:
+            return None
+        if not os.path.exists(file['path']):
+            self.failed.add((key, size))
+            return None
+
+        future = self.cache.submit(file['path'], key, size)
+        self.pending[(key, size)] = future
+        future.add_done_callback(lambda f, key=key, size=size: self._on_done(f, key, size))
+        return None
+
+    def is_pending(self, file, size):
+        return (ThumbnailCache.key_for(file), size) in self.pending
+
+    def cancel_pending(self):
+        """Drop renders nobody waits for anymore, e.g. after switching the folder."""
+        for request, future in list(self.pending.items()):
+            if future.cancel():
+                del self.pending[request]
+
+    def cached(self, key, size):
+        pixmap = QPixmapCache.find(self._pixmap_key(key, size))
+        if pixmap is None or pixmap.isNull():
+            return None
+        return pixmap
+
+    def _on_done(self, future, key, size):
+        # Runs in the executor's thread; hand over to the GUI thread through the signal
+        if future.cancelled():
+            return
+        try:
+            path = future.result()
+        except Exception as e:
+            print(f"Vorschaubild konnte nicht erstellt werden: {e}")
+            path = ''
+        self._rendered.emit(key, size, path)
+
+    def _on_rendered(self, key, size, path):
+        self.pending.pop((key, size), None)
+        pixmap = QPixmap(path) if path else QPixmap()
+        if pixmap.isNull():
+            self.failed.add((key, size))
+            return
+        QPixmapCache.insert(self._pixmap_key(key, size), pixmap)
+        self.thumbnail_ready.emit(key, size)
+
+    @staticmethod
+    def _pixmap_key(key, size):
+        return f"thumb:{key}:{size}"
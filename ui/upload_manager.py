@@ -0,0 +1,322 @@
+import os
+import threading
+from datetime import datetime
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+class UploadCancelled(Exception):
+    pass
+
+
+class UploadTask:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, task_id, path, group_id, check_existing, folder_id=None):
+        self.task_id = task_id
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = os.path.getsize(path)
+        self.group_id = group_id
+        self.check_existing = check_existing
+        self.folder_id = folder_id
+        self.state = self.QUEUED
+        self.done = 0
+        self.speed = 0.0
+        self.error = None
+        self.runnable = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in (self.DONE, self.FAILED, self.CANCELLED)
+
+
+class UploadWorkerSignals(QObject):
+    started = Signal(int)
+    progress = Signal(int, 'qint64', float)  # task id, bytes done, bytes per second
+    completed = Signal(int, dict)
+    failed = Signal(int, str)
+    cancelled = Signal(int)
+
+
+class UploadWorker(QRunnable):
+    """Stores one file in the blob store; runs in the upload manager's thread pool."""
+
+    def __init__(self, task, blob_store, user_id):
+        super().__init__()
+        self.task = task
+        self.blob_store = blob_store
+        self.user_id = user_id
+        self.signals = UploadWorkerSignals()
+
+    def run(self):
+        task = self.task
+        if task.cancel_event.is_set():
+            self.signals.cancelled.emit(task.task_id)
+            return
+        self.signals.started.emit(task.task_id)
+        try:
+            digest, size, created = self.blob_store.ingest(
+                task.path, progress=self.on_progress, check_existing=task.check_existing,
+                owner=self.user_id)
+            path, stored_size, compression = self.blob_store.stored(digest)
+        except UploadCancelled:
+            self.signals.cancelled.emit(task.task_id)
+            return
+        except Exception as e:
+            self.signals.failed.emit(task.task_id, str(e))
+            return
+
+        self.signals.completed.emit(task.task_id, {
+            'name': task.name,
+            'path': path,
+            'size': size,
+            'stored_size': stored_size if compression else None,
+            'compression': compression,
+            'type': os.path.splitext(task.name)[1].lower(),
+            'uploaded_at': datetime.now(),
+            'user_id': self.user_id,
+            'folder_id': task.folder_id,
+            'blob_hash': digest
+        })
+
+    def on_progress(self, done, total, speed):
+        # Raising here aborts ingest; a resumable upload keeps its completed chunks
+        if self.task.cancel_event.is_set():
+            raise UploadCancelled()
+        self.signals.progress.emit(self.task.task_id, done, speed)
+
+
+class UploadManager(QObject):
+    """
+    Upload queue with a bounded worker pool.
+    Selected files are split into groups of GROUP_SIZE; the rows of a group are
+    written with one add_files call once all of its files have finished, on the
+    GUI thread, so the shared database connection never leaves it.
+    Failed and cancelled uploads can be retried, they then form a new group;
+    large files continue from their last completed chunk (see BlobStore.ingest).
+    """
+    MAX_WORKERS = 4  # Parallel copies; more only make the disks seek
+    GROUP_SIZE = 50
+
+    task_added = Signal(int)
+    task_changed = Signal(int)
+    progress_changed = Signal('qint64', 'qint64', float)  # bytes done, bytes total, bytes per second of the queue
+    group_saved = Signal(int, bool)  # number of files, success
+    quota_exceeded = Signal('qint64', 'qint64')  # bytes requested, bytes still free
+    queue_finished = Signal()
+
+    def __init__(self, db_manager, user_id, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.user_id = user_id
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(self.MAX_WORKERS)
+        self.tasks = {}
+        self.groups = {}  # group id -> {'tasks': set of task ids, 'files': [file_info, ...]}
+        self.next_task_id = 1
+        self.next_group_id = 1
+
+    def resume_pending(self):
+        """Queue the unfinished resumable uploads of the user whose source is unchanged."""
+        paths = []
+        for manifest in self.db_manager.get_blob_store().pending_uploads(self.user_id):
+            try:
+                stat = os.stat(manifest['source'])
+            except OSError:
+                continue
+            if stat.st_size == manifest['size'] and stat.st_mtime_ns == manifest['mtime_ns']:
+                paths.append(manifest['source'])
+        return self.add_files(paths)
+
+    def add_files(self, paths, folder_id=None):
+        """Queue files for upload into folder_id (None is the top level) and return the new task ids."""
+        queued = {task.path for task in self.tasks.values() if not task.finished}
+        paths = [path for path in paths if os.path.isfile(path) and path not in queued]
+        if not paths:
+            return []
+        if not self._check_quota(sum(os.path.getsize(path) for path in paths)):
+            return []
+        # Only files with the size of a stored blob can be duplicates; those are hashed first
+        known_sizes = self.db_manager.get_existing_blob_sizes(os.path.getsize(path) for path in paths)
+        task_ids = []
+        for start in range(0, len(paths), self.GROUP_SIZE):
+            group_id = self._new_group()
+            for path in paths[start:start + self.GROUP_SIZE]:
+                task = UploadTask(self.next_task_id, path, group_id, os.path.getsize(path) in known_sizes,
+                                  folder_id)
+                self.next_task_id += 1
+                self.tasks[task.task_id] = task
+                self.groups[group_id]['tasks'].add(task.task_id)
+                task_ids.append(task.task_id)
+                self.task_added.emit(task.task_id)
+                self._start(task)
+        self._emit_progress()
+        return task_ids
+
+    def _check_quota(self, requested):
+        """Whether requested more bytes fit into the quota; emits quota_exceeded if not."""
+        # O(1) against the storage counters; uploads still in the queue are counted as used
+        in_queue = sum(task.size for task in self.tasks.values()
+                       if task.state in (UploadTask.QUEUED, UploadTask.RUNNING)
+                       or (task.state == UploadTask.DONE and task.group_id in self.groups))
+        usage = self.db_manager.get_storage_usage(self.user_id)
+        free = usage['quota_bytes'] - usage['used_bytes'] - in_queue
+        if requested > free:
+            self.quota_exceeded.emit(requested, max(0, free))
+            return False
+        return True
+
+    def cancel(self, task_id):
+        task = self.tasks.get(task_id)
+        if task is None or task.finished:
+            return
+        task.cancel_event.set()
+        # Still waiting in the pool: take it out, a running task stops at its next progress report
+        if task.state == UploadTask.QUEUED and self.pool.tryTake(task.runnable):
+            self._on_cancelled(task_id)
+
+    def cancel_all(self):
+        for task_id in list(self.tasks):
+            self.cancel(task_id)
+
+    def retry(self, task_id):
+        task = self.tasks.get(task_id)
+        if task is None or task.state not in (UploadTask.FAILED, UploadTask.CANCELLED):
+            return
+        if not os.path.isfile(task.path):
+            task.error = "Datei nicht mehr vorhanden"
+            self.task_changed.emit(task_id)
+            return
+        size = os.path.getsize(task.path)
+        if not self._check_quota(size):
+            return
+        # Leave the old group, which may then be complete without this task
+        old_group_id = task.group_id
+        if old_group_id in self.groups:
+            self.groups[old_group_id]['tasks'].discard(task_id)
+        group_id = self._new_group()
+        self.groups[group_id]['tasks'].add(task_id)
+        task.group_id = group_id
+        self._check_group(old_group_id)
+        task.size = size
+        task.state = UploadTask.QUEUED
+        task.done = 0
+        task.speed = 0.0
+        task.error = None
+        task.cancel_event.clear()
+        self.task_changed.emit(task_id)
+        self._start(task)
+        self._emit_progress()
+
+    def retry_failed(self):
+        task_ids = [task_id for task_id, task in self.tasks.items()
+                    if task.state in (UploadTask.FAILED, UploadTask.CANCELLED)]
+        # All or nothing, like add_files; missing files are skipped (retry reports them)
+        requested = sum(os.path.getsize(self.tasks[task_id].path) for task_id in task_ids
+                        if os.path.isfile(self.tasks[task_id].path))
+        if not task_ids or not self._check_quota(requested):
+            return
+        for task_id in task_ids:
+            self.retry(task_id)
+
+    def clear_finished(self):
+        """Forget finished tasks that are no longer part of a pending group."""
+        for task_id, task in list(self.tasks.items()):
+            if task.finished and task.group_id not in self.groups:
+                del self.tasks[task_id]
+
+    def is_busy(self):
+        return any(not task.finished for task in self.tasks.values())
+
+    def _new_group(self):
+        group_id = self.next_group_id
+        self.next_group_id += 1
+        self.groups[group_id] = {'tasks': set(), 'files': []}
+        return group_id
+
+    def _start(self, task):
+        worker = UploadWorker(task, self.db_manager.get_blob_store(), self.user_id)
+        worker.signals.started.connect(self._on_started)
+        worker.signals.progress.connect(self._on_progress)
+        worker.signals.completed.connect(self._on_completed)
+        worker.signals.failed.connect(self._on_failed)
+        worker.signals.cancelled.connect(self._on_cancelled)
+        task.runnable = worker
+        self.pool.start(worker)
+
+    def _on_started(self, task_id):
+        task = self.tasks[task_id]
+        task.state = UploadTask.RUNNING
+        self.task_changed.emit(task_id)
+
+    def _on_progress(self, task_id, done, speed):
+        task = self.tasks[task_id]
+        task.done = done
+        task.speed = speed
+        self.task_changed.emit(task_id)
+        self._emit_progress()
+
+    def _on_completed(self, task_id, file_info):
+        task = self.tasks[task_id]
+        task.state = UploadTask.DONE
+        task.done = task.size
+        self.groups[task.group_id]['files'].append(file_info)
+        self._task_finished(task)
+
+    def _on_failed(self, task_id, error):
+        task = self.tasks[task_id]
+        task.state = UploadTask.FAILED
+        task.error = error
+        self._task_finished(task)
+
+    def _on_cancelled(self, task_id):
+        task = self.tasks[task_id]
+        if task.finished:
+            return
+        task.state = UploadTask.CANCELLED
+        self._task_finished(task)
+
+    def _task_finished(self, task):
+        task.runnable = None
+        task.speed = 0.0
+        self.task_changed.emit(task.task_id)
+
+        self._check_group(task.group_id)
+        self._emit_progress()
+        if not self.is_busy():
+            self.queue_finished.emit()
+
+    def _check_group(self, group_id):
+        group = self.groups.get(group_id)
+        if group is not None and all(self.tasks[task_id].finished for task_id in group['tasks']):
+            del self.groups[group_id]
+            self._save_group(group)
+
+    def _save_group(self, group):
+        if not group['files']:
+            return
+        saved = self.db_manager.add_files(group['files'])
+        if not saved:
+            # Usually the blobs are stored and only the rows are missing; a retry ingests them
+            # without copying, or stores them again if a concurrent deletion removed them
+            for task_id in group['tasks']:
+                task = self.tasks[task_id]
+                if task.state == UploadTask.DONE:
+                    task.check_existing = True
+                    task.state = UploadTask.FAILED
+                    task.error = "Datenbankeintrag fehlgeschlagen"
+                    self.task_changed.emit(task_id)
+        self.group_saved.emit(len(group['files']), saved)
+
+    def _emit_progress(self):
+        # Aggregate over everything since the queue was last idle
+        tasks = [task for task in self.tasks.values() if task.state != UploadTask.CANCELLED]
+        total = sum(task.size for task in tasks)
+        done = sum(task.size if task.state == UploadTask.DONE else task.done for task in tasks)
+        speed = sum(task.speed for task in tasks if task.state == UploadTask.RUNNING)
+        self.progress_changed.emit(done, total, speed)
@@ -2,18 +2,165 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout,
                                QPushButton, QLabel, QTextEdit, QScrollArea,
                                QFrame, QLineEdit, QSplitter, QListWidget,
                                QListWidgetItem, QSizePolicy, QMenu, QToolButton,
-                               QTabWidget, QGridLayout, QDialog, QAbstractItemView)
-from PySide6.QtCore import Qt, QTimer, QDateTime, QEvent, QSize, QPoint
-from PySide6.QtGui import QColor, QTextCursor, QIcon, QAction
-import emoji
-from PySide6.QtWidgets import QApplication
+                               QTabWidget, QGridLayout, QDialog, QAbstractItemView,
+                               QListView, QStyledItemDelegate, QStyle)
+from PySide6.QtCore import (Qt, QTimer, QDateTime, QEvent, QSize, QPoint, QRect, QRectF,
+                            QAbstractListModel, QModelIndex, QSortFilterProxyModel, Signal, QThread)
+from PySide6.QtGui import (QColor, QTextCursor, QIcon, QAction, QPainter, QFont, QPixmap,
+                           QStaticText, QTransform, QPalette)
+from PySide6.QtWidgets import QApplication, QStyleOption
+import os
+import html
+import math
 import datetime
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
+from database.db_manager import DatabaseManager
+from utils.chat_outbox import ChatOutbox
+from utils.config import LOCAL_DATA_FOLDER
+from utils.emoji_index import emojize, get_emoji_index
+
+# Categories of the emoji picker; tab title is the part after the icon
+EMOJI_CATEGORIES = {
+    "😊 Smileys": [
+        "😀", "😃", "😄", "😁", "😅", "😂", "🤣", "😊", "😇", "🙂", "🙃", "😉", "😌", "😍",
+        "🥰", "😘", "😗", "😙", "😚", "😋", "😛", "😝", "😜", "🤪", "🤨", "🧐", "🤓", "😎",
+        "🤩", "🥳", "😏", "😒", "😞", "😔", "😟", "😕", "🙁", "☹️", "😣", "😖", "😫", "😩"
+    ],
+    "❤️ Herzen": [
+        "❤️", "🧡", "💛", "💚", "💙", "💜", "🖤", "🤍", "🤎", "💔", "❤️‍🔥", "❤️‍🩹",
+        "💖", "💗", "💓", "💞", "💕", "💟", "❣️", "💝", "💘", "💌"
+    ],
+    "👍 Gesten": [
+        "👍", "👎", "👌", "🤌", "🤏", "✌️", "🤞", "🤟", "🤘", "🤙", "👈", "👉", "👆", "👇",
+        "☝️", "👋", "🤚", "🖐️", "✋", "🖖", "👏", "🙌", "👐", "🤲", "🤝", "🙏"
+    ],
+    "🎮 Gaming": [
+        "🎮", "🕹️", "🎲", "🎯", "🎳", "🎪", "🎨", "🎭", "🎟️", "🎫", "🎖️", "🏆", "🏅",
+        "🥇", "🥈", "🥉", "⚽", "🏀", "🏈", "⚾", "🥎", "🎾", "🏐", "🏉", "🎱"
+    ],
+    "💻 Technik": [
+        "💻", "🖥️", "💽", "💾", "💿", "📀", "🎥", "📹", "📼", "📱", "☎️", "📞", "📟", "📠",
+        "📺", "📻", "🎙️", "🎚️", "🎛️", "🧭", "⌚", "⏰", "⏱️", "⏲️", "🕰️", "📡"
+    ],
+    "🚀 Objekte": [
+        "🚀", "✨", "💡", "🔋", "🔌", "📎", "📏", "📐", "✂️", "🗑️", "🔒", "🔓", "🔑", "🔨",
+        "🪛", "🔧", "🪜", "🧰", "🎁", "📦", "📫", "💰", "💳", "💎", "⚡", "🔥"
+    ]
+}
+
+class EmojiGlyphAtlas:
+    """Renders every emoji glyph once into shared pixmap pages that the delegate copies from"""
+    CELL = 32  # Logical size of one glyph cell
+    COLUMNS = 16
+    ROWS = 16
+
+    def __init__(self, pixel_size=22):
+        self.font = QFont()
+        self.font.setPixelSize(pixel_size)
+        self.pages = {}  # (device pixel ratio, page number) -> QPixmap
+        self.glyphs = {}  # (emoji, device pixel ratio) -> (QPixmap, source QRectF)
+        self.slots = {}  # device pixel ratio -> number of rendered glyphs
+
+    def glyph(self, emoji_char, dpr):
+        key = (emoji_char, dpr)
+        if key not in self.glyphs:
+            self.glyphs[key] = self.render(emoji_char, dpr)
+        return self.glyphs[key]
+
+    def render(self, emoji_char, dpr):
+        slot = self.slots.get(dpr, 0)
+        self.slots[dpr] = slot + 1
+        page_number, cell = divmod(slot, self.COLUMNS * self.ROWS)
+
+        page = self.pages.get((dpr, page_number))
+        if page is None:
+            page = QPixmap(round(self.COLUMNS * self.CELL * dpr), round(self.ROWS * self.CELL * dpr))
+            page.setDevicePixelRatio(dpr)
+            page.fill(Qt.GlobalColor.transparent)
+            self.pages[(dpr, page_number)] = page
+
+        x = (cell % self.COLUMNS) * self.CELL
+        y = (cell // self.COLUMNS) * self.CELL
+        painter = QPainter(page)
+        painter.setFont(self.font)
+        painter.drawText(QRect(x, y, self.CELL, self.CELL), Qt.AlignmentFlag.AlignCenter, emoji_char)
+        painter.end()
+
+        # Source rectangles are in device pixels
+        return page, QRectF(x * dpr, y * dpr, self.CELL * dpr, self.CELL * dpr)
+
+class EmojiListModel(QAbstractListModel):
+    def __init__(self, emojis=(), parent=None):
+        super().__init__(parent)
+        self.emojis = list(emojis)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.emojis)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        emoji_char = self.emojis[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return emoji_char
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return get_emoji_index().name(emoji_char)
+        return None
+
+    def set_emojis(self, emojis):
+        self.beginResetModel()
+        self.emojis = list(emojis)
+        self.endResetModel()
+
+class EmojiDelegate(QStyledItemDelegate):
+    CELL_SIZE = 40
+
+    def __init__(self, atlas, parent=None):
+        super().__init__(parent)
+        self.atlas = atlas
+        self.hover_color = QColor("#363636")
+
+    def sizeHint(self, option, index):
+        return QSize(self.CELL_SIZE, self.CELL_SIZE)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.StateFlag.State_MouseOver:
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(self.hover_color)
+            painter.drawRoundedRect(option.rect.adjusted(1, 1, -1, -1), 4, 4)
+
+        page, source = self.atlas.glyph(index.data(), painter.device().devicePixelRatioF())
+        target = QRectF(0, 0, self.atlas.CELL, self.atlas.CELL)
+        target.moveCenter(QRectF(option.rect).center())
+        painter.drawPixmap(target, page, source)
+        painter.restore()
 
 class EmojiPickerWindow(QWidget):
+    """
+    Emoji popup shared by the message input and the reactions.
+    Use EmojiPickerWindow.instance(); category grids are built when their tab is first shown.
+    """
+    emoji_selected = Signal(str)
+    SEARCH_LIMIT = 120
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
     def __init__(self, parent=None):
         super().__init__(parent, Qt.WindowType.Popup)
-        self.parent = parent
+        self.callback = None
+        self.atlas = EmojiGlyphAtlas()
+        self.delegate = EmojiDelegate(self.atlas, self)
+        self.built_tabs = set()
         self.setup_ui()
         
     def setup_ui(self):
@@ -38,17 +185,7 @@ class EmojiPickerWindow(QWidget):
             QTabBar::tab:selected {
                 background-color: #3498db;
             }
-            QPushButton {
-                background: transparent;
-                border: none;
-                padding: 5px;
-                font-size: 20px;
-            }
-            QPushButton:hover {
-                background-color: #363636;
-                border-radius: 4px;
-            }
-            QScrollArea {
+            QListView {
                 border: none;
             }
         """)
@@ -57,10 +194,9 @@ class EmojiPickerWindow(QWidget):
         layout.setContentsMargins(8, 8, 8, 8)
         layout.setSpacing(4)
         
-        # Search bar (optional for future implementation)
-        search_input = QLineEdit()
-        search_input.setPlaceholderText("Search emoji...")
-        search_input.setStyleSheet("""
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search emoji...")
+        self.search_input.setStyleSheet("""
             QLineEdit {
                 background-color: #363636;
                 border: none;
@@ -68,68 +204,76 @@ class EmojiPickerWindow(QWidget):
                 border-radius: 4px;
             }
         """)
-        layout.addWidget(search_input)
-        
-        # Tab widget for categories
-        tab_widget = QTabWidget()
-        layout.addWidget(tab_widget)
-        
-        # Emoji categories
-        self.emoji_categories = {
-            "😊 Smileys": [
-                "😀", "😃", "😄", "😁", "😅", "😂", "🤣", "😊", "😇", "🙂", "🙃", "😉", "😌", "😍",
-                "🥰", "😘", "😗", "😙", "😚", "😋", "😛", "😝", "😜", "🤪", "🤨", "🧐", "🤓", "😎",
-                "🤩", "🥳", "😏", "😒", "😞", "😔", "😟", "😕", "🙁", "☹️", "😣", "😖", "😫", "😩"
-            ],
-            "❤️ Herzen": [
-                "❤️", "🧡", "💛", "💚", "💙", "💜", "🖤", "🤍", "🤎", "💔", "❤️‍🔥", "❤️‍🩹",
-                "💖", "💗", "💓", "💞", "💕", "💟", "❣️", "💝", "💘", "💌"
-            ],
-            "👍 Gesten": [
-                "👍", "👎", "👌", "🤌", "🤏", "✌️", "🤞", "🤟", "🤘", "🤙", "👈", "👉", "👆", "👇",
-                "☝️", "👋", "🤚", "🖐️", "✋", "🖖", "👏", "🙌", "👐", "🤲", "🤝", "🙏"
-            ],
-            "🎮 Gaming": [
-                "🎮", "🕹️", "🎲", "🎯", "🎳", "🎪", "🎨", "🎭", "🎪", "🎟️", "🎫", "🎖️", "🏆", "🏅",
-                "🥇", "🥈", "🥉", "⚽", "🏀", "🏈", "⚾", "🥎", "🎾", "🏐", "🏉", "🎱"
-            ],
-            "💻 Technik": [
-                "💻", "🖥️", "💽", "💾", "💿", "📀", "🎥", "📹", "📼", "📱", "☎️", "📞", "📟", "📠",
-                "📺", "📻", "🎙️", "🎚️", "🎛️", "🧭", "⌚", "⏰", "⏱️", "⏲️", "🕰️", "📡"
-            ],
-            "🚀 Objekte": [
-                "🚀", "✨", "💡", "🔋", "🔌", "📎", "📏", "📐", "✂️", "🗑️", "🔒", "🔓", "🔑", "🔨",
-                "🪛", "🔧", "🪜", "🧰", "🎁", "📦", "📫", "💰", "💳", "💎", "⚡", "🔥"
-            ]
-        }
+        self.search_input.textChanged.connect(self.filter_emojis)
+        layout.addWidget(self.search_input)
         
-        # Create tabs for each category
-        for category, emojis in self.emoji_categories.items():
+        # Tab widget for categories, filled on first show of each tab
+        self.tab_widget = QTabWidget()
+        for category in EMOJI_CATEGORIES:
             tab = QWidget()
             tab_layout = QVBoxLayout(tab)
-            scroll = QScrollArea()
-            scroll.setWidgetResizable(True)
-            scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-            
-            content = QWidget()
-            grid = QGridLayout(content)
-            grid.setSpacing(2)
-            
-            # Add emojis to grid
-            for i, emoji_char in enumerate(emojis):
-                button = QPushButton(emoji_char)
-                button.setFixedSize(QSize(40, 40))
-                button.clicked.connect(lambda checked, e=emoji_char: self.on_emoji_selected(e))
-                grid.addWidget(button, i // 6, i % 6)  # 6 emojis per row
-            
-            scroll.setWidget(content)
-            tab_layout.addWidget(scroll)
-            tab_widget.addTab(tab, category.split()[1])  # Use category name without emoji
-            
+            tab_layout.setContentsMargins(0, 0, 0, 0)
+            self.tab_widget.addTab(tab, category.split()[1])  # Use category name without emoji
+        self.tab_widget.currentChanged.connect(self.build_tab)
+        layout.addWidget(self.tab_widget)
+        
+        # Search results replace the tabs while a query is entered
+        self.search_model = EmojiListModel(parent=self)
+        self.search_view = self.create_grid_view(self.search_model)
+        self.search_view.hide()
+        layout.addWidget(self.search_view)
+        
+        self.build_tab(0)
+
+    def create_grid_view(self, model):
+        view = QListView()
+        view.setViewMode(QListView.ViewMode.IconMode)
+        view.setMovement(QListView.Movement.Static)
+        view.setResizeMode(QListView.ResizeMode.Adjust)
+        view.setUniformItemSizes(True)
+        view.setGridSize(QSize(EmojiDelegate.CELL_SIZE, EmojiDelegate.CELL_SIZE))
+        view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        view.setMouseTracking(True)
+        view.setModel(model)
+        view.setItemDelegate(self.delegate)
+        view.clicked.connect(lambda index: self.on_emoji_selected(index.data()))
+        return view
+
+    def build_tab(self, tab_index):
+        if tab_index < 0 or tab_index in self.built_tabs:
+            return
+        self.built_tabs.add(tab_index)
+        emojis = list(EMOJI_CATEGORIES.values())[tab_index]
+        model = EmojiListModel(emojis, self)
+        self.tab_widget.widget(tab_index).layout().addWidget(self.create_grid_view(model))
+
+    def filter_emojis(self, text):
+        searching = bool(text.strip())
+        if searching:
+            self.search_model.set_emojis(get_emoji_index().search(text, self.SEARCH_LIMIT))
+        self.search_view.setVisible(searching)
+        self.tab_widget.setVisible(not searching)
+
+    def open_for(self, callback, pos):
+        """Show the picker at pos; callback receives the chosen emoji"""
+        self.callback = callback
+        self.search_input.clear()
+        self.move(pos)
+        self.show()
+        self.search_input.setFocus()
+
     def on_emoji_selected(self, emoji_char):
-        if hasattr(self.parent, 'insert_emoji'):
-            self.parent.insert_emoji(emoji_char)
-            self.hide()
+        callback = self.callback
+        self.hide()
+        self.emoji_selected.emit(emoji_char)
+        if callback:
+            callback(emoji_char)
+
+    def hideEvent(self, event):
+        # Do not keep message bubbles alive that may be rebuilt in the meantime
+        self.callback = None
+        super().hideEvent(event)
 
 class QuickReactionMenu(QFrame):
     def __init__(self, parent=None):
@@ -246,7 +390,7 @@ class MessageBubble(QFrame):
         bubble_layout.setContentsMargins(12, 8, 12, 8)
         
         # Message content
-        content = QLabel(emoji.emojize(self.message_data['message'], language='alias'))
+        content = QLabel(emojize(self.message_data['message']))
         content.setWordWrap(True)
         content.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Minimum)
         content.setTextFormat(Qt.TextFormat.RichText)
@@ -258,7 +402,7 @@ class MessageBubble(QFrame):
         time_layout.setSpacing(4)
         time_layout.addStretch()
         
-        timestamp = QLabel(self.message_data['timestamp'].strftime("%H:%M"))
+        timestamp = QLabel(message_time_text(self.message_data['timestamp']))
         timestamp.setStyleSheet("""
             color: #808080;
             font-size: 11px;
@@ -291,14 +435,8 @@ class MessageBubble(QFrame):
             reactions_layout.setContentsMargins(8, 4, 8, 4)
             reactions_layout.setSpacing(4)
             
-            reaction_counts = {}
-            for reaction in self.message_data['reactions'].values():
-                if reaction in reaction_counts:
-                    reaction_counts[reaction] += 1
-                else:
-                    reaction_counts[reaction] = 1
-            
-            for reaction, count in reaction_counts.items():
+            # Reactions arrive pre-aggregated as {emoji: count}
+            for reaction, count in self.message_data['reactions'].items():
                 reaction_label = QLabel(f"{reaction} {count}" if count > 1 else reaction)
                 reaction_label.setStyleSheet("font-size: 13px;")
                 reactions_layout.addWidget(reaction_label)
@@ -309,9 +447,7 @@ class MessageBubble(QFrame):
         
         # Reaction button (only for messages from others)
         if not is_own_message:
-            user_reaction = None
-            if self.message_data.get('reactions'):
-                user_reaction = self.message_data['reactions'].get(str(self.chat_widget.user_data['id']))
+            user_reaction = self.message_data.get('own_reaction')
             
             self.reaction_button = QPushButton(user_reaction + " +" if user_reaction else "😊")
             self.reaction_button.setStyleSheet("""
@@ -341,23 +477,14 @@ class MessageBubble(QFrame):
             main_layout.addStretch()
 
     def add_reaction(self, reaction):
-        # Remove existing reaction if any
-        self.chat_widget.db_manager.remove_message_reaction(
-            str(self.message_data['_id']),
-            str(self.chat_widget.user_data['id'])
-        )
-        
-        # Add new reaction
+        # Upsert replaces any existing reaction of this user
         self.chat_widget.db_manager.add_message_reaction(
-            str(self.message_data['_id']),
-            str(self.chat_widget.user_data['id']),
+            self.message_data['id'],
+            self.chat_widget.user_data['id'],
             reaction
         )
         
-        # Update the message data
-        self.message_data = self.chat_widget.db_manager.get_message(str(self.message_data['_id']))
-        
-        # Update the UI
+        # Reload the page; reactions are merged in by get_chat_messages
         self.chat_widget.update_messages()
     
     def show_reaction_menu(self):
@@ -379,25 +506,176 @@ class MessageBubble(QFrame):
         self.reaction_menu.activateWindow()
     
     def show_full_emoji_picker(self):
-        if not hasattr(self.chat_widget, 'emoji_picker'):
-            self.chat_widget.emoji_picker = EmojiPickerWindow(self)
-        
-        picker = self.chat_widget.emoji_picker
-        picker.on_emoji_selected = lambda emoji: self.add_reaction(emoji)
-        
+        picker = EmojiPickerWindow.instance()
         # Position picker above the message
-        pos = self.mapToGlobal(QPoint(0, -picker.height()))
-        picker.move(pos)
-        picker.show()
+        picker.open_for(self.add_reaction, self.mapToGlobal(QPoint(0, -picker.height())))
+
+class ContactListModel(QAbstractListModel):
+    """Contacts of the chat sidebar, ordered by most recent conversation"""
+    ContactRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.contacts = []
+        self.rows_by_id = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.contacts)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        contact = self.contacts[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return contact['name']
+        if role == Qt.ItemDataRole.UserRole:
+            return contact['id']
+        if role == self.ContactRole:
+            return contact
+        return None
+
+    def set_contacts(self, contacts):
+        self.beginResetModel()
+        self.contacts = list(contacts)
+        self._reindex(0, len(self.contacts))
+        self.endResetModel()
+
+    def row_of(self, contact_id):
+        return self.rows_by_id.get(contact_id)
+
+    def update_contact(self, contact_id, **changes):
+        row = self.row_of(contact_id)
+        if row is None:
+            return False
+        self.contacts[row].update(changes)
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def move_to_top(self, contact_id, **changes):
+        """Update a contact and move only its row to the top"""
+        row = self.row_of(contact_id)
+        if row is None:
+            return False
+        if row > 0:
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), 0)
+            self.contacts.insert(0, self.contacts.pop(row))
+            self._reindex(0, row + 1)
+            self.endMoveRows()
+        return self.update_contact(contact_id, **changes)
+
+    def _reindex(self, start, end):
+        if start == 0 and end == len(self.contacts):
+            self.rows_by_id = {}
+        for row in range(start, end):
+            self.rows_by_id[self.contacts[row]['id']] = row
+
+
+class ContactDelegate(QStyledItemDelegate):
+    """Paints a contact row (avatar, name, last message, time, unread badge)"""
+    ROW_HEIGHT = 56
+    AVATAR_SIZE = 40
 
-class UserSelectionDialog(QDialog):
     def __init__(self, parent=None):
+        super().__init__(parent)
+        self.name_font = None
+        self.detail_font = None
+        self.badge_font = None
+
+    def _init_fonts(self, base_font):
+        self.name_font = QFont(base_font)
+        self.name_font.setBold(True)
+        self.detail_font = QFont(base_font)
+        self.detail_font.setPixelSize(12)
+        self.badge_font = QFont(self.detail_font)
+        self.badge_font.setPixelSize(11)
+        self.badge_font.setBold(True)
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def paint(self, painter, option, index):
+        contact = index.data(ContactListModel.ContactRole)
+        if contact is None:
+            return
+        if self.name_font is None:
+            self._init_fonts(option.font)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        rect = option.rect.adjusted(8, 2, -8, -2)
+
+        # Background
+        if option.state & QStyle.StateFlag.State_Selected:
+            background = QColor("#36393f")
+        elif option.state & QStyle.StateFlag.State_MouseOver:
+            background = QColor("#2f3136")
+        else:
+            background = None
+        if background is not None:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(background)
+            painter.drawRoundedRect(rect, 4, 4)
+
+        # Avatar
+        avatar = QRect(rect.left() + 8, rect.center().y() - self.AVATAR_SIZE // 2,
+                       self.AVATAR_SIZE, self.AVATAR_SIZE)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor("#2f3136"))
+        painter.drawEllipse(avatar)
+        painter.setPen(QColor("#ffffff"))
+        painter.drawText(avatar, Qt.AlignmentFlag.AlignCenter, "#" if contact.get('channel_id') else "👤")
+
+        # Time and unread badge column
+        meta = QRect(rect.right() - 56, rect.top() + 6, 48, rect.height() - 12)
+        if contact.get('last_time'):
+            painter.setFont(self.detail_font)
+            painter.setPen(QColor("#8e9297"))
+            painter.drawText(meta, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignTop,
+                             contact['last_time'])
+        if contact.get('unread'):
+            text = str(contact['unread'])
+            painter.setFont(self.badge_font)
+            width = max(18, painter.fontMetrics().horizontalAdvance(text) + 10)
+            badge = QRect(meta.right() - width + 1, meta.bottom() - 17, width, 18)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor("#5865f2"))
+            painter.drawRoundedRect(badge, 9, 9)
+            painter.setPen(QColor("#ffffff"))
+            painter.drawText(badge, Qt.AlignmentFlag.AlignCenter, text)
+
+        # Name and last message, elided to the free width
+        text_rect = QRect(avatar.right() + 12, rect.top() + 6,
+                          meta.left() - avatar.right() - 20, rect.height() - 12)
+        painter.setFont(self.name_font)
+        painter.setPen(QColor("#ffffff"))
+        name = painter.fontMetrics().elidedText(contact['name'], Qt.TextElideMode.ElideRight,
+                                                text_rect.width())
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop, name)
+
+        painter.setFont(self.detail_font)
+        painter.setPen(QColor("#8e9297"))
+        last_message = painter.fontMetrics().elidedText(contact.get('last_message', ''),
+                                                        Qt.TextElideMode.ElideRight,
+                                                        text_rect.width())
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignBottom,
+                         last_message)
+        painter.restore()
+
+
+class UserSelectionDialog(QDialog):
+    MAX_RESULTS = 100
+
+    def __init__(self, parent=None, multi_select=False):
         super().__init__(parent)
         self.selected_user = None
+        # Multi select picks the members of a new channel; checks survive filtering
+        self.multi_select = multi_select
+        self.checked_users = {}
         self.setup_ui()
 
     def setup_ui(self):
-        self.setWindowTitle("Neuen Chat starten")
+        self.setWindowTitle("Neuen Kanal erstellen" if self.multi_select else "Neuen Chat starten")
         self.setMinimumWidth(400)
         self.setStyleSheet("""
             QDialog {
@@ -454,6 +732,14 @@ class UserSelectionDialog(QDialog):
         layout.setSpacing(10)
         layout.setContentsMargins(20, 20, 20, 20)
 
+        # Kanalname
+        self.channel_name_input = QLineEdit()
+        if self.multi_select:
+            layout.addWidget(QLabel("Kanalname:"))
+            self.channel_name_input.setPlaceholderText("z.B. Team Marketing")
+            self.channel_name_input.textChanged.connect(self.update_ok_button)
+            layout.addWidget(self.channel_name_input)
+
         # Suchfeld
         search_layout = QVBoxLayout()
         search_label = QLabel("Benutzer suchen:")
@@ -472,7 +758,7 @@ class UserSelectionDialog(QDialog):
 
         # Buttons
         button_layout = QHBoxLayout()
-        self.ok_button = QPushButton("Chat starten")
+        self.ok_button = QPushButton("Kanal erstellen" if self.multi_select else "Chat starten")
         self.cancel_button = QPushButton("Abbrechen")
         self.cancel_button.setStyleSheet("""
             QPushButton {
@@ -491,48 +777,290 @@ class UserSelectionDialog(QDialog):
         self.search_input.textChanged.connect(self.filter_users)
         self.ok_button.clicked.connect(self.accept)
         self.cancel_button.clicked.connect(self.reject)
-        self.user_list.itemDoubleClicked.connect(self.accept)
-        self.user_list.currentItemChanged.connect(self.update_ok_button)
+        if self.multi_select:
+            self.user_list.itemChanged.connect(self.on_item_checked)
+        else:
+            self.user_list.itemDoubleClicked.connect(self.accept)
+            self.user_list.currentItemChanged.connect(self.update_ok_button)
 
         # Initial state
         self.ok_button.setEnabled(False)
 
-    def set_users(self, users, current_user_id):
-        self.all_users = [u for u in users if u['id'] != current_user_id]
-        self.update_user_list()
+    def set_user_index(self, user_index, current_user_id):
+        self.user_index = user_index
+        self.current_user_id = current_user_id
+        self.filter_users(self.search_input.text())
 
-    def update_user_list(self):
+    def update_user_list(self, users):
+        self.user_list.blockSignals(True)
         self.user_list.clear()
-        for user in self.all_users:
+        for user in users:
             item = QListWidgetItem()
             item.setText(f"{user['username']}")
             item.setData(Qt.UserRole, user)
+            if self.multi_select:
+                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+                checked = user['id'] in self.checked_users
+                item.setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
             self.user_list.addItem(item)
+        self.user_list.blockSignals(False)
+        self.update_ok_button()
+
+    def on_item_checked(self, item):
+        user = item.data(Qt.UserRole)
+        if item.checkState() == Qt.CheckState.Checked:
+            self.checked_users[user['id']] = user
+        else:
+            self.checked_users.pop(user['id'], None)
+        self.update_ok_button()
 
     def filter_users(self, search_text):
-        search_text = search_text.lower()
-        for i in range(self.user_list.count()):
-            item = self.user_list.item(i)
-            user = item.data(Qt.UserRole)
-            item.setHidden(search_text not in user['username'].lower())
+        # Ranked matches from the shared index; only the top results are listed
+        users = self.user_index.search(search_text, limit=self.MAX_RESULTS,
+                                       exclude={self.current_user_id})
+        self.update_user_list(users)
+        if users:
+            self.user_list.setCurrentRow(0)
 
-    def update_ok_button(self, current, previous):
-        self.ok_button.setEnabled(current is not None)
+    def update_ok_button(self, *args):
+        if self.multi_select:
+            self.ok_button.setEnabled(bool(self.channel_name_input.text().strip() and self.checked_users))
+        else:
+            self.ok_button.setEnabled(self.user_list.currentItem() is not None)
 
     def get_selected_user(self):
         if self.result() == QDialog.Accepted and self.user_list.currentItem():
             return self.user_list.currentItem().data(Qt.UserRole)
         return None
 
+    def get_selected_users(self):
+        if self.result() == QDialog.Accepted:
+            return list(self.checked_users.values())
+        return []
+
+    def get_channel_name(self):
+        return self.channel_name_input.text().strip()
+
+# Styles of the message rows, parsed once for the whole message list instead of per label
+MESSAGE_STYLES = """
+    QWidget#ownMessage {
+        background-color: #1e1e1e;
+    }
+    QWidget#otherMessage {
+        background-color: #252525;
+    }
+    QLabel#messageSender, QLabel#messageTime {
+        color: #888888;
+        font-size: 10px;
+    }
+    QLabel#messageReactions {
+        color: #cccccc;
+        font-size: 12px;
+    }
+    QWidget#messageText {
+        background-color: #2b2b2b;
+        border-radius: 4px;
+    }
+"""
+
+@lru_cache(maxsize=1024)
+def parse_timestamp(text):
+    return datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
+
+@lru_cache(maxsize=1440)
+def clock_text(hour, minute):
+    return f"{hour:02d}:{minute:02d}"
+
+def message_time_text(timestamp):
+    """HH:MM of a message timestamp (datetime or database string)"""
+    if isinstance(timestamp, str):
+        timestamp = parse_timestamp(timestamp)
+    return clock_text(timestamp.hour, timestamp.minute)
+
+class MessageLayoutCache:
+    """
+    Text layouts of chat messages keyed by message, width bucket and font.
+    Widths are rounded down to WIDTH_BUCKET pixels, so resizing the chat only
+    lays a message out again when it crosses a bucket. Layout sizes are kept
+    for every message; prepared layouts only for the painted (visible) ones.
+    """
+    MAX_ENTRIES = 2000  # Prepared layouts
+    MAX_SIZES = 20000  # Layout sizes, far cheaper to keep
+    WIDTH_BUCKET = 24
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.sizes = OrderedDict()
+
+    def bucket(self, width):
+        if width < 0:
+            return width  # Unwrapped
+        return max(self.WIDTH_BUCKET, width - width % self.WIDTH_BUCKET)
+
+    def get(self, key, text, width, font):
+        """Prepared layout for painting"""
+        cache_key = (key, self.bucket(width), font.key())
+        static_text = self._lookup(self.entries, cache_key)
+        if static_text is None:
+            static_text = self._layout(text, cache_key[1], font)
+            self._store(self.entries, cache_key, static_text, self.MAX_ENTRIES)
+        return static_text
+
+    def size(self, key, text, width, font):
+        """Size of the layout; only the size is kept, not the layout"""
+        cache_key = (key, self.bucket(width), font.key())
+        size = self._lookup(self.sizes, cache_key)
+        if size is None:
+            # Measured with a throwaway layout unless the message is painted already
+            static_text = self._lookup(self.entries, cache_key)
+            if static_text is None:
+                static_text = self._layout(text, cache_key[1], font)
+            size = static_text.size()
+            self._store(self.sizes, cache_key, size, self.MAX_SIZES)
+        return size
+
+    def _layout(self, text, width, font):
+        static_text = QStaticText(text)
+        static_text.setTextFormat(Qt.TextFormat.PlainText)
+        static_text.setTextWidth(width)
+        static_text.prepare(QTransform(), font)
+        return static_text
+
+    def _lookup(self, entries, cache_key):
+        value = entries.get(cache_key)
+        if value is not None:
+            entries.move_to_end(cache_key)
+        return value
+
+    def _store(self, entries, cache_key, value, max_entries):
+        entries[cache_key] = value
+        if len(entries) > max_entries:
+            entries.popitem(last=False)
+
+class MessageTextLabel(QWidget):
+    """
+    Word wrapped message text painted from a MessageLayoutCache.
+    Replaces a QLabel so that resizing the chat reuses prepared layouts.
+    """
+    PADDING = 8
+    MAX_TEXT_WIDTH = 480
+
+    def __init__(self, text, cache_key, layout_cache, parent=None):
+        super().__init__(parent)
+        self.text = text
+        self.cache_key = cache_key if cache_key is not None else text
+        self.layout_cache = layout_cache
+        self.setObjectName("messageText")
+        self.setAttribute(Qt.WidgetAttribute.WA_StyledBackground)
+        policy = QSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred)
+        policy.setHeightForWidth(True)
+        self.setSizePolicy(policy)
+
+    def static_text(self, width):
+        return self.layout_cache.get(self.cache_key, self.text, max(1, width - 2 * self.PADDING), self.font())
+
+    def text_size(self, width):
+        return self.layout_cache.size(self.cache_key, self.text, width, self.font())
+
+    def hasHeightForWidth(self):
+        return True
+
+    def heightForWidth(self, width):
+        # Runs for every message on a resize; only paintEvent prepares layouts
+        return math.ceil(self.text_size(max(1, width - 2 * self.PADDING)).height()) + 2 * self.PADDING
+
+    def sizeHint(self):
+        # Unwrapped width (-1) capped at MAX_TEXT_WIDTH
+        natural = self.text_size(-1).width()
+        width = min(math.ceil(natural), self.MAX_TEXT_WIDTH) + 2 * self.PADDING
+        return QSize(width, self.heightForWidth(width))
+
+    def minimumSizeHint(self):
+        return QSize(2 * self.PADDING + 40, self.heightForWidth(2 * self.PADDING + 40))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        # Background and radius from MESSAGE_STYLES
+        option = QStyleOption()
+        option.initFrom(self)
+        self.style().drawPrimitive(QStyle.PrimitiveElement.PE_Widget, option, painter, self)
+        painter.setPen(self.palette().color(QPalette.ColorRole.WindowText))
+        painter.setFont(self.font())
+        painter.drawStaticText(self.PADDING, self.PADDING, self.static_text(self.width()))
+        painter.end()
+
+class OutboxSendThread(QThread):
+    """Sends the chat outbox in batches on a separate database connection"""
+    message_sent = Signal(str, int)  # client_uuid, message id
+    message_failed = Signal(str)  # client_uuid of a message the server rejected
+    send_error = Signal(str)
+    BATCH_SIZE = 20
+
+    def __init__(self, outbox, parent=None):
+        super().__init__(parent)
+        self.outbox = outbox
+        self.db_manager = None
+
+    def run(self):
+        try:
+            if self.db_manager is None:
+                self.db_manager = DatabaseManager(init_tables=False)
+
+            while True:
+                # Several queued messages go out in one transaction
+                batch = self.outbox.pending(self.BATCH_SIZE)
+                if not batch:
+                    return
+                stored = self.db_manager.save_outbox_messages(batch)
+                if stored is None:
+                    # Keep the batch; the next flush resends it without duplicates
+                    self.send_error.emit("Nachrichten konnten nicht gesendet werden")
+                    return
+
+                self.outbox.remove(entry['client_uuid'] for entry in batch)
+                for entry in batch:
+                    result = stored.get(entry['client_uuid'])
+                    if result:
+                        self.message_sent.emit(entry['client_uuid'], result['id'])
+                    else:
+                        self.message_failed.emit(entry['client_uuid'])
+        except Exception as e:
+            self.send_error.emit(str(e))
+
 class ChatWidget(QWidget):
+    HISTORY_PAGE_SIZE = 50
+    OUTBOX_RETRY_INTERVAL = 5000  # ms; independent of the refresh timer, which pauses while hidden
+
     def __init__(self, db_manager, user_data, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
         self.user_data = user_data
         self.current_recipient = None
-        self.emoji_picker = None
+        self.current_channel = None  # Set instead of current_recipient while a channel is open
         self.last_message_id = 0  # Track the last message ID
+        # Newest message ids the contact list reflects; the refresh only asks for newer ones
+        self.contacts_watermark = 0
+        self.channels_watermark = 0
+        self.first_message = None  # Oldest loaded message, older pages load on scroll up
+        self.history_exhausted = False
+        self.scroll_from_bottom = None
+        
+        # Messages are written to the local outbox first and sent in the background
+        self.outbox = ChatOutbox(os.path.join(LOCAL_DATA_FOLDER, f"chat_outbox_{user_data['id']}.json"))
+        self.pending_labels = {}  # client_uuid -> (time label, time text) of unconfirmed messages
+        self.rendered_uuids = set()  # client_uuids shown optimistically in the open conversation
+        self.send_thread = OutboxSendThread(self.outbox, self)
+        self.send_thread.message_sent.connect(self.on_message_sent)
+        self.send_thread.message_failed.connect(self.on_message_failed)
+        self.send_thread.send_error.connect(lambda error: print(f"Outbox: {error}"))
+        
+        self.layout_cache = MessageLayoutCache()
+        
         self.setup_ui()
+        self.flush_outbox()
+        self.outbox_timer = QTimer(self)
+        self.outbox_timer.timeout.connect(self.flush_outbox)
+        self.outbox_timer.start(self.OUTBOX_RETRY_INTERVAL)
         self.refresh_timer = QTimer(self)
         self.refresh_timer.timeout.connect(self.refresh_messages)
         self.refresh_timer.start(2000)  # Refresh every 2 seconds
@@ -592,6 +1120,14 @@ class ChatWidget(QWidget):
         """)
         self.new_chat_btn.clicked.connect(self.start_new_chat)
         header_container.addWidget(self.new_chat_btn)
+        
+        # New channel button
+        self.new_channel_btn = QPushButton("#")
+        self.new_channel_btn.setToolTip("Neuen Kanal erstellen")
+        self.new_channel_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.new_channel_btn.setStyleSheet(self.new_chat_btn.styleSheet())
+        self.new_channel_btn.clicked.connect(self.start_new_channel)
+        header_container.addWidget(self.new_channel_btn)
         header_container.addStretch()
         
         left_layout.addLayout(header_container)
@@ -639,24 +1175,25 @@ class ChatWidget(QWidget):
         """)
         left_layout.addWidget(recent_label)
         
-        # Contacts list
-        self.contacts_list = QListWidget()
+        # Contacts list (model/view, rows are painted by the delegate)
+        self.contacts_model = ContactListModel(self)
+        self.contacts_proxy = QSortFilterProxyModel(self)
+        self.contacts_proxy.setSourceModel(self.contacts_model)
+        self.contacts_proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.contacts_proxy.setFilterRole(Qt.ItemDataRole.DisplayRole)
+        
+        self.contacts_list = QListView()
+        self.contacts_list.setModel(self.contacts_proxy)
+        self.contacts_list.setItemDelegate(ContactDelegate(self.contacts_list))
+        self.contacts_list.setUniformItemSizes(True)
+        self.contacts_list.setMouseTracking(True)
+        self.contacts_list.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.contacts_list.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.contacts_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 background-color: #1a1d24;
                 border: none;
             }
-            QListWidget::item {
-                padding: 8px 16px;
-                border-radius: 4px;
-                margin: 2px 8px;
-            }
-            QListWidget::item:selected {
-                background-color: #36393f;
-            }
-            QListWidget::item:hover {
-                background-color: #2f3136;
-            }
         """)
         left_layout.addWidget(self.contacts_list)
         
@@ -779,12 +1316,16 @@ class ChatWidget(QWidget):
         """)
         
         self.messages_container = QWidget()
+        self.messages_container.setStyleSheet(MESSAGE_STYLES)
         self.messages_layout = QVBoxLayout(self.messages_container)
         self.messages_layout.setContentsMargins(0, 16, 0, 16)
         self.messages_layout.setSpacing(8)
         self.messages_layout.addStretch()
         
         self.messages_scroll.setWidget(self.messages_container)
+        scroll_bar = self.messages_scroll.verticalScrollBar()
+        scroll_bar.valueChanged.connect(self.on_messages_scrolled)
+        scroll_bar.rangeChanged.connect(self.restore_scroll_position)
         right_layout.addWidget(self.messages_scroll)
         
         # Message input area
@@ -860,6 +1401,9 @@ class ChatWidget(QWidget):
                     color: #ffffff;
                 }
             """)
+            if icon == "😊":
+                self.emoji_button = btn
+                btn.clicked.connect(self.show_emoji_menu)
             input_frame_layout.addWidget(btn)
         
         input_layout.addWidget(input_frame)
@@ -896,162 +1440,168 @@ class ChatWidget(QWidget):
         self.message_input.textChanged.connect(self.adjust_input_height)
         self.send_btn.clicked.connect(self.send_message)
         self.search_bar.textChanged.connect(self.filter_contacts)
+        self.contacts_list.clicked.connect(self.on_user_selected)
         
         # Load initial data
         self.load_contacts()
         self.load_messages()
         
-    def update_users_list(self):
-        self.contacts_list.clear()
-        users = self.db_manager.get_chat_users(self.user_data['id'])
-        self.all_contacts = []  # Store all contacts for filtering
-        
-        for user_id in users:
-            contact_data = {
-                'id': user_id,
-                'name': f"User {user_id}",
-                'status': 'Active',
-                'last_message': 'Click to start chatting'
-            }
-            self.all_contacts.append(contact_data)
-            self._add_contact_item(contact_data)
-
-    def _add_contact_item(self, contact_data):
-        item = QListWidgetItem()
-        
-        # Create widget for contact item
-        contact_widget = QWidget()
-        layout = QHBoxLayout(contact_widget)
-        layout.setContentsMargins(4, 4, 4, 4)
-        
-        # Avatar
-        avatar = QLabel("👤")
-        avatar.setStyleSheet("""
-            QLabel {
-                background-color: #2f3136;
-                border-radius: 20px;
-                min-width: 40px;
-                min-height: 40px;
-                max-width: 40px;
-                max-height: 40px;
-                qproperty-alignment: AlignCenter;
-            }
-        """)
-        layout.addWidget(avatar)
-        
-        # Contact info
-        info_layout = QVBoxLayout()
-        info_layout.setSpacing(2)
-        
-        name = QLabel(contact_data['name'])
-        name.setStyleSheet("color: #ffffff; font-weight: bold;")
-        info_layout.addWidget(name)
-        
-        status = QLabel(contact_data['last_message'])
-        status.setStyleSheet("color: #8e9297; font-size: 12px;")
-        info_layout.addWidget(status)
-        
-        layout.addLayout(info_layout)
-        layout.addStretch()
-        
-        # Time if available
-        if 'last_time' in contact_data:
-            time = QLabel(contact_data['last_time'])
-            time.setStyleSheet("color: #8e9297; font-size: 12px;")
-            layout.addWidget(time)
-        
-        item.setSizeHint(contact_widget.sizeHint())
-        self.contacts_list.addItem(item)
-        self.contacts_list.setItemWidget(item, contact_widget)
-        item.setData(Qt.UserRole, contact_data['id'])
-
     def filter_contacts(self, search_text):
-        search_text = search_text.lower()
-        self.contacts_list.clear()
-        
-        for contact in self.all_contacts:
-            if search_text in contact['name'].lower():
-                self._add_contact_item(contact)
+        # The proxy filters the existing rows; nothing is rebuilt
+        self.contacts_proxy.setFilterFixedString(search_text)
 
     def load_contacts(self):
         """Load all available users except the current user"""
         try:
             # Get all users
             users = self.db_manager.get_users()
-            self.all_contacts = []
+            
+            # Unread counts and last messages for all conversations in one query each
+            unread_counts = self.db_manager.get_unread_counts(self.user_data['id'])
+            last_messages = self.db_manager.get_last_messages(self.user_data['id'])
             
             # Filter out current user and create contact data
+            contacts = []
             for user in users:
                 if str(user['id']) != str(self.user_data['id']):
                     contact_data = {
                         'id': user['id'],
                         'name': user['username'],
                         'status': 'Active',
-                        'last_message': ''
+                        'last_message': 'Click to start chatting',
+                        'last_message_id': 0,
+                        'last_timestamp': None,
+                        'unread': unread_counts.get(user['id'], 0)
                     }
                     
-                    # Get last message with this user
-                    messages = self.db_manager.get_chat_messages(
-                        self.user_data['id'],
-                        user['id'],
-                        limit=1
-                    )
-                    
-                    if messages:
-                        last_msg = messages[0]
-                        contact_data['last_message'] = last_msg['message'][:30] + '...' if len(last_msg['message']) > 30 else last_msg['message']
-                        contact_data['last_time'] = last_msg['timestamp'].strftime("%H:%M")
-                    else:
-                        contact_data['last_message'] = 'Click to start chatting'
+                    last_msg = last_messages.get(user['id'])
+                    if last_msg:
+                        contact_data['last_message'] = self.preview_text(last_msg['message'])
+                        contact_data['last_time'] = message_time_text(last_msg['timestamp'])
+                        contact_data['last_message_id'] = last_msg['id']
+                        contact_data['last_timestamp'] = last_msg['timestamp']
                     
-                    self.all_contacts.append(contact_data)
+                    contacts.append(contact_data)
+            
+            # Channels of the user share the list with the 1:1 conversations
+            for channel in self.db_manager.get_user_channels(self.user_data['id']):
+                contact_data = {
+                    'id': self.channel_key(channel['id']),
+                    'channel_id': channel['id'],
+                    'name': f"# {channel['name']}",
+                    'status': 'Channel',
+                    'last_message': 'No messages yet',
+                    'last_message_id': channel['last_message_id'] or 0,
+                    'last_timestamp': channel['last_timestamp'],
+                    'unread': channel['unread']
+                }
+                if channel['last_message_id']:
+                    contact_data['last_message'] = self.preview_text(channel['last_message'])
+                    contact_data['last_time'] = message_time_text(channel['last_timestamp'])
+                contacts.append(contact_data)
             
-            # Display contacts
-            self.contacts_list.clear()
-            for contact in self.all_contacts:
-                self._add_contact_item(contact)
+            # Most recent conversations first, the rest stays sorted by name
+            # (message ids of channels and 1:1 chats are not comparable, timestamps are)
+            contacts.sort(key=lambda c: c['last_timestamp'] or datetime.min, reverse=True)
+            self.contacts_model.set_contacts(contacts)
+            self.select_current_contact()
+            self.contacts_watermark = max(
+                [c['last_message_id'] for c in contacts if not c.get('channel_id')], default=0)
+            self.channels_watermark = max(
+                [c['last_message_id'] for c in contacts if c.get('channel_id')], default=0)
                 
         except Exception as e:
             print(f"Error loading contacts: {e}")
 
-    def send_message(self):
-        if not hasattr(self, 'current_recipient') or not self.message_input.toPlainText().strip():
-            return
-            
-        message_text = self.message_input.toPlainText().strip()
-        self.message_input.clear()
-        
-        try:
-            # Save message to database
-            message_id = self.db_manager.save_chat_message(
+    def refresh_contacts(self):
+        """
+        Move conversations with new messages to the top and update their unread
+        badges, without reloading the list
+        """
+        user_id = self.user_data['id']
+        updates = []
+        last_messages = self.db_manager.get_last_messages(user_id, self.contacts_watermark)
+        unread_counts = self.db_manager.get_unread_counts(user_id, list(last_messages))
+        for peer_id, message in last_messages.items():
+            self.contacts_watermark = max(self.contacts_watermark, message['id'])
+            updates.append((peer_id, message, unread_counts.get(peer_id, 0)))
+        for channel in self.db_manager.get_user_channels(user_id, self.channels_watermark):
+            self.channels_watermark = max(self.channels_watermark, channel['last_message_id'])
+            updates.append((self.channel_key(channel['id']), {
+                'id': channel['last_message_id'],
+                'message': channel['last_message'],
+                'timestamp': channel['last_timestamp']
+            }, channel['unread']))
+
+        # Oldest first, so the newest conversation ends up at the top
+        updates.sort(key=lambda update: update[1]['timestamp'])
+        for contact_id, message, unread in updates:
+            self.bump_contact(contact_id, message, unread=unread)
+
+    def channel_key(self, channel_id):
+        """Contact list id of a channel, distinct from user ids"""
+        return f"channel:{channel_id}"
+
+    def current_contact_key(self):
+        if self.current_channel:
+            return self.channel_key(self.current_channel)
+        return self.current_recipient
+
+    def has_conversation(self):
+        return bool(self.current_recipient or self.current_channel)
+
+    def fetch_history(self, before=None):
+        """Page of the open conversation or channel before the message before, oldest first"""
+        if self.current_channel:
+            return self.db_manager.get_channel_messages(
+                self.current_channel,
                 self.user_data['id'],
-                self.current_recipient,
-                message_text
+                before_id=before['id'] if before else None,
+                limit=self.HISTORY_PAGE_SIZE
             )
-            
-            if message_id:
-                # Add message to UI
-                message_data = {
-                    'id': message_id,
-                    'message': message_text,
-                    'timestamp': datetime.now(),
-                    'user_id': self.user_data['id'],
-                    'recipient_id': self.current_recipient,
-                    'reactions': {},
-                    'sender_name': self.user_data['username']
-                }
-                self.add_message(message_data)
-                
-                # Scroll to bottom
-                self.scroll_to_bottom()
-                
-                # Update contacts list to show latest message
-                self.load_contacts()
-            else:
-                print("Failed to save message to database")
-                
-        except Exception as e:
-            print(f"Error sending message: {e}")
+        return self.db_manager.get_chat_history(
+            self.user_data['id'],
+            self.current_recipient,
+            before=before,
+            limit=self.HISTORY_PAGE_SIZE
+        )
+
+    def fetch_new_messages(self):
+        """Messages of the open conversation or channel newer than last_message_id"""
+        if self.current_channel:
+            return self.db_manager.get_channel_messages(
+                self.current_channel,
+                self.user_data['id'],
+                since_id=self.last_message_id
+            )
+        return self.db_manager.get_chat_messages(
+            self.user_data['id'],
+            self.current_recipient,
+            since_id=self.last_message_id
+        )
+
+    def preview_text(self, text):
+        return text[:30] + '...' if len(text) > 30 else text
+
+    def select_current_contact(self):
+        row = self.contacts_model.row_of(self.current_contact_key())
+        if row is None:
+            return
+        index = self.contacts_proxy.mapFromSource(self.contacts_model.index(row))
+        if index.isValid():
+            self.contacts_list.setCurrentIndex(index)
+
+    def bump_contact(self, contact_id, message_data, **changes):
+        """Move a single conversation to the top after a new message"""
+        timestamp = message_data['timestamp']
+        self.contacts_model.move_to_top(
+            contact_id,
+            last_message=self.preview_text(message_data['message']),
+            last_time=message_time_text(timestamp),
+            last_message_id=message_data['id'],
+            last_timestamp=timestamp,
+            **changes
+        )
 
     def load_messages(self):
         # Clear existing messages
@@ -1060,17 +1610,24 @@ class ChatWidget(QWidget):
             if item.widget():
                 item.widget().deleteLater()
         
-        if not hasattr(self, 'current_recipient'):
+        self.last_message_id = 0
+        self.first_message = None
+        self.history_exhausted = False
+        self.scroll_from_bottom = None
+        self.pending_labels = {}
+        self.rendered_uuids = set()
+        if not self.has_conversation():
             return
             
         try:
-            # Get messages from database
-            messages = self.db_manager.get_chat_messages(
-                self.user_data['id'],
-                self.current_recipient
-            )
+            # Newest page of the conversation, oldest first
+            messages = self.fetch_history()
+            # An entry can still be in the outbox although the server already has it
+            stored_uuids = {msg.get('client_uuid') for msg in messages}
+            pending = [msg for msg in self.pending_outbox_messages()
+                       if msg['client_uuid'] not in stored_uuids]
             
-            if not messages:
+            if not messages and not pending:
                 # Add welcome message
                 welcome_msg = {
                     'message': 'No messages yet. Start the conversation!',
@@ -1081,16 +1638,52 @@ class ChatWidget(QWidget):
                 self.add_message(welcome_msg)
                 return
             
-            # Add messages to the layout (reverse order since they come newest first)
-            for msg in reversed(messages):
+            for msg in messages:
+                self.add_message(msg)
+            for msg in pending:
                 self.add_message(msg)
             
+            if messages:
+                self.first_message = messages[0]
+                self.last_message_id = messages[-1]['id']
+            self.history_exhausted = len(messages) < self.HISTORY_PAGE_SIZE
+            self.mark_current_conversation_read()
+            
             # Scroll to bottom
             QTimer.singleShot(100, self.scroll_to_bottom)
             
         except Exception as e:
             print(f"Error loading messages: {e}")
 
+    def load_older_messages(self):
+        """Prepend the previous page of history; pages continue into the archive"""
+        if not self.has_conversation() or not self.first_message or self.history_exhausted:
+            return
+
+        messages = self.fetch_history(before=self.first_message)
+        self.history_exhausted = len(messages) < self.HISTORY_PAGE_SIZE
+        if not messages:
+            return
+
+        # Keep the visible messages in place while the content grows above them
+        scroll_bar = self.messages_scroll.verticalScrollBar()
+        self.scroll_from_bottom = scroll_bar.maximum() - scroll_bar.value()
+        position = 0
+        for msg in messages:
+            if not self.is_rendered(msg):
+                self.add_message(msg, position)
+                position += 1
+        self.first_message = messages[0]
+
+    def on_messages_scrolled(self, value):
+        if value == 0 and self.scroll_from_bottom is None:
+            self.load_older_messages()
+
+    def restore_scroll_position(self, minimum, maximum):
+        if self.scroll_from_bottom is not None:
+            self.messages_scroll.verticalScrollBar().setValue(maximum - self.scroll_from_bottom)
+            self.scroll_from_bottom = None
+
     def add_reaction(self, message_id, reaction_emoji):
         try:
             success = self.db_manager.add_message_reaction(
@@ -1114,12 +1707,28 @@ class ChatWidget(QWidget):
         except Exception as e:
             print(f"Error removing reaction: {e}")
 
-    def on_user_selected(self, item):
-        self.current_recipient = item.data(Qt.UserRole)
-        self.chat_title.setText(f"Chat with User {self.current_recipient}")
+    def on_user_selected(self, index):
+        contact = index.data(ContactListModel.ContactRole)
+        self.current_channel = contact.get('channel_id')
+        self.current_recipient = None if self.current_channel else contact['id']
+        self.chat_title.setText(f"Chat with {index.data(Qt.DisplayRole)}")
         self.send_btn.setEnabled(True)
         self.update_messages()
 
+    def mark_current_conversation_read(self):
+        """Move the read watermark of the open conversation to the newest message"""
+        if not self.has_conversation() or not self.last_message_id:
+            return
+        if self.current_channel:
+            self.db_manager.mark_channel_read(self.current_channel, self.user_data['id'], self.last_message_id)
+        else:
+            self.db_manager.mark_conversation_read(
+                self.user_data['id'],
+                self.current_recipient,
+                self.last_message_id
+            )
+        self.contacts_model.update_contact(self.current_contact_key(), unread=0)
+
     def start_new_chat(self):
         """Show dialog to select a new chat recipient"""
         try:
@@ -1127,16 +1736,16 @@ class ChatWidget(QWidget):
             print(f"Aktueller Benutzer: {self.user_data['username']} (ID: {self.user_data['id']})")
             
             # Get all available users
-            users = self.db_manager.get_users()
-            if not users:
+            user_index = self.db_manager.get_user_index()
+            if not len(user_index):
                 print("Keine Benutzer in der Datenbank gefunden!")
                 return
                 
-            print(f"Gefundene Benutzer: {len(users)}")
+            print(f"Gefundene Benutzer: {len(user_index)}")
             
             # Create and show user selection dialog
             dialog = UserSelectionDialog(self)
-            dialog.set_users(users, self.user_data['id'])
+            dialog.set_user_index(user_index, self.user_data['id'])
             
             # Center dialog on screen
             screen = QApplication.primaryScreen().geometry()
@@ -1155,6 +1764,7 @@ class ChatWidget(QWidget):
                     if selected_user:
                         print(f"Benutzer ausgewählt: {selected_user['username']} (ID: {selected_user['id']})")
                         self.current_recipient = selected_user['id']
+                        self.current_channel = None
                         self.chat_title.setText(f"Chat mit {selected_user['username']}")
                         self.load_messages()
                         self.load_contacts()
@@ -1168,6 +1778,30 @@ class ChatWidget(QWidget):
             import traceback
             traceback.print_exc()
 
+    def start_new_channel(self):
+        """Create a channel with the selected members and open it"""
+        dialog = UserSelectionDialog(self, multi_select=True)
+        dialog.set_user_index(self.db_manager.get_user_index(), self.user_data['id'])
+        if dialog.exec_() != QDialog.Accepted:
+            return
+
+        members = dialog.get_selected_users()
+        channel_id = self.db_manager.create_channel(
+            dialog.get_channel_name(),
+            self.user_data['id'],
+            [user['id'] for user in members]
+        )
+        if not channel_id:
+            print("Kanal konnte nicht erstellt werden")
+            return
+
+        self.current_recipient = None
+        self.current_channel = channel_id
+        self.chat_title.setText(f"# {dialog.get_channel_name()}")
+        self.send_btn.setEnabled(True)
+        self.load_messages()
+        self.load_contacts()
+
     def scroll_to_bottom(self):
         self.messages_scroll.verticalScrollBar().setValue(
             self.messages_scroll.verticalScrollBar().maximum()
@@ -1177,57 +1811,90 @@ class ChatWidget(QWidget):
         self.load_messages()
 
     def send_message(self):
-        if not hasattr(self, 'current_recipient') or not self.message_input.toPlainText().strip():
+        if not self.has_conversation() or not self.message_input.toPlainText().strip():
             return
             
         message_text = self.message_input.toPlainText().strip()
         self.message_input.clear()
         
         try:
-            # Save message to database
-            message_id = self.db_manager.save_chat_message(
+            # Persist locally first; the message is shown right away and sent in the background
+            entry = self.outbox.add(
                 self.user_data['id'],
-                self.current_recipient,
-                message_text
+                message_text,
+                recipient_id=self.current_recipient,
+                channel_id=self.current_channel
             )
+            message_data = self.outbox_message_data(entry)
+            self.add_message(message_data)
             
-            if message_id:
-                # Add message to UI
-                message_data = {
-                    'id': message_id,
-                    'message': message_text,
-                    'timestamp': datetime.now(),
-                    'user_id': self.user_data['id'],
-                    'recipient_id': self.current_recipient,
-                    'reactions': {},
-                    'sender_name': self.user_data['username']
-                }
-                self.add_message(message_data)
-                
-                # Scroll to bottom
-                self.scroll_to_bottom()
-                
-                # Update contacts list to show latest message
-                self.load_contacts()
-            else:
-                print("Failed to save message to database")
+            # Scroll to bottom
+            self.scroll_to_bottom()
+            
+            # Move the conversation to the top of the contacts list
+            self.bump_contact(self.current_contact_key(), message_data)
+            self.flush_outbox()
                 
         except Exception as e:
             print(f"Error sending message: {e}")
 
-    def add_message(self, message_data):
-        """Add a message to the chat display"""
+    def outbox_message_data(self, entry):
+        """Message record for an outbox entry that is not confirmed yet"""
+        return {
+            'id': None,
+            'client_uuid': entry['client_uuid'],
+            'message': entry['message'],
+            'timestamp': datetime.fromisoformat(entry['created_at']),
+            'user_id': entry['user_id'],
+            'recipient_id': entry['recipient_id'],
+            'channel_id': entry['channel_id'],
+            'reactions': {},
+            'sender_name': self.user_data['username'],
+            'pending': True
+        }
+
+    def pending_outbox_messages(self):
+        """Unsent outbox messages of the open conversation"""
+        def in_conversation(entry):
+            if entry['channel_id']:
+                return entry['channel_id'] == self.current_channel
+            return not self.current_channel and entry['recipient_id'] == self.current_recipient
+
+        return [self.outbox_message_data(entry) for entry in self.outbox.pending() if in_conversation(entry)]
+
+    def is_rendered(self, message):
+        """True for a stored message that is already shown from the outbox; marks it as sent."""
+        client_uuid = message.get('client_uuid')
+        if client_uuid not in self.rendered_uuids:
+            return False
+        self.on_message_sent(client_uuid, message['id'])
+        return True
+
+    def flush_outbox(self):
+        if len(self.outbox) and not self.send_thread.isRunning():
+            self.send_thread.start()
+
+    def on_message_sent(self, client_uuid, message_id):
+        label = self.pending_labels.pop(client_uuid, None)
+        if label:
+            time_label, time_text = label
+            time_label.setText(f"{time_text} ✓")
+
+    def on_message_failed(self, client_uuid):
+        label = self.pending_labels.pop(client_uuid, None)
+        if label:
+            time_label, time_text = label
+            time_label.setText(f"{time_text} ⚠ nicht zugestellt")
+
+    def add_message(self, message_data, position=None):
+        """Add a message to the chat display, at the end unless a layout position is given"""
         try:
             sender_name = message_data['sender_name']
             message_text = message_data['message']
             timestamp = message_data['timestamp']
             is_own_message = message_data['user_id'] == self.user_data['id']
             
-            # Format timestamp
-            if isinstance(timestamp, str):
-                timestamp = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-            
-            # Create message widget
+            # Create message widget (styled by MESSAGE_STYLES on the container)
             message_widget = QWidget()
             message_layout = QHBoxLayout()
             message_layout.setContentsMargins(10, 5, 10, 5)
@@ -1239,18 +1906,40 @@ class ChatWidget(QWidget):
             
             # Sender name
             name_label = QLabel(sender_name)
-            name_label.setStyleSheet("color: #888888; font-size: 10px;")
+            name_label.setObjectName("messageSender")
             content_layout.addWidget(name_label)
             
-            # Message text
-            text_label = QLabel(message_text)
-            text_label.setWordWrap(True)
-            text_label.setStyleSheet("background-color: #2b2b2b; padding: 8px; border-radius: 4px;")
+            # Message text, laid out once per width through the shared cache
+            cache_key = message_data.get('client_uuid') or message_data.get('id')
+            text_label = MessageTextLabel(message_text, cache_key, self.layout_cache)
             content_layout.addWidget(text_label)
             
-            # Timestamp
-            time_label = QLabel(timestamp.strftime("%H:%M"))
-            time_label.setStyleSheet("color: #888888; font-size: 10px;")
+            # Reactions (aggregated counts merged in by get_chat_messages)
+            reactions = message_data.get('reactions')
+            if reactions:
+                own_reaction = message_data.get('own_reaction')
+                parts = []
+                for reaction, count in reactions.items():
+                    # Reactions are stored text; only the bold markup is ours
+                    part = html.escape(f"{reaction} {count}" if count > 1 else reaction)
+                    if reaction == own_reaction:
+                        part = f"<b>{part}</b>"
+                    parts.append(part)
+                reactions_label = QLabel("  ".join(parts))
+                reactions_label.setTextFormat(Qt.TextFormat.RichText)
+                reactions_label.setObjectName("messageReactions")
+                content_layout.addWidget(reactions_label)
+            
+            # Timestamp, with a clock until an optimistic message is confirmed
+            time_text = message_time_text(timestamp)
+            client_uuid = message_data.get('client_uuid')
+            if message_data.get('pending'):
+                time_label = QLabel(f"{time_text} 🕓")
+                self.pending_labels[client_uuid] = (time_label, time_text)
+                self.rendered_uuids.add(client_uuid)
+            else:
+                time_label = QLabel(time_text)
+            time_label.setObjectName("messageTime")
             content_layout.addWidget(time_label)
             
             content_widget.setLayout(content_layout)
@@ -1259,57 +1948,58 @@ class ChatWidget(QWidget):
             if is_own_message:
                 message_layout.addStretch()
                 message_layout.addWidget(content_widget)
-                message_widget.setStyleSheet("background-color: #1e1e1e;")
+                message_widget.setObjectName("ownMessage")
             else:
                 message_layout.addWidget(content_widget)
                 message_layout.addStretch()
-                message_widget.setStyleSheet("background-color: #252525;")
+                message_widget.setObjectName("otherMessage")
             
             message_widget.setLayout(message_layout)
             
-            # Add to chat display
-            self.messages_layout.insertWidget(
-                self.messages_layout.count() - 1,
-                message_widget
-            )
+            # Add to chat display (the last layout item is the stretch)
+            if position is None:
+                position = self.messages_layout.count() - 1
+            self.messages_layout.insertWidget(position, message_widget)
             
         except Exception as e:
             print(f"Fehler beim Hinzufügen der Nachricht: {e}")
 
     def refresh_messages(self):
         """Periodically check for and load new messages"""
-        if self.current_recipient:
+        if self.has_conversation():
             try:
                 # Get new messages since last_message_id
-                messages = self.db_manager.get_chat_messages(
-                    self.user_data['id'],
-                    self.current_recipient['id'],
-                    since_id=self.last_message_id
-                )
+                messages = self.fetch_new_messages()
 
                 if messages:
                     for message in messages:
-                        self.add_message(message)
+                        # Own messages are already shown from the outbox
+                        if not self.is_rendered(message):
+                            self.add_message(message)
                         self.last_message_id = max(self.last_message_id, message['id'])
                     
+                    # The conversation is open, so new messages are read
+                    self.mark_current_conversation_read()
+                    self.bump_contact(self.current_contact_key(), messages[-1])
+                    
                     # Scroll to bottom when new messages arrive
                     self.scroll_to_bottom()
                     
             except Exception as e:
                 print(f"Fehler beim Aktualisieren der Nachrichten: {e}")
+        try:
+            self.refresh_contacts()
+        except Exception as e:
+            print(f"Fehler beim Aktualisieren der Kontakte: {e}")
 
     def create_message_widget(self, message):
         return MessageBubble(message, self)
     
     def show_emoji_menu(self):
-        if not hasattr(self, 'emoji_picker'):
-            self.emoji_picker = EmojiPickerWindow(self)
-        
+        picker = EmojiPickerWindow.instance()
         # Position the picker to the right of the emoji button
         button_pos = self.emoji_button.mapToGlobal(self.emoji_button.rect().topRight())
-        self.emoji_picker.move(button_pos.x(), 
-                             button_pos.y() - self.emoji_picker.height())
-        self.emoji_picker.show()
+        picker.open_for(self.insert_emoji, QPoint(button_pos.x(), button_pos.y() - picker.height()))
 
     def insert_emoji(self, emoji_char):
         self.message_input.insertPlainText(emoji_char)
@@ -59,7 +59,8 @@ class DashboardWidget(QWidget):
         
         # Add stats widgets
         self.add_stat_widget(stats_layout, "Tasks Due Today", "5", 0, 0)
-        self.add_stat_widget(stats_layout, "Messages", "3", 0, 1)
+        unread = self.db_manager.get_unread_total(self.user_data['id'])
+        self.messages_value = self.add_stat_widget(stats_layout, "Messages", str(unread), 0, 1)
         self.add_stat_widget(stats_layout, "Hours Tracked", "6.5", 0, 2)
         self.add_stat_widget(stats_layout, "Files", "12", 0, 3)
         
@@ -96,6 +97,7 @@ class DashboardWidget(QWidget):
         stat_layout.addWidget(value_label)
         
         layout.addWidget(frame, row, col)
+        return value_label
     
     def create_time_chart(self):
         # Create chart
@@ -160,4 +162,5 @@ class DashboardWidget(QWidget):
     
     def update_dashboard(self):
         # Update dashboard data here
-        pass
+        unread = self.db_manager.get_unread_total(self.user_data['id'])
+        self.messages_value.setText(str(unread))
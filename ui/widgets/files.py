@@ -2,13 +2,29 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout,
                              QPushButton, QLabel, QFrame, QScrollArea,
                              QFileDialog, QProgressBar, QGridLayout,
                              QSizePolicy, QSpacerItem, QMenu, QMessageBox,
-                             QLineEdit, QDialog, QInputDialog)
-from PySide6.QtCore import Qt, Signal, QThread, QSize
-from PySide6.QtGui import QIcon, QPixmap, QColor, QPainter, QPen
+                             QLineEdit, QDialog, QInputDialog, QTreeWidget,
+                             QTreeWidgetItem, QListView, QAbstractItemView,
+                             QStyledItemDelegate, QStyle, QListWidget, QListWidgetItem,
+                             QDialogButtonBox)
+from PySide6.QtCore import (Qt, Signal, QThread, QSize, QRect, QAbstractListModel,
+                            QModelIndex, QItemSelection, QItemSelectionModel, QUrl)
+from PySide6.QtGui import QIcon, QPixmap, QColor, QPainter, QPen, QDesktopServices
 import os
-import shutil
 from datetime import datetime
 from database.db_manager import DatabaseManager
+from ui.file_icons import file_type_pixmap
+from ui.thumbnail_loader import ThumbnailLoader
+from ui.upload_manager import UploadManager, UploadTask
+from utils.thumbnails import ThumbnailCache
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
 
 class StorageWidget(QWidget):
     def __init__(self, used_gb, total_gb):
@@ -104,55 +120,145 @@ class FileCard(QFrame):
         name_label.setWordWrap(True)
         layout.addWidget(name_label)
 
-class FileUploadThread(QThread):
-    upload_progress = Signal(str, int)
-    upload_complete = Signal(str)
-    upload_error = Signal(str, str)
+class UploadQueueWidget(QFrame):
+    """Aggregate and per-file progress of an UploadManager, with cancel and retry."""
+    STATUS_TEXT = {
+        UploadTask.QUEUED: "Wartet",
+        UploadTask.RUNNING: "Lädt hoch",
+        UploadTask.DONE: "Fertig",
+        UploadTask.FAILED: "Fehlgeschlagen",
+        UploadTask.CANCELLED: "Abgebrochen",
+    }
 
-    def __init__(self, file_paths, db_manager, user_id):
-        super().__init__()
-        self.file_paths = file_paths
-        self.db_manager = db_manager
-        self.user_id = user_id
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.items = {}  # task id -> QTreeWidgetItem
+        self.setup_ui()
 
-    def run(self):
-        for file_path in self.file_paths:
-            try:
-                filename = os.path.basename(file_path)
-                file_size = os.path.getsize(file_path)
-                
-                # Get destination path
-                upload_dir = self.db_manager.get_upload_path()
-                dest_path = os.path.join(upload_dir, filename)
-                
-                # Copy file with progress updates
-                with open(file_path, 'rb') as src, open(dest_path, 'wb') as dst:
-                    copied = 0
-                    while True:
-                        buf = src.read(8192)
-                        if not buf:
-                            break
-                        dst.write(buf)
-                        copied += len(buf)
-                        progress = int((copied / file_size) * 100)
-                        self.upload_progress.emit(filename, progress)
-                
-                # Add file to database
-                file_info = {
-                    'name': filename,
-                    'path': dest_path,
-                    'size': file_size,
-                    'type': os.path.splitext(filename)[1],
-                    'uploaded_at': datetime.utcnow(),
-                    'user_id': self.user_id,
-                    'favorites': [],
-                    'in_trash': False
-                }
-                self.db_manager.add_file(file_info)
-                self.upload_complete.emit(filename)
-                
-            except Exception as e:
-                self.upload_error.emit(filename, str(e))
+        manager.task_added.connect(self.on_task_added)
+        manager.task_changed.connect(self.on_task_changed)
+        manager.progress_changed.connect(self.on_progress_changed)
+        manager.group_saved.connect(self.on_group_saved)
+        manager.queue_finished.connect(self.update_buttons)
+
+    def setup_ui(self):
+        self.setStyleSheet("""
+            QFrame {
+                background-color: #242424;
+                border-radius: 8px;
+            }
+            QProgressBar {
+                border: none;
+                background: #2c2c2c;
+                height: 8px;
+                border-radius: 4px;
+            }
+            QProgressBar::chunk {
+                background-color: #3498db;
+                border-radius: 4px;
+            }
+            QTreeWidget {
+                background-color: #1c1c1c;
+                border: none;
+                color: #cccccc;
+            }
+        """)
+        layout = QVBoxLayout(self)
+
+        header = QHBoxLayout()
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("color: #999999; font-size: 12px;")
+        header.addWidget(self.status_label, 1)
+
+        self.retry_btn = QPushButton("Wiederholen")
+        self.retry_btn.clicked.connect(self.manager.retry_failed)
+        header.addWidget(self.retry_btn)
+
+        self.cancel_btn = QPushButton("Abbrechen")
+        self.cancel_btn.clicked.connect(self.manager.cancel_all)
+        header.addWidget(self.cancel_btn)
+        layout.addLayout(header)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setRange(0, 1000)
+        layout.addWidget(self.progress_bar)
+
+        self.task_list = QTreeWidget()
+        self.task_list.setHeaderLabels(["Datei", "Fortschritt", "Status"])
+        self.task_list.setRootIsDecorated(False)
+        self.task_list.setUniformRowHeights(True)
+        self.task_list.setMaximumHeight(180)
+        self.task_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.task_list.customContextMenuRequested.connect(self.show_task_menu)
+        layout.addWidget(self.task_list)
+
+        self.hide()
+
+    def on_task_added(self, task_id):
+        task = self.manager.tasks[task_id]
+        item = QTreeWidgetItem([task.name, "0%", self.STATUS_TEXT[task.state]])
+        item.setData(0, Qt.UserRole, task_id)
+        self.task_list.addTopLevelItem(item)
+        self.items[task_id] = item
+        self.show()
+        self.update_buttons()
+
+    def on_task_changed(self, task_id):
+        task = self.manager.tasks.get(task_id)
+        item = self.items.get(task_id)
+        if task is None or item is None:
+            return
+        percent = int(task.done * 100 / task.size) if task.size else 100
+        if task.state == UploadTask.RUNNING and task.speed:
+            item.setText(1, f"{percent}% ({task.speed / (1024 * 1024):.1f} MB/s)")
+        else:
+            item.setText(1, f"{percent}%")
+        status = self.STATUS_TEXT[task.state]
+        item.setText(2, f"{status}: {task.error}" if task.error else status)
+        self.update_buttons()
+
+    def on_progress_changed(self, done, total, speed):
+        self.progress_bar.setValue(int(done * 1000 / total) if total else 1000)
+        tasks = self.manager.tasks.values()
+        finished = sum(1 for task in tasks if task.finished)
+        text = f"{finished} / {len(tasks)} Dateien — {done / (1024 * 1024):.1f} / {total / (1024 * 1024):.1f} MB"
+        if speed:
+            text += f" ({speed / (1024 * 1024):.1f} MB/s)"
+        self.status_label.setText(text)
+
+    def on_group_saved(self, count, success):
+        if not success:
+            QMessageBox.warning(self, "Error", f"{count} hochgeladene Dateien konnten nicht gespeichert werden.")
+
+    def update_buttons(self):
+        tasks = self.manager.tasks.values()
+        self.cancel_btn.setEnabled(self.manager.is_busy())
+        self.retry_btn.setEnabled(any(task.state in (UploadTask.FAILED, UploadTask.CANCELLED) for task in tasks))
+
+    def remove_finished_items(self):
+        """Start a new batch with only the uploads that are still of interest."""
+        self.manager.clear_finished()
+        for task_id in list(self.items):
+            if task_id not in self.manager.tasks:
+                item = self.items.pop(task_id)
+                self.task_list.takeTopLevelItem(self.task_list.indexOfTopLevelItem(item))
+
+    def show_task_menu(self, pos):
+        item = self.task_list.itemAt(pos)
+        if item is None:
+            return
+        task = self.manager.tasks.get(item.data(0, Qt.UserRole))
+        if task is None:
+            return
+        menu = QMenu(self)
+        if not task.finished:
+            menu.addAction("Abbrechen", lambda: self.manager.cancel(task.task_id))
+        elif task.state in (UploadTask.FAILED, UploadTask.CANCELLED):
+            menu.addAction("Wiederholen", lambda: self.manager.retry(task.task_id))
+        if not menu.isEmpty():
+            menu.exec(self.task_list.viewport().mapToGlobal(pos))
 
 class SidebarButton(QPushButton):
     def __init__(self, text, icon_text="", parent=None):
@@ -179,8 +285,12 @@ class FilesWidget(QWidget):
         super().__init__()
         self.db_manager = db_manager
         self.user_data = user_data
-        self.upload_threads = []
+        self.upload_manager = UploadManager(db_manager, user_data['id'], self)
+        self.upload_manager.group_saved.connect(self.update_storage)
+        self.upload_manager.quota_exceeded.connect(self.on_quota_exceeded)
         self.setup_ui()
+        # Continue large uploads that were interrupted by a crash or by closing the app
+        self.upload_manager.resume_pending()
     
     def setup_ui(self):
         self.setStyleSheet("""
@@ -245,7 +355,7 @@ class FilesWidget(QWidget):
         storage_label.setStyleSheet("color: #999999; font-size: 12px;")
         sidebar_layout.addWidget(storage_label)
         
-        # Storage progress
+        # Storage progress, filled from the usage counters by update_storage
         progress = QProgressBar()
         progress.setStyleSheet("""
             QProgressBar {
@@ -259,16 +369,17 @@ class FilesWidget(QWidget):
                 border-radius: 4px;
             }
         """)
-        progress.setValue(85)  # 17.1/20 GB ≈ 85%
+        self.storage_progress = progress
         sidebar_layout.addWidget(progress)
         
-        storage_info = QLabel("17.1 / 20 GB Used")
-        storage_info.setStyleSheet("color: #999999; font-size: 12px;")
-        sidebar_layout.addWidget(storage_info)
+        self.storage_info = QLabel()
+        self.storage_info.setStyleSheet("color: #999999; font-size: 12px;")
+        sidebar_layout.addWidget(self.storage_info)
         
-        storage_free = QLabel("2.9 GB Free")
-        storage_free.setStyleSheet("color: #999999; font-size: 12px;")
-        sidebar_layout.addWidget(storage_free)
+        self.storage_free = QLabel()
+        self.storage_free.setStyleSheet("color: #999999; font-size: 12px;")
+        sidebar_layout.addWidget(self.storage_free)
+        self.update_storage()
         
         buy_storage = QPushButton("Buy Storage")
         buy_storage.setStyleSheet("""
@@ -402,101 +513,324 @@ class FilesWidget(QWidget):
         upload_btn.clicked.connect(self.upload_files)
         content_layout.addWidget(upload_btn)
         
+        # Upload queue, hidden while nothing was uploaded
+        self.upload_queue = UploadQueueWidget(self.upload_manager)
+        content_layout.addWidget(self.upload_queue)
+        
         content_layout.addStretch()
         main_layout.addWidget(content)
     
     def get_file_icon(self, file_type):
         """Get the appropriate icon for a file type."""
-        color_map = {
-            'pdf': '#FF5555',  # Red
-            'doc': '#5B95FF',  # Blue
-            'xls': '#4CAF50',  # Green
-            'ppt': '#FF9800',  # Orange
-            'folder-blue': '#5B95FF',
-            'folder-pink': '#FF69B4'
-        }
-        
-        # Create a colored rectangle with file type text
-        pixmap = QPixmap(48, 48)
-        pixmap.fill(Qt.transparent)
-        
-        painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        # Draw rounded rectangle background
-        painter.setPen(Qt.NoPen)
-        painter.setBrush(QColor(color_map.get(file_type, '#999999')))
-        painter.drawRoundedRect(0, 0, 48, 48, 8, 8)
-        
-        # Draw file type text
-        painter.setPen(QColor('#FFFFFF'))
-        font = painter.font()
-        font.setPointSize(10)
-        font.setBold(True)
-        painter.setFont(font)
-        
-        text = file_type.upper()
-        if 'folder' in file_type:
-            text = ''  # For folders, we don't show text
-            
-        text_rect = painter.boundingRect(0, 0, 48, 48, Qt.AlignCenter, text)
-        painter.drawText(text_rect, Qt.AlignCenter, text)
-        
-        painter.end()
-        return QIcon(pixmap)
+        return QIcon(file_type_pixmap(file_type, 48, self.devicePixelRatioF()))
     
+    def update_storage(self, *args):
+        """Storage bar from the per-user counters, without scanning the files table."""
+        usage = self.db_manager.get_storage_usage(self.user_data['id'])
+        used_gb = usage['used_bytes'] / 1024 ** 3
+        total_gb = usage['quota_bytes'] / 1024 ** 3
+        self.storage_progress.setValue(int(usage['used_bytes'] * 100 / usage['quota_bytes']) if usage['quota_bytes'] else 100)
+        self.storage_info.setText(f"{used_gb:.1f} / {total_gb:.0f} GB Used")
+        self.storage_free.setText(f"{max(0.0, total_gb - used_gb):.1f} GB Free")
+
+    def on_quota_exceeded(self, requested, free):
+        QMessageBox.warning(self, "Speicher voll",
+                            f"Für den Upload werden {self.format_size(requested)} benötigt, "
+                            f"frei sind noch {self.format_size(free)}.")
+
     def format_size(self, size):
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024:
-                return f"{size:.1f} {unit}"
-            size /= 1024
-        return f"{size:.1f} TB"
+        return format_size(size)
     
     def upload_files(self):
         file_dialog = QFileDialog()
         file_dialog.setFileMode(QFileDialog.ExistingFiles)
         if file_dialog.exec():
-            filenames = file_dialog.selectedFiles()
-            
-            for filename in filenames:
-                try:
-                    # Get file info
-                    file_info = {
-                        'name': os.path.basename(filename),
-                        'size': os.path.getsize(filename),
-                        'type': os.path.splitext(filename)[1].lower(),
-                        'modified': os.path.getmtime(filename),
-                        'user_id': self.user_data['id']
-                    }
-                    
-                    # Copy file to uploads directory
-                    target_path = os.path.join(self.db_manager.get_upload_path(), file_info['name'])
-                    shutil.copy2(filename, target_path)
-                    file_info['path'] = target_path
-                    
-                    # Save to database
-                    self.db_manager.add_file(file_info)
-                    
-                except Exception as e:
-                    QMessageBox.warning(self, "Error", f"Error uploading file {os.path.basename(filename)}: {str(e)}")
-
-class DatabaseManager:
-    def __init__(self):
-        pass
-
-    def get_upload_path(self):
-        return "uploads"
-
-    def add_file(self, file_info):
-        pass
+            if not self.upload_manager.is_busy():
+                self.upload_queue.remove_finished_items()
+            # Copies run in the manager's worker pool, rows are added per completed group
+            self.upload_manager.add_files(file_dialog.selectedFiles())
+
+class FileListModel(QAbstractListModel):
+    """
+    Folders and files of the current view. Rows are handed to the view in batches of
+    FETCH_BATCH as it scrolls (canFetchMore/fetchMore), so only what was scrolled to is laid out.
+    Files are queried from the database page by page as well (see set_files).
+    Folder rows carry is_folder; item_key() keeps their ids apart from file ids.
+    """
+    FileRole = Qt.ItemDataRole.UserRole + 1
+    FETCH_BATCH = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.files = []
+        self.loaded = 0
+        self.fetch_page = None  # fetch_page(limit, after) -> next files, None once all are queried
+        self.rows_by_id = {}
+        self.rows_by_key = {}  # thumbnail key -> rows, to repaint a row once its thumbnail is ready
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        file = self.files[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return file.get('name', 'Unnamed')
+        if role == Qt.ItemDataRole.UserRole:
+            return self.item_key(file)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            if file.get('is_folder'):
+                return f"{file.get('file_count', 0)} Dateien, {format_size(file.get('size') or 0)}"
+            if file.get('owner_name'):
+                return f"{format_size(file.get('size') or 0)}, geteilt von {file['owner_name']}"
+            return format_size(file.get('size') or 0)
+        if role == self.FileRole:
+            return file
+        return None
+
+    @staticmethod
+    def item_key(file):
+        return ('folder', file.get('id')) if file.get('is_folder') else file.get('id')
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (self.loaded < len(self.files) or self.fetch_page is not None)
+
+    def fetchMore(self, parent=QModelIndex()):
+        self._query(self.loaded + self.FETCH_BATCH)
+        count = min(self.FETCH_BATCH, len(self.files) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def set_files(self, files, fetch_page=None, keep_loaded=0):
+        """
+        Replace the rows with files followed by what fetch_page(limit, after) returns;
+        after is the last file queried so far (None for the first page). keep_loaded rows
+        are exposed at once, e.g. to restore the scroll position.
+        """
+        self.beginResetModel()
+        self.files = []
+        self.fetch_page = fetch_page
+        self.rows_by_id = {}
+        self.rows_by_key = {}
+        self._append(files)
+        loaded = max(self.FETCH_BATCH, keep_loaded)
+        self._query(loaded)
+        self.loaded = min(len(self.files), loaded)
+        self.endResetModel()
+
+    def _query(self, rows):
+        """Query pages until rows files are known or all are queried."""
+        if self.fetch_page is None or len(self.files) >= rows:
+            return
+        # One query for everything that is missing, at least one page
+        limit = max(self.FETCH_BATCH, rows - len(self.files))
+        last = self.files[-1] if self.files and not self.files[-1].get('is_folder') else None
+        page = self.fetch_page(limit, last)
+        if len(page) < limit:
+            self.fetch_page = None
+        self._append(page)
+
+    def _append(self, files):
+        for file in files:
+            row = len(self.files)
+            self.files.append(file)
+            self.rows_by_id[self.item_key(file)] = row
+            if not file.get('is_folder'):
+                self.rows_by_key.setdefault(ThumbnailCache.key_for(file), []).append(row)
+
+    def row_of(self, key):
+        return self.rows_by_id.get(key)
+
+    def thumbnail_changed(self, key):
+        for row in self.rows_by_key.get(key, []):
+            if row < self.loaded:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+
+
+class FileDelegate(QStyledItemDelegate):
+    """Paints a file tile: thumbnail or type icon, and the elided name below it."""
+    CELL_SIZE = 200
+    ICON_SIZE = 64
+
+    def __init__(self, thumbnails, thumbnail_size, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        self.thumbnail_size = thumbnail_size
+
+    def sizeHint(self, option, index):
+        return QSize(self.CELL_SIZE, self.CELL_SIZE)
+
+    def paint(self, painter, option, index):
+        file = index.data(FileListModel.FileRole)
+        if file is None:
+            return
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        rect = option.rect.adjusted(6, 6, -6, -6)
+
+        if option.state & QStyle.StateFlag.State_Selected:
+            background = QColor("#3c5a78")
+        elif option.state & QStyle.StateFlag.State_MouseOver:
+            background = QColor("#3c3c3c")
+        else:
+            background = QColor("#2c2c2c")
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(background)
+        painter.drawRoundedRect(rect, 8, 8)
+
+        # Visible tiles request their thumbnail; the type icon is shown until it is ready
+        pixmap = None if file.get('is_folder') else self.thumbnails.thumbnail(file, self.thumbnail_size)
+        if pixmap is None:
+            file_type = 'folder-blue' if file.get('is_folder') else file.get('type')
+            pixmap = file_type_pixmap(file_type, self.ICON_SIZE, painter.device().devicePixelRatioF())
+        image_rect = QRect(rect.left() + 10, rect.top() + 10, rect.width() - 20, rect.height() - 50)
+        size = pixmap.deviceIndependentSize().toSize().scaled(image_rect.size(), Qt.AspectRatioMode.KeepAspectRatio)
+        if size.width() > pixmap.deviceIndependentSize().width():
+            size = pixmap.deviceIndependentSize().toSize()
+        target = QRect(0, 0, size.width(), size.height())
+        target.moveCenter(image_rect.center())
+        painter.drawPixmap(target, pixmap)
+
+        name_rect = QRect(rect.left() + 8, rect.bottom() - 36, rect.width() - 16, 28)
+        painter.setPen(QColor("#ffffff"))
+        name = painter.fontMetrics().elidedText(file.get('name', 'Unnamed'), Qt.TextElideMode.ElideMiddle,
+                                                name_rect.width())
+        painter.drawText(name_rect, Qt.AlignmentFlag.AlignCenter, name)
+        painter.restore()
+
+class ShareDialog(QDialog):
+    """Choose the users and projects a file is shared with."""
+
+    def __init__(self, db, file, owner_id, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Share {file.get('name', '')}")
+        shares = db.get_file_shares(file['id'], owner_id)
+        shared_users = {share['user_id'] for share in shares if share['user_id']}
+        shared_projects = {share['project_id'] for share in shares if share['project_id']}
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Users"))
+        self.user_list = QListWidget()
+        for user in db.get_users():
+            if str(user['id']) != str(owner_id):
+                self.add_item(self.user_list, user['username'], user['id'], user['id'] in shared_users)
+        layout.addWidget(self.user_list)
+
+        layout.addWidget(QLabel("Projects"))
+        self.project_list = QListWidget()
+        for project in db.get_projects():
+            self.add_item(self.project_list, project['name'], project['id'], project['id'] in shared_projects)
+        layout.addWidget(self.project_list)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    @staticmethod
+    def add_item(list_widget, text, item_id, checked):
+        item = QListWidgetItem(text)
+        item.setData(Qt.ItemDataRole.UserRole, item_id)
+        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+        item.setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+        list_widget.addItem(item)
+
+    def selected(self):
+        """(user ids, project ids) that are checked."""
+        return tuple(
+            [list_widget.item(row).data(Qt.ItemDataRole.UserRole) for row in range(list_widget.count())
+             if list_widget.item(row).checkState() == Qt.CheckState.Checked]
+            for list_widget in (self.user_list, self.project_list))
+
+
+class VersionsDialog(QDialog):
+    """Versions of a file; earlier ones can be opened or restored as the newest version."""
+
+    def __init__(self, manager, file):
+        super().__init__(manager)
+        self.manager = manager
+        self.file = file
+        self.restored = False
+        self.setWindowTitle(f"Versions of {file.get('name', '')}")
+        self.resize(480, 320)
+
+        layout = QVBoxLayout(self)
+        self.version_list = QTreeWidget()
+        self.version_list.setHeaderLabels(["Version", "Uploaded", "Size"])
+        self.version_list.setRootIsDecorated(False)
+        layout.addWidget(self.version_list)
+
+        button_layout = QHBoxLayout()
+        open_btn = QPushButton("Open")
+        open_btn.clicked.connect(self.open_version)
+        self.restore_btn = QPushButton("Restore")
+        self.restore_btn.clicked.connect(self.restore_version)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        button_layout.addWidget(open_btn)
+        button_layout.addWidget(self.restore_btn)
+        button_layout.addStretch()
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+        self.version_list.currentItemChanged.connect(self.on_current_changed)
+        self.load_versions()
+
+    def load_versions(self):
+        self.version_list.clear()
+        for version in self.manager.db.get_file_versions(self.file['id'], self.manager.current_user_id):
+            uploaded = version['uploaded_at'].strftime("%d.%m.%Y %H:%M") if version['uploaded_at'] else ""
+            label = f"{version['version']} (aktuell)" if version['is_current'] else str(version['version'])
+            item = QTreeWidgetItem([label, uploaded, format_size(version['size'] or 0)])
+            item.setData(0, Qt.ItemDataRole.UserRole, version)
+            self.version_list.addTopLevelItem(item)
+        if self.version_list.topLevelItemCount():
+            self.version_list.setCurrentItem(self.version_list.topLevelItem(0))
+
+    def current_version(self):
+        item = self.version_list.currentItem()
+        return item.data(0, Qt.ItemDataRole.UserRole) if item else None
+
+    def on_current_changed(self, *args):
+        version = self.current_version()
+        self.restore_btn.setEnabled(version is not None and not version['is_current'])
+
+    def open_version(self):
+        version = self.current_version()
+        if version is not None and version['path']:
+            self.manager.open_content(version, self.file['name'])
+
+    def restore_version(self):
+        version = self.current_version()
+        if version is None or version['is_current']:
+            return
+        if self.manager.db.restore_file_version(self.file['id'], self.manager.current_user_id, version['version']):
+            self.restored = True
+            self.load_versions()
+
 
 class FileManager(QWidget):
+    THUMBNAIL_SIZE = 128
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.db = DatabaseManager()
         self.current_user_id = "1"  # Debug user ID
         self.current_view = "my_drive"
+        self.current_folder_id = None  # Folder shown in My Drive, None is the top level
+        # Image previews are rendered in a process pool and cached on disk by content hash
+        self.thumbnails = ThumbnailLoader(os.path.join(self.db.get_upload_path(), 'thumbnails'), self)
+        self.upload_manager = UploadManager(self.db, self.current_user_id, self)
+        self.upload_manager.group_saved.connect(lambda count, saved: self.load_files())
+        self.upload_manager.quota_exceeded.connect(self.on_quota_exceeded)
         self.setup_ui()
+        self.thumbnails.thumbnail_ready.connect(self.on_thumbnail_ready)
         self.load_files()
 
     def setup_ui(self):
@@ -554,6 +888,7 @@ class FileManager(QWidget):
             ("My Drive", lambda: self.change_view("my_drive")),
             ("Favorites", lambda: self.change_view("favorites")),
             ("Recent", lambda: self.change_view("recent")),
+            ("Shared with me", lambda: self.change_view("shared")),
             ("Trash", lambda: self.change_view("trash"))
         ]
 
@@ -577,7 +912,9 @@ class FileManager(QWidget):
         
         storage_label = QLabel("Storage")
         storage_progress = QProgressBar()
-        storage_progress.setValue(65)  # Example value
+        # From the per-user usage counters, no scan of the files table
+        usage = self.db.get_storage_usage(self.current_user_id)
+        storage_progress.setValue(int(usage['used_bytes'] * 100 / usage['quota_bytes']) if usage['quota_bytes'] else 100)
         storage_progress.setStyleSheet("""
             QProgressBar {
                 border: none;
@@ -612,18 +949,31 @@ class FileManager(QWidget):
         search_bar.textChanged.connect(self.search_files)
         content_layout.addWidget(search_bar)
 
-        # Document grid
-        self.document_grid = QGridLayout()
-        self.document_grid.setSpacing(20)
-        
-        scroll_area = QScrollArea()
-        scroll_widget = QWidget()
-        scroll_widget.setLayout(self.document_grid)
-        scroll_area.setWidget(scroll_widget)
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setStyleSheet("border: none;")
+        # Breadcrumbs of the current folder, rebuilt by load_files
+        self.breadcrumb_bar = QWidget()
+        self.breadcrumb_layout = QHBoxLayout(self.breadcrumb_bar)
+        self.breadcrumb_layout.setContentsMargins(0, 0, 0, 0)
+        content_layout.addWidget(self.breadcrumb_bar)
+
+        # Document grid (model/view, tiles are painted by the delegate)
+        self.file_model = FileListModel(self)
+        self.file_view = QListView()
+        self.file_view.setModel(self.file_model)
+        self.file_view.setItemDelegate(FileDelegate(self.thumbnails, self.THUMBNAIL_SIZE, self.file_view))
+        self.file_view.setViewMode(QListView.ViewMode.IconMode)
+        self.file_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.file_view.setMovement(QListView.Movement.Static)
+        self.file_view.setUniformItemSizes(True)
+        self.file_view.setSpacing(10)
+        self.file_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.file_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.file_view.setMouseTracking(True)
+        self.file_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.file_view.customContextMenuRequested.connect(self.on_file_context_menu)
+        self.file_view.doubleClicked.connect(self.open_file)
+        self.file_view.setStyleSheet("border: none;")
         
-        content_layout.addWidget(scroll_area)
+        content_layout.addWidget(self.file_view)
         main_layout.addWidget(content_widget)
 
     def show_create_new_dialog(self):
@@ -646,140 +996,291 @@ class FileManager(QWidget):
             self.create_folder()
         dialog.close()
 
+    def upload_file(self):
+        paths, _ = QFileDialog.getOpenFileNames(self, "Upload File")
+        if paths:
+            # Rows are added per completed group, group_saved then reloads the view
+            self.upload_manager.add_files(paths, self.current_folder_id)
+
+    def on_quota_exceeded(self, requested, free):
+        QMessageBox.warning(self, "Speicher voll",
+                            f"Für den Upload werden {format_size(requested)} benötigt, "
+                            f"frei sind noch {format_size(free)}.")
+
     def create_folder(self):
         name, ok = QInputDialog.getText(self, "Create Folder", "Folder name:")
-        if ok and name:
-            # Add folder creation logic here
-            pass
+        if ok and name.strip():
+            if self.db.create_folder(self.current_user_id, name.strip(), self.current_folder_id) is None:
+                QMessageBox.warning(self, "Fehler", "Ordner konnte nicht erstellt werden.")
+            self.load_files()
 
     def show_buy_storage_dialog(self):
         QMessageBox.information(self, "Buy Storage", "Storage upgrade options will be available soon!")
 
     def change_view(self, view):
         self.current_view = view
-        self.load_files()
+        self.current_folder_id = None
+        self.load_files(keep_position=False)
 
-    def load_files(self):
-        # Clear existing items
-        for i in reversed(range(self.document_grid.count())): 
-            self.document_grid.itemAt(i).widget().setParent(None)
+    def open_folder(self, folder_id):
+        self.current_folder_id = folder_id
+        self.load_files(keep_position=False)
 
+    def load_files(self, keep_position=True):
         # Get files based on current view
+        # Every view is its own indexed query, nothing is filtered here;
+        # files are queried page by page as the grid scrolls (see FileListModel)
+        user_id = self.current_user_id
+        folders = []
+        files = []
+        fetch_page = None
         if self.current_view == "favorites":
-            files = [f for f in self.db.get_files(self.current_user_id) 
-                    if self.current_user_id in f.get('favorites', [])]
+            fetch_page = lambda limit, after: self.db.get_favorite_files(user_id, limit, after)
         elif self.current_view == "recent":
-            files = self.db.get_recent_files(self.current_user_id)
+            files = self.db.get_recent_files(user_id)
+        elif self.current_view == "shared":
+            fetch_page = lambda limit, after: self.db.get_shared_files(user_id, limit, after)
         elif self.current_view == "trash":
-            files = self.db.get_trash(self.current_user_id)
+            folders = self.db.get_trashed_folders(user_id)
+            fetch_page = lambda limit, after: self.db.get_trash(user_id, limit, after)
         else:  # my_drive
-            files = [f for f in self.db.get_files(self.current_user_id) 
-                    if not f.get('in_trash', False)]
+            folder_id = self.current_folder_id
+            folders = self.db.get_folders(user_id, folder_id)
+            fetch_page = lambda limit, after: self.db.get_drive_files(user_id, folder_id, limit, after)
+            # Sizes of all shown subtrees in one query
+            sizes = self.db.get_folder_sizes(user_id, [folder['id'] for folder in folders])
+            for folder in folders:
+                folder.update(sizes.get(folder['id'], {}))
+        for folder in folders:
+            folder['is_folder'] = True
 
-        # Display files
-        row = col = 0
-        max_cols = 4
-        for file in files:
-            card = self.create_file_card(file)
-            self.document_grid.addWidget(card, row, col)
-            col += 1
-            if col >= max_cols:
-                col = 0
-                row += 1
-
-    def create_file_card(self, file):
-        card = QWidget()
-        card.setFixedSize(200, 200)
-        card.setStyleSheet("""
-            QWidget {
-                background-color: #2c2c2c;
-                border-radius: 8px;
-            }
-            QWidget:hover {
-                background-color: #3c3c3c;
-            }
-        """)
+        self.update_breadcrumbs()
+        self.show_files(folders + files, fetch_page, keep_position)
 
-        layout = QVBoxLayout(card)
-        
-        # File icon
-        icon_label = QLabel()
-        icon_label.setPixmap(self.get_file_icon(file.get('type', '')))
-        icon_label.setAlignment(Qt.AlignCenter)
-        layout.addWidget(icon_label)
+    def update_breadcrumbs(self):
+        while self.breadcrumb_layout.count():
+            item = self.breadcrumb_layout.takeAt(0)
+            if item.widget():
+                item.widget().deleteLater()
+        self.breadcrumb_bar.setVisible(self.current_view == "my_drive")
+        if self.current_view != "my_drive":
+            return
 
-        # File name
-        name_label = QLabel(file.get('name', 'Unnamed'))
-        name_label.setAlignment(Qt.AlignCenter)
-        layout.addWidget(name_label)
+        crumbs = [(None, "My Drive")]
+        crumbs += [(folder['id'], folder['name'])
+                   for folder in self.db.get_folder_path(self.current_folder_id, self.current_user_id)]
+        for i, (folder_id, name) in enumerate(crumbs):
+            if i:
+                self.breadcrumb_layout.addWidget(QLabel("›"))
+            btn = QPushButton(name)
+            btn.setFlat(True)
+            btn.clicked.connect(lambda checked=False, folder_id=folder_id: self.open_folder(folder_id))
+            self.breadcrumb_layout.addWidget(btn)
+        self.breadcrumb_layout.addStretch()
+
+    def show_files(self, files, fetch_page=None, keep_position=True):
+        """Show files in the grid; a refresh of the same view keeps selection and scroll position."""
+        selected_ids = []
+        scroll = 0
+        if keep_position:
+            selected_ids = [index.data(Qt.ItemDataRole.UserRole)
+                            for index in self.file_view.selectionModel().selectedIndexes()]
+            scroll = self.file_view.verticalScrollBar().value()
+        # Thumbnails still queued for the previous rows are no longer needed
+        self.thumbnails.cancel_pending()
+
+        self.file_model.set_files(files, fetch_page, keep_loaded=self.file_model.loaded if keep_position else 0)
+
+        selection = QItemSelection()
+        for file_id in selected_ids:
+            row = self.file_model.row_of(file_id)
+            if row is not None and row < self.file_model.loaded:
+                index = self.file_model.index(row)
+                selection.select(index, index)
+        self.file_view.selectionModel().select(selection, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        if scroll:
+            # Lay out now, otherwise the scroll range still belongs to the empty model
+            self.file_view.doItemsLayout()
+            self.file_view.verticalScrollBar().setValue(scroll)
 
-        # Context menu
-        card.setContextMenuPolicy(Qt.CustomContextMenu)
-        card.customContextMenuRequested.connect(
-            lambda pos, f=file: self.show_context_menu(pos, f))
+    def on_thumbnail_ready(self, key, size):
+        if size == self.THUMBNAIL_SIZE:
+            self.file_model.thumbnail_changed(key)
 
-        return card
+    def open_file(self, index):
+        self.open_item(index.data(FileListModel.FileRole))
+
+    def open_item(self, file):
+        if file is not None and file.get('is_folder'):
+            if self.current_view == "my_drive":
+                self.open_folder(file['id'])
+            return
+        if file is None or not file.get('path'):
+            return
+        if self.open_content(file, file['name']):
+            # Collected and written in batches for the Recent view
+            self.db.record_file_access(file['id'])
+
+    def open_content(self, file, name):
+        """Open a files or file_versions row with the system's program for it."""
+        path = file['path']
+        if file.get('compression'):
+            # Other programs need the plain content; compressed and chunked blobs are
+            # written out once into the blob store
+            try:
+                path = self.db.get_blob_store().readable_path(file['blob_hash'], name)
+            except (OSError, TypeError) as e:
+                QMessageBox.warning(self, "Fehler", f"Datei konnte nicht geöffnet werden: {e}")
+                return False
+        QDesktopServices.openUrl(QUrl.fromLocalFile(path))
+        return True
+
+    def on_file_context_menu(self, pos):
+        index = self.file_view.indexAt(pos)
+        if index.isValid():
+            self.show_context_menu(self.file_view.viewport().mapToGlobal(pos), index.data(FileListModel.FileRole))
 
     def show_context_menu(self, pos, file):
         menu = QMenu(self)
-        
-        if self.current_view == "trash":
+
+        if file.get('is_folder'):
+            self.add_folder_actions(menu, file)
+        elif file.get('shared'):
+            # Files of other users can only be opened
+            open_action = menu.addAction("Open")
+            open_action.triggered.connect(lambda: self.open_item(file))
+        elif self.current_view == "trash":
             restore_action = menu.addAction("Restore")
             restore_action.triggered.connect(lambda: self.restore_file(file))
             delete_action = menu.addAction("Delete Permanently")
             delete_action.triggered.connect(lambda: self.delete_permanently(file))
         else:
-            if self.current_user_id in file.get('favorites', []):
+            if file.get('is_favorite'):
                 fav_action = menu.addAction("Remove from Favorites")
                 fav_action.triggered.connect(lambda: self.remove_from_favorites(file))
             else:
                 fav_action = menu.addAction("Add to Favorites")
                 fav_action.triggered.connect(lambda: self.add_to_favorites(file))
             
+            share_action = menu.addAction("Share...")
+            share_action.triggered.connect(lambda: self.share_file(file))
+            if (file.get('version') or 1) > 1:
+                versions_action = menu.addAction("Versions...")
+                versions_action.triggered.connect(lambda: self.show_versions(file))
+            move_action = menu.addAction("Move to...")
+            move_action.triggered.connect(lambda: self.move_file(file))
             trash_action = menu.addAction("Move to Trash")
             trash_action.triggered.connect(lambda: self.move_to_trash(file))
 
-        menu.exec_(self.sender().mapToGlobal(pos))
+        menu.exec_(pos)
 
-    def get_file_icon(self, file_type):
-        # Return appropriate QPixmap based on file type
-        return QPixmap("path/to/default/icon.png")  # Placeholder
+    def add_folder_actions(self, menu, folder):
+        if self.current_view == "trash":
+            restore_action = menu.addAction("Restore")
+            restore_action.triggered.connect(lambda: self.restore_folder(folder))
+            delete_action = menu.addAction("Delete Permanently")
+            delete_action.triggered.connect(lambda: self.delete_folder(folder))
+        else:
+            open_action = menu.addAction("Open")
+            open_action.triggered.connect(lambda: self.open_folder(folder['id']))
+            rename_action = menu.addAction("Rename")
+            rename_action.triggered.connect(lambda: self.rename_folder(folder))
+            move_action = menu.addAction("Move to...")
+            move_action.triggered.connect(lambda: self.move_folder(folder))
+            trash_action = menu.addAction("Move to Trash")
+            trash_action.triggered.connect(lambda: self.move_folder_to_trash(folder))
+
+    def choose_folder(self, exclude=None):
+        """
+        Ask for a target folder; returns (ok, folder id or None for the top level).
+        exclude is a folder whose subtree is not offered.
+        """
+        folders = self.db.get_all_folders(self.current_user_id)
+        names = {folder['id']: folder['name'] for folder in folders}
+        targets = {}
+        for folder in folders:
+            if exclude and folder['path'].startswith(exclude['path']):
+                continue
+            ids = [int(part) for part in folder['path'].strip('/').split('/')]
+            targets[" / ".join(names.get(i, '?') for i in ids)] = folder['id']
+        labels = ["My Drive"] + sorted(targets, key=str.lower)
+        label, ok = QInputDialog.getItem(self, "Move to", "Folder:", labels, 0, False)
+        if not ok:
+            return False, None
+        return True, targets.get(label)
+
+    def show_versions(self, file):
+        dialog = VersionsDialog(self, file)
+        dialog.exec()
+        if dialog.restored:
+            self.load_files()
+
+    def share_file(self, file):
+        dialog = ShareDialog(self.db, file, self.current_user_id, self)
+        if dialog.exec():
+            user_ids, project_ids = dialog.selected()
+            if not self.db.set_file_shares(file['id'], self.current_user_id, user_ids, project_ids):
+                QMessageBox.warning(self, "Fehler", "Freigabe konnte nicht gespeichert werden.")
+
+    def move_file(self, file):
+        ok, folder_id = self.choose_folder()
+        if ok and self.db.move_file(file['id'], self.current_user_id, folder_id):
+            self.load_files()
+
+    def move_folder(self, folder):
+        ok, parent_id = self.choose_folder(exclude=folder)
+        if ok and self.db.move_folder(folder['id'], self.current_user_id, parent_id):
+            self.load_files()
+
+    def rename_folder(self, folder):
+        name, ok = QInputDialog.getText(self, "Rename Folder", "Folder name:", text=folder['name'])
+        if ok and name.strip() and self.db.rename_folder(folder['id'], self.current_user_id, name.strip()):
+            self.load_files()
+
+    def move_folder_to_trash(self, folder):
+        if self.db.move_folder_to_trash(folder['id'], self.current_user_id):
+            self.load_files()
+
+    def restore_folder(self, folder):
+        if self.db.restore_folder(folder['id'], self.current_user_id):
+            self.load_files()
+
+    def delete_folder(self, folder):
+        reply = QMessageBox.question(
+            self,
+            'Delete Permanently',
+            'Are you sure you want to permanently delete this folder and everything in it? '
+            'This action cannot be undone.',
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+
+        if reply == QMessageBox.Yes:
+            if self.db.delete_folder(folder['id'], self.current_user_id):
+                self.load_files()
 
     def search_files(self, query):
         if not query:
-            self.load_files()
+            self.load_files(keep_position=False)
             return
 
         files = self.db.search_files(self.current_user_id, query)
-        
-        # Clear and reload grid with search results
-        for i in reversed(range(self.document_grid.count())): 
-            self.document_grid.itemAt(i).widget().setParent(None)
-
-        row = col = 0
-        max_cols = 4
-        for file in files:
-            card = self.create_file_card(file)
-            self.document_grid.addWidget(card, row, col)
-            col += 1
-            if col >= max_cols:
-                col = 0
-                row += 1
+        self.show_files(files, keep_position=False)
 
     def add_to_favorites(self, file):
-        if self.db.add_to_favorites(file['_id'], self.current_user_id):
+        if self.db.add_to_favorites(file['id'], self.current_user_id):
             self.load_files()
 
     def remove_from_favorites(self, file):
-        if self.db.remove_from_favorites(file['_id'], self.current_user_id):
+        if self.db.remove_from_favorites(file['id'], self.current_user_id):
             self.load_files()
 
     def move_to_trash(self, file):
-        if self.db.move_to_trash(file['_id'], self.current_user_id):
+        if self.db.move_to_trash(file['id'], self.current_user_id):
             self.load_files()
 
     def restore_file(self, file):
-        if self.db.restore_from_trash(file['_id'], self.current_user_id):
+        if self.db.restore_from_trash(file['id'], self.current_user_id):
             self.load_files()
 
     def delete_permanently(self, file):
@@ -792,5 +1293,5 @@ class FileManager(QWidget):
         )
 
         if reply == QMessageBox.Yes:
-            # Add permanent deletion logic here
-            self.load_files()
+            if self.db.delete_file(file['id']):
+                self.load_files()
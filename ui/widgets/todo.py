@@ -106,13 +106,15 @@ class UserSearchComboBox(QComboBox):
         """)
 
 class AddTaskModal(QDialog):
+    MAX_SUGGESTIONS = 50
+    
     def __init__(self, db_manager, parent=None, user_data=None, task_data=None, project_id=None):
         super().__init__(parent)
         self.db_manager = db_manager
         self.user_data = user_data
         self.task_data = task_data
         self.project_id = project_id
-        self.users = []
+        self.user_index = None
         self.setup_ui()
         
     def setup_ui(self):
@@ -542,20 +544,23 @@ class AddTaskModal(QDialog):
             event.accept()
     
     def load_users(self):
-        """Load users from database"""
-        self.users = self.db_manager.get_users()
+        """Load users from the shared search index"""
+        self.user_index = self.db_manager.get_user_index()
         self.filter_users("")  # Show all users initially
     
     def filter_users(self, filter_text):
         """Filter users based on search text"""
+        # Repopulating the combo rewrites the edit text; don't re-enter this slot
+        line_edit = self.user_combo.lineEdit()
+        line_edit.blockSignals(True)
         self.user_combo.clear()
         self.user_combo.addItem("Select User", None)  # Add default option
         
-        users = self.db_manager.get_users()
-        for user in users:
-            username = user["username"]
-            if filter_text.lower() in username.lower():
-                self.user_combo.addItem(username, user["id"])
+        for user in self.user_index.search(filter_text, limit=self.MAX_SUGGESTIONS):
+            self.user_combo.addItem(user["username"], user["id"])
+        
+        self.user_combo.setEditText(filter_text)
+        line_edit.blockSignals(False)
         
         # Show dropdown if there are matching users
         if self.user_combo.count() > 0:
@@ -142,30 +142,33 @@ class UserManagementDialog(QDialog):
         self.showMaximized()
 
     def filter_users(self):
-        search_text = self.search_input.text().lower()
+        search_text = self.search_input.text().strip()
         selected_role = next(name for name, action in self.role_actions.items() 
                            if action.isChecked())
         
+        # Textsuche über den gemeinsamen Suchindex (ohne Tippfehler-Toleranz),
+        # höchstens so viele Treffer wie die Tabelle Zeilen hat
+        matching_ids = None
+        if search_text:
+            user_index = self.db_manager.get_user_index()
+            matching_ids = {user['id'] for user in user_index.search(
+                search_text, limit=self.users_table.rowCount() or 1, fuzzy=False)}
+        
         visible_rows = 0
         for row in range(self.users_table.rowCount()):
-            show_row = True
+            item = self.users_table.item(row, 0)
+            user = item.data(Qt.UserRole) if item else None
+            show_row = user is not None
             
-            # Textsuche
-            if search_text:
-                show_row = False
-                for col in range(self.users_table.columnCount() - 1):
-                    item = self.users_table.item(row, col)
-                    if item and search_text in item.text().lower():
-                        show_row = True
-                        break
+            if show_row and matching_ids is not None:
+                show_row = user['id'] in matching_ids
             
             # Rollenfilter
             if show_row and selected_role != "Alle":
-                role_item = self.users_table.item(row, 2)
-                if role_item and role_item.text() != selected_role:
-                    show_row = False
+                show_row = (user.get('role') or '').lower() == selected_role.lower()
             
-            self.users_table.setRowHidden(row, not show_row)
+            if self.users_table.isRowHidden(row) == show_row:
+                self.users_table.setRowHidden(row, not show_row)
             if show_row:
                 visible_rows += 1
         
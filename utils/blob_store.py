@@ -0,0 +1,249 @@
+import hashlib
+import io
+import os
+import shutil
+import time
+import uuid
+
+from utils.chunk_store import CHUNKED_SUFFIX, ChunkStore
+from utils.chunked_upload import ChunkedUpload, pending_uploads
+from utils.compression import SUFFIXES, compress_file, is_compressible, open_compressed, worth_it
+from utils.file_copy import ProgressThrottle, copy_range
+
+# Storage form of a blob (the compression column) -> suffix of its path
+FORMS = {None: '', **SUFFIXES, 'chunks': CHUNKED_SUFFIX}
+
+
+class BlobStore:
+    """
+    Content addressed file storage.
+    Every unique content is stored once as <root>/<ab>/<cd>/<sha256>, where ab and cd
+    are the first two byte pairs of the hash. Reference counts live in the file_blobs table.
+    With a compression ('zlib' or 'lzma') compressible types are stored compressed as
+    <sha256>.gz / <sha256>.xz; the hash is always that of the uncompressed content.
+    Other files from CHUNKED_MIN_SIZE on are stored as <sha256>.chunks through the
+    ChunkStore, so versions of a large file share their unchanged chunks.
+    """
+    CHUNK_SIZE = 1024 * 1024
+    RESUMABLE_MIN_SIZE = 64 * 1024 * 1024  # Larger files are uploaded in resumable chunks
+    PARTIAL_MAX_AGE = 7 * 24 * 3600  # Unfinished uploads are kept this many seconds
+    OPENED_MAX_AGE = 24 * 3600  # Uncompressed copies for external programs are kept this many seconds
+    CHUNKED_MIN_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, root, compression=None):
+        self.root = root
+        self.compression = compression or None
+        self.temp_dir = os.path.join(root, 'tmp')
+        self.partial_dir = os.path.join(root, 'partial')
+        self.opened_dir = os.path.join(root, 'opened')
+        self.chunks = ChunkStore(os.path.join(root, 'chunks'), self.temp_dir)
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path_for(self, digest, compression=None):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + FORMS.get(compression, ''))
+
+    def locate(self, digest):
+        """(path, compression) of a stored blob, or None. Chunked blobs have the compression 'chunks'."""
+        for compression in FORMS:
+            path = self.path_for(digest, compression)
+            if os.path.exists(path):
+                return path, compression
+        return None
+
+    def exists(self, digest):
+        return self.locate(digest) is not None
+
+    def stored(self, digest):
+        """(path, stored_size, compression) of a stored blob; chunked blobs count their own chunks."""
+        path, compression = self.locate(digest)
+        if compression == 'chunks':
+            return path, self.chunks.unique_size(path), compression
+        return path, os.path.getsize(path), compression
+
+    def open(self, digest):
+        """Binary file object over the uncompressed content, decompressed while reading."""
+        path, compression = self.locate(digest)
+        if compression is None:
+            return open(path, 'rb')
+        if compression == 'chunks':
+            return io.BufferedReader(self.chunks.open(path), self.CHUNK_SIZE)
+        return open_compressed(path, compression)
+
+    def readable_path(self, digest, name):
+        """
+        Path of the content as a plain file, for programs outside the app.
+        Compressed blobs are decompressed into <root>/opened once and reused from there.
+        """
+        path, compression = self.locate(digest)
+        if compression is None:
+            return path
+        opened_path = os.path.join(self.opened_dir, digest, os.path.basename(name))
+        if not os.path.exists(opened_path):
+            self._prune_opened()
+            os.makedirs(os.path.dirname(opened_path), exist_ok=True)
+            temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+            with self.open(digest) as src, open(temp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+            os.replace(temp_path, opened_path)
+        return opened_path
+
+    def hash_file(self, path, progress=None):
+        """sha256 of a file without storing it; progress(done, total) is optional."""
+        total = os.path.getsize(path)
+        hasher = hashlib.sha256()
+        done = 0
+        with open(path, 'rb') as f:
+            while True:
+                buf = f.read(self.CHUNK_SIZE)
+                if not buf:
+                    break
+                hasher.update(buf)
+                done += len(buf)
+                if progress:
+                    progress(done, total)
+        return hasher.hexdigest()
+
+    def ingest(self, src_path, progress=None, check_existing=False, owner=None):
+        """
+        Store a file and return (digest, size, created).
+        progress(done, total, bytes_per_second) is called at most four times a second.
+        The file is hashed while it is copied to a temporary file, which is then
+        renamed to its blob path, or dropped if that content is already stored.
+        With check_existing the file is hashed first and not copied at all when the
+        blob exists; worth it when another blob of the same size is known.
+        Files from RESUMABLE_MIN_SIZE on go through a ChunkedUpload of owner, so a failed
+        or cancelled upload continues where it stopped the next time it is ingested.
+        Compressible types are compressed when the store has a compression and that
+        saves enough, other files from CHUNKED_MIN_SIZE on are chunked; use stored()
+        for the resulting path and size on disk.
+        """
+        size = os.path.getsize(src_path)
+        throttle = ProgressThrottle(progress, size) if progress else None
+        if check_existing:
+            digest = self.hash_file(src_path)
+            if self.exists(digest):
+                if throttle:
+                    throttle.update(size)
+                return digest, size, False
+
+        if size >= self.RESUMABLE_MIN_SIZE:
+            upload = ChunkedUpload(self.partial_dir, src_path, owner)
+            digest = upload.run(progress=throttle.update if throttle else None)
+            if self._compress(src_path) and not self.exists(digest):
+                # The chunks stay resumable uncompressed; the finished part is compressed once
+                with open(upload.part_path, 'rb') as part:
+                    result = self._ingest_compressed(part, size, digest=digest)
+                if result:
+                    upload.discard()
+                    return result
+            if not self.exists(digest):
+                # The part file is split once it is complete
+                with open(upload.part_path, 'rb') as part:
+                    result = self._ingest_chunked(part, digest=digest)
+                upload.discard()
+                return result
+            result = self._commit(upload.part_path, digest, size)
+            upload.finish()
+            return result
+
+        if self._compress(src_path):
+            with open(src_path, 'rb') as src:
+                result = self._ingest_compressed(src, size, throttle)
+            if result:
+                return result
+            # Not worth it; store the plain copy below
+
+        if size >= self.CHUNKED_MIN_SIZE:
+            with open(src_path, 'rb') as src:
+                return self._ingest_chunked(src, throttle=throttle)
+
+        temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        try:
+            with open(src_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                copy_range(src.fileno(), dst.fileno(), size,
+                           progress=throttle.update if throttle else None, hasher=hasher)
+            if throttle and size == 0:
+                throttle.update(0)
+            return self._commit(temp_path, hasher.hexdigest(), size)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def pending_uploads(self, owner=None):
+        """Manifests of unfinished resumable uploads; stale ones are discarded on the way."""
+        return pending_uploads(self.partial_dir, owner, self.PARTIAL_MAX_AGE)
+
+    def _compress(self, src_path):
+        return self.compression is not None and is_compressible(src_path)
+
+    def _ingest_compressed(self, src, size, throttle=None, digest=None):
+        """
+        Compress src into a temporary file and commit it; digest is computed on the way
+        unless known. Returns None and leaves nothing behind if the saving is too small.
+        """
+        temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+        hasher = hashlib.sha256() if digest is None else None
+        try:
+            compress_file(src, temp_path, self.compression, self.CHUNK_SIZE, hasher=hasher,
+                          progress=throttle.update if throttle else None)
+            if not worth_it(size, os.path.getsize(temp_path)):
+                os.remove(temp_path)
+                return None
+            if throttle and size == 0:
+                throttle.update(0)
+            return self._commit(temp_path, digest or hasher.hexdigest(), size, self.compression)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _ingest_chunked(self, src, throttle=None, digest=None):
+        """Split src into the chunk store and commit its blob directory."""
+        hasher = hashlib.sha256() if digest is None else None
+        blob_dir = self.chunks.write(src, hasher, progress=throttle.update if throttle else None)
+        digest = digest or hasher.hexdigest()
+        size = src.tell()
+        if self.exists(digest):
+            self.chunks.remove_blob(blob_dir)
+            return digest, size, False
+        blob_path = self.path_for(digest, 'chunks')
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(blob_dir, blob_path)
+        return digest, size, True
+
+    def _commit(self, temp_path, digest, size, compression=None):
+        """Move a completely written temporary file to its blob path."""
+        if self.exists(digest):
+            # Stored before, possibly in another form; the existing blob stays
+            os.remove(temp_path)
+            return digest, size, False
+        blob_path = self.path_for(digest, compression)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(temp_path, blob_path)
+        return digest, size, True
+
+    def remove(self, digest):
+        """Delete a blob once no file references it anymore; returns the bytes freed."""
+        freed = self.chunks.remove_blob(self.path_for(digest, 'chunks'))
+        for compression in (None, *SUFFIXES):
+            path = self.path_for(digest, compression)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                pass
+        shutil.rmtree(os.path.join(self.opened_dir, digest), ignore_errors=True)
+        return freed
+
+    def _prune_opened(self):
+        """Drop uncompressed copies older than OPENED_MAX_AGE."""
+        if not os.path.isdir(self.opened_dir):
+            return
+        now = time.time()
+        with os.scandir(self.opened_dir) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and now - entry.stat().st_mtime > self.OPENED_MAX_AGE:
+                    shutil.rmtree(entry.path, ignore_errors=True)
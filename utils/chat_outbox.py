@@ -0,0 +1,67 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+
+class ChatOutbox:
+    """
+    Chat messages that are written locally before they are sent.
+    Entries are kept in a JSON file until the server confirmed them, so nothing
+    is lost when the database is unreachable or the app is closed. Every entry
+    carries a client_uuid the server deduplicates on, which makes resending safe.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = []
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Outbox konnte nicht gelesen werden: {e}")
+
+    def _save(self):
+        # Write to a temporary file first so a crash never leaves a truncated outbox
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
+
+    def add(self, user_id, message, recipient_id=None, channel_id=None):
+        """Queue a message for a user (recipient_id) or a channel; returns the entry."""
+        entry = {
+            'client_uuid': str(uuid.uuid4()),
+            'user_id': user_id,
+            'recipient_id': recipient_id,
+            'channel_id': channel_id,
+            'message': message,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self.lock:
+            self.entries.append(entry)
+            self._save()
+        return entry
+
+    def pending(self, limit=None):
+        """Oldest entries first."""
+        with self.lock:
+            return list(self.entries[:limit] if limit else self.entries)
+
+    def remove(self, client_uuids):
+        client_uuids = set(client_uuids)
+        with self.lock:
+            self.entries = [e for e in self.entries if e['client_uuid'] not in client_uuids]
+            self._save()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
@@ -0,0 +1,178 @@
+import errno
+import hashlib
+import io
+import os
+import shutil
+import uuid
+
+CHUNKED_SUFFIX = '.chunks'
+
+
+class ChunkStore:
+    """
+    Deduplicated storage of large blobs in fixed-size chunks.
+    Every unique chunk is stored once as <root>/<ab>/<cd>/<sha256 of the chunk>. A blob is
+    a directory <sha256>.chunks holding one hard link per chunk, named <index>_<chunk hash>,
+    so reading it back needs no manifest and the link count of a chunk file is its
+    reference count: a chunk nobody links to anymore has st_nlink == 1.
+    File systems cap the links per file (NTFS 1024, ext4 65000); a chunk that reaches
+    the cap is stored again and the fresh copy takes over its store entry. Blobs linked
+    to the old copy keep it, and it disappears with the last of them.
+    Versions of a file that only differ in a few places share all other chunks.
+    """
+    CHUNK_SIZE = 1024 * 1024  # Fixed boundaries: cheap in Python, dedups in-place changes
+
+    def __init__(self, root, temp_dir):
+        self.root = root
+        self.temp_dir = temp_dir
+
+    def chunk_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def write(self, src, hasher, progress=None):
+        """
+        Split the open file src into chunks and return the temporary blob directory, which
+        the caller moves to its blob path. hasher, if given, is updated with the whole
+        content, progress(done) after every chunk.
+        """
+        blob_dir = os.path.join(self.temp_dir, uuid.uuid4().hex + CHUNKED_SUFFIX)
+        os.makedirs(blob_dir)
+        done = 0
+        index = 0
+        try:
+            while True:
+                buf = src.read(self.CHUNK_SIZE)
+                if not buf:
+                    break
+                if hasher:
+                    hasher.update(buf)
+                digest = hashlib.sha256(buf).hexdigest()
+                self._link_chunk(digest, buf, os.path.join(blob_dir, f"{index:08d}_{digest}"))
+                index += 1
+                done += len(buf)
+                if progress:
+                    progress(done)
+        except Exception:
+            self.remove_blob(blob_dir)
+            raise
+        return blob_dir
+
+    def _link_chunk(self, digest, buf, link_path):
+        """Link a chunk into a blob directory, storing it first if it is new."""
+        chunk_path = self.chunk_path(digest)
+        try:
+            os.link(chunk_path, link_path)
+            return
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            if e.errno != errno.EMLINK:
+                raise
+            # Link limit reached: continue with a fresh copy, the content is the same
+            os.replace(self._write_temp(buf), chunk_path)
+            os.link(chunk_path, link_path)
+            return
+        # New chunk, or removed together with its last blob a moment ago
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        temp_path = self._write_temp(buf)
+        try:
+            # Unlike a rename this never replaces a chunk another upload stored meanwhile
+            os.link(temp_path, chunk_path)
+        except FileExistsError:
+            pass
+        os.remove(temp_path)
+        os.link(chunk_path, link_path)
+
+    def _write_temp(self, buf):
+        temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+        with open(temp_path, 'wb') as f:
+            f.write(buf)
+        return temp_path
+
+    @staticmethod
+    def chunk_names(blob_dir):
+        return sorted(os.listdir(blob_dir))
+
+    def open(self, blob_dir):
+        return ChunkedReader([os.path.join(blob_dir, name) for name in self.chunk_names(blob_dir)])
+
+    def unique_size(self, blob_dir):
+        """Bytes only this blob references, i.e. what deleting it would free."""
+        return sum(size for _, size in self._unreferenced(blob_dir))
+
+    def remove_blob(self, blob_dir):
+        """Delete a blob directory and every chunk no other blob links to; returns the bytes freed."""
+        try:
+            unreferenced = self._unreferenced(blob_dir)
+        except FileNotFoundError:
+            return 0
+        shutil.rmtree(blob_dir, ignore_errors=True)
+        freed = 0
+        for chunk_path, size in unreferenced:
+            if chunk_path is None:
+                freed += size  # Superseded copy, gone with its last link
+                continue
+            try:
+                # Check again, another blob may have linked the chunk meanwhile
+                if os.stat(chunk_path).st_nlink == 1:
+                    os.remove(chunk_path)
+                    freed += size
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def _unreferenced(self, blob_dir):
+        """
+        [(store path or None, size)] of the chunk files no other blob links to.
+        A blob can link the same chunk several times, so the links of this blob are
+        counted per file; the store path is None for a copy superseded at the link limit.
+        """
+        files = {}  # (st_dev, st_ino) -> [links in this blob, stat, digest]
+        for name in self.chunk_names(blob_dir):
+            stat = os.stat(os.path.join(blob_dir, name))
+            entry = files.setdefault((stat.st_dev, stat.st_ino), [0, stat, name.split('_', 1)[1]])
+            entry[0] += 1
+        unreferenced = []
+        for (dev, ino), (links, stat, digest) in files.items():
+            other_links = stat.st_nlink - links
+            chunk_path = self.chunk_path(digest)
+            try:
+                chunk_stat = os.stat(chunk_path)
+                in_store = (chunk_stat.st_dev, chunk_stat.st_ino) == (dev, ino)
+            except FileNotFoundError:
+                in_store = False
+            if in_store and other_links == 1:
+                unreferenced.append((chunk_path, stat.st_size))
+            elif not in_store and other_links == 0:
+                unreferenced.append((None, stat.st_size))
+        return unreferenced
+
+
+class ChunkedReader(io.RawIOBase):
+    """Reads the chunk files of a blob one after another as one stream."""
+
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = list(paths)
+        self.current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self.current is None:
+                if not self.paths:
+                    return 0
+                self.current = open(self.paths.pop(0), 'rb')
+            n = self.current.readinto(buffer)
+            if n:
+                return n
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        super().close()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import time
+
+from utils.file_copy import copy_range
+
+READ_SIZE = 8 * 1024 * 1024
+
+
+class ChunkedUpload:
+    """
+    Resumable copy of one source file into <partial_dir>/<upload_id>.part.
+    A JSON manifest next to it records every completed chunk as (offset, length, sha256)
+    and is only updated once the chunk is synced to disk. After a crash, a restart or a
+    cancelled upload the same source continues at the first missing chunk; the completed
+    part is read back once to verify the chunks and rebuild the whole-file hash, which is
+    much faster than copying it from the source again.
+    """
+    CHUNK_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, partial_dir, src_path, owner=None):
+        stat = os.stat(src_path)
+        self.src_path = os.path.abspath(src_path)
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.owner = owner
+        # Same user, path and file state: same upload, so selecting the file again resumes it
+        key = f"{owner}|{self.src_path}|{self.size}|{self.mtime_ns}"
+        self.upload_id = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        self.part_path = os.path.join(partial_dir, self.upload_id + '.part')
+        self.manifest_path = os.path.join(partial_dir, self.upload_id + '.json')
+        self.chunks = []  # [offset, length, sha256] of completed chunks, in file order
+        os.makedirs(partial_dir, exist_ok=True)
+
+    def run(self, progress=None):
+        """Copy all missing chunks and return the sha256 of the whole file; progress(done)."""
+        done, hasher = self._resume()
+        if progress and done:
+            progress(done)
+
+        with open(self.src_path, 'rb') as src, open(self.part_path, 'r+b' if done else 'wb') as dst:
+            dst.truncate(done)
+            while done < self.size:
+                length = min(self.CHUNK_SIZE, self.size - done)
+                chunk_hasher = hashlib.sha256()
+                copied = copy_range(
+                    src.fileno(), dst.fileno(), length, done, done,
+                    progress=(lambda n, base=done: progress(base + n)) if progress else None,
+                    hasher=_HashTee(hasher, chunk_hasher))
+                if copied != length:
+                    raise OSError(f"{self.src_path} wurde während des Uploads verändert")
+                # The manifest must never list a chunk that is not on disk yet
+                os.fsync(dst.fileno())
+                self.chunks.append([done, length, chunk_hasher.hexdigest()])
+                done += length
+                self._save_manifest()
+        return hasher.hexdigest()
+
+    def finish(self):
+        """Drop the manifest once the part file has been moved into the blob store."""
+        _remove(self.manifest_path)
+
+    def discard(self):
+        _remove(self.part_path)
+        _remove(self.manifest_path)
+
+    def _resume(self):
+        """Verified length of an earlier attempt and the file hash over that prefix."""
+        hasher = hashlib.sha256()
+        manifest = load_manifest(self.manifest_path)
+        if (manifest is None or not os.path.exists(self.part_path)
+                or manifest.get('size') != self.size or manifest.get('mtime_ns') != self.mtime_ns):
+            self.discard()
+            return 0, hasher
+
+        verified = []
+        with open(self.part_path, 'rb') as part:
+            for offset, length, digest in manifest.get('chunks', []):
+                if offset != len(verified) * self.CHUNK_SIZE or length > self.CHUNK_SIZE:
+                    break
+                # Hash into a copy, a damaged chunk must not end up in the file hash
+                candidate = hasher.copy()
+                chunk_hasher = hashlib.sha256()
+                part.seek(offset)
+                remaining = length
+                while remaining:
+                    buf = part.read(min(READ_SIZE, remaining))
+                    if not buf:
+                        break
+                    candidate.update(buf)
+                    chunk_hasher.update(buf)
+                    remaining -= len(buf)
+                if remaining or chunk_hasher.hexdigest() != digest:
+                    break
+                hasher = candidate
+                verified.append([offset, length, digest])
+
+        self.chunks = verified
+        return sum(length for offset, length, digest in verified), hasher
+
+    def _save_manifest(self):
+        # Write to a temporary file first so a crash never leaves a truncated manifest
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'upload_id': self.upload_id,
+                'source': self.src_path,
+                'size': self.size,
+                'mtime_ns': self.mtime_ns,
+                'owner': self.owner,
+                'chunk_size': self.CHUNK_SIZE,
+                'chunks': self.chunks,
+                'updated_at': time.time(),
+            }, f)
+        os.replace(temp_path, self.manifest_path)
+
+
+class _HashTee:
+    def __init__(self, *hashers):
+        self.hashers = hashers
+
+    def update(self, data):
+        for hasher in self.hashers:
+            hasher.update(data)
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Upload-Manifest konnte nicht gelesen werden: {e}")
+        return None
+
+
+def pending_uploads(partial_dir, owner=None, max_age=None):
+    """
+    Manifests of unfinished uploads, optionally only those of owner.
+    Uploads not touched for max_age seconds are discarded instead.
+    """
+    if not os.path.isdir(partial_dir):
+        return []
+    now = time.time()
+    manifests = []
+    for entry in os.scandir(partial_dir):
+        if not entry.name.endswith('.json'):
+            continue
+        manifest = load_manifest(entry.path)
+        if manifest is None:
+            continue
+        if max_age is not None and now - manifest.get('updated_at', 0) > max_age:
+            _remove(entry.path[:-len('.json')] + '.part')
+            _remove(entry.path)
+            continue
+        if owner is None or manifest.get('owner') == owner:
+            manifests.append(manifest)
+    return manifests
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,47 @@
+import gzip
+import lzma
+import os
+
+# Formats that shrink well; docx, xlsx, zip, rar and the image formats are compressed already
+COMPRESSIBLE_EXTENSIONS = {'txt', 'log', 'json', 'csv', 'xml', 'md', 'doc', 'xls', 'sql', 'ini'}
+SUFFIXES = {'zlib': '.gz', 'lzma': '.xz'}
+MIN_SAVING = 0.1  # Keep the plain file unless compression saves at least this share
+
+
+def is_compressible(path):
+    return os.path.splitext(path)[1].lower().lstrip('.') in COMPRESSIBLE_EXTENSIONS
+
+
+def open_compressed(path, compression, mode='rb'):
+    """Streaming file object over a compressed blob; reads and writes uncompressed bytes."""
+    if compression == 'zlib':
+        # mtime=0 keeps the output identical for identical content
+        return gzip.GzipFile(path, mode, compresslevel=6, mtime=0)
+    if compression == 'lzma':
+        return lzma.open(path, mode, preset=6 if 'w' in mode else None)
+    raise ValueError(f"Unbekannte Kompression: {compression}")
+
+
+def compress_file(src, dst_path, compression, chunk_size, hasher=None, progress=None):
+    """
+    Compress the open file src into dst_path, chunk by chunk.
+    hasher is updated with the uncompressed bytes, progress(done) after every chunk.
+    Returns the number of uncompressed bytes.
+    """
+    done = 0
+    with open_compressed(dst_path, compression, 'wb') as dst:
+        while True:
+            buf = src.read(chunk_size)
+            if not buf:
+                break
+            if hasher:
+                hasher.update(buf)
+            dst.write(buf)
+            done += len(buf)
+            if progress:
+                progress(done)
+    return done
+
+
+def worth_it(size, stored_size):
+    return stored_size <= size * (1 - MIN_SAVING)
@@ -18,3 +18,9 @@ CALENDAR_EVENTS_COLLECTION = 'calendar_events'
 # File upload configuration
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar'}
+
+# Local client state (e.g. the chat outbox)
+LOCAL_DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+
+# Memory budget of the process-wide QPixmapCache (file type icons, thumbnails)
+PIXMAP_CACHE_LIMIT_KB = 64 * 1024
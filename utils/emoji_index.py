@@ -0,0 +1,99 @@
+import os
+import re
+from bisect import bisect_left
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources', 'emoji_index.tsv')
+
+_SHORTCODE = re.compile(r':([^:\s]+):')
+_WORD_SPLIT = re.compile(r'[_\s]+')
+
+
+class EmojiIndex:
+    """
+    Name and keyword lookup over the precomputed resources/emoji_index.tsv
+    (see scripts/build_emoji_index.py).
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.emojis = []  # emoji characters in index order
+        self.names = {}  # emoji -> english name
+        self.texts = []  # searchable text per emoji, same order as self.emojis
+        self.shortcodes = {}  # name or alias -> emoji
+        self.words = []  # sorted (word, position) for prefix lookup
+        self._load(path)
+
+    def _load(self, path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('#') or not line.strip():
+                    continue
+                char, name, aliases, german = line.rstrip('\n').split('\t')
+                position = len(self.emojis)
+                keys = [name] + aliases.split() + ([german] if german else [])
+
+                self.emojis.append(char)
+                self.names[char] = name.replace('_', ' ')
+                self.texts.append(' '.join(keys).lower().replace('_', ' '))
+                for key in keys:
+                    self.shortcodes.setdefault(key, char)
+                    for word in _WORD_SPLIT.split(key.lower()):
+                        if word:
+                            self.words.append((word, position))
+        self.words.sort()
+
+    def name(self, char):
+        return self.names.get(char, '')
+
+    def search(self, query, limit=60):
+        """Emoji whose words start with query first, then substring matches."""
+        query = query.strip().lower().replace('_', ' ')
+        if not query:
+            return []
+
+        positions = []
+        seen = set()
+        first_word = query.split()[0]
+        multi_word = first_word != query
+        pos = bisect_left(self.words, (first_word,))
+        while pos < len(self.words) and self.words[pos][0].startswith(first_word):
+            position = self.words[pos][1]
+            if position not in seen and (not multi_word or query in self.texts[position]):
+                seen.add(position)
+                positions.append(position)
+            pos += 1
+        # Word matches in picker order; substring matches follow them
+        positions.sort()
+
+        if len(positions) < limit:
+            for position, text in enumerate(self.texts):
+                if position not in seen and query in text:
+                    seen.add(position)
+                    positions.append(position)
+                    if len(positions) >= limit:
+                        break
+
+        return [self.emojis[position] for position in positions[:limit]]
+
+    def emojize(self, text):
+        """Replace :shortcodes: (names and aliases) with emoji, like emoji.emojize(language='alias')."""
+        if ':' not in text:
+            return text
+        return _SHORTCODE.sub(lambda m: self.shortcodes.get(m.group(1), m.group(0)), text)
+
+
+_index = None
+
+
+def get_emoji_index():
+    """Shared index, loaded on first use."""
+    global _index
+    if _index is None:
+        _index = EmojiIndex()
+    return _index
+
+
+def emojize(text):
+    """Shortcode replacement that only loads the index when text can contain one."""
+    if ':' not in text:
+        return text
+    return get_emoji_index().emojize(text)
@@ -0,0 +1,52 @@
+import os
+import time
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class ProgressThrottle:
+    """
+    Rate limits progress callbacks to one per interval (and always the final one).
+    The callback receives (done, total, bytes_per_second).
+    """
+
+    def __init__(self, callback, total, interval=0.25):
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = 0
+
+    def update(self, done):
+        now = time.monotonic()
+        if done < self.total and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-6)
+        self.callback(done, self.total, done / elapsed)
+
+
+def copy_range(src_fd, dst_fd, length, src_offset=0, dst_offset=0, progress=None, hasher=None):
+    """
+    Copy length bytes between file descriptors at the given offsets in CHUNK_SIZE
+    reads and writes. Every upload is hashed while it is copied, so the data passes
+    through Python anyway; large buffers keep the number of system calls low.
+    With hasher the copied data is fed to it, progress(done) is called after every chunk.
+    Returns the number of bytes copied.
+    """
+    os.lseek(src_fd, src_offset, os.SEEK_SET)
+    os.lseek(dst_fd, dst_offset, os.SEEK_SET)
+    copied = 0
+    while copied < length:
+        buf = os.read(src_fd, min(CHUNK_SIZE, length - copied))
+        if not buf:
+            break  # Source is shorter than expected
+        view = memoryview(buf)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        if hasher is not None:
+            hasher.update(buf)
+        copied += len(buf)
+        if progress:
+            progress(copied)
+    return copied
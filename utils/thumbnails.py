@@ -0,0 +1,61 @@
+import hashlib
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+IMAGE_TYPES = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'tga', 'tif', 'tiff'}
+
+
+def is_image_type(file_type):
+    return (file_type or '').lower().lstrip('.') in IMAGE_TYPES
+
+
+def render_thumbnail(src_path, dst_path, size):
+    """
+    Decode src_path and store a thumbnail of at most size x size pixels as PNG.
+    Runs in a worker process; returns dst_path, which may already exist.
+    """
+    if os.path.exists(dst_path):
+        return dst_path
+    with Image.open(src_path) as image:
+        # Lets the JPEG decoder downscale while decoding, far cheaper than a full decode
+        image.draft('RGB', (size * 2, size * 2))
+        image.thumbnail((size, size), reducing_gap=2.0)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        temp_path = f"{dst_path}.{uuid.uuid4().hex}.tmp"
+        image.save(temp_path, 'PNG', compress_level=1)
+    os.replace(temp_path, dst_path)
+    return dst_path
+
+
+class ThumbnailCache:
+    """
+    Thumbnails on disk as <root>/<ab>/<key>_<size>.png, rendered in a process pool.
+    The key is the blob hash of a file, so identical uploads share their thumbnails
+    and a thumbnail never has to be invalidated.
+    """
+    MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+    def __init__(self, root):
+        self.root = root
+        self.executor = None
+
+    @staticmethod
+    def key_for(file):
+        """Cache key of a files row; rows stored before the blob store use path and size."""
+        if file.get('blob_hash'):
+            return file['blob_hash']
+        return hashlib.sha1(f"{file.get('path')}|{file.get('size')}".encode('utf-8')).hexdigest()
+
+    def path_for(self, key, size):
+        return os.path.join(self.root, key[:2], f"{key}_{size}.png")
+
+    def submit(self, src_path, key, size):
+        """Render in the background; returns a concurrent.futures.Future of the thumbnail path."""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.MAX_WORKERS)
+        return self.executor.submit(render_thumbnail, src_path, self.path_for(key, size), size)
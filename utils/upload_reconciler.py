@@ -0,0 +1,269 @@
+import json
+import os
+import time
+from itertools import islice
+
+from utils.chunk_store import CHUNKED_SUFFIX
+from utils.compression import SUFFIXES
+
+HEX_DIGITS = set('0123456789abcdef')
+
+
+class UploadReconciler:
+    """
+    Incremental consistency check between the upload directory and the database.
+
+    Four passes, each resumable from a JSON checkpoint written after every batch:
+      disk:        walks the blob store with os.scandir and looks hashes up in batches;
+                   blobs without a file_blobs row are orphans, others may have the wrong size
+                   (chunked blobs are directories and only checked for orphans)
+      blobs:       pages through file_blobs by hash and reports rows whose blob is missing
+      legacy:      pages through files rows stored before the blob store (no blob_hash)
+      legacy_disk: files directly in the upload directory that no files row points to;
+                   one directory listing per run, checkpointed as the number of entries read
+    Only one batch of names is held in memory at a time, so millions of files are fine.
+    """
+    BATCH_SIZE = 1000
+    ORPHAN_GRACE = 24 * 3600  # Blobs are stored before their row is written; younger ones are skipped
+    MAX_EXAMPLES = 100  # Problems listed per kind in the report, the counters are complete
+    PASSES = ('disk', 'blobs', 'legacy', 'legacy_disk')
+
+    def __init__(self, db_manager, blob_store, upload_root, checkpoint_path=None):
+        self.db = db_manager
+        self.blob_store = blob_store
+        self.upload_root = upload_root
+        self.checkpoint_path = checkpoint_path or os.path.join(blob_store.root, 'reconcile.json')
+        self.state = self._load_checkpoint()
+        self.legacy_entries = None  # Open scandir iterator of the legacy_disk pass
+
+    def run(self, reclaim=False, max_batches=None):
+        """
+        Continue the current scan. With reclaim, orphaned blobs and stale temporary
+        files are deleted. max_batches bounds the work of this call; the next call
+        resumes from the checkpoint. Returns the report of the scan.
+        """
+        batches = 0
+        try:
+            while self.state['pass'] is not None:
+                if max_batches is not None and batches >= max_batches:
+                    break
+                step = getattr(self, f"_scan_{self.state['pass']}")
+                if not step(reclaim):
+                    self._next_pass()
+                batches += 1
+                self._save_checkpoint()
+        finally:
+            self._close_legacy_entries()
+
+        report = self.state['report']
+        if self.state['pass'] is None:
+            report['completed_at'] = time.time()
+            self._save_checkpoint()
+            # The next run starts a fresh scan
+            self.state = self._new_state()
+        return report
+
+    def _scan_disk(self, reclaim):
+        """One batch of blob directories; False once the blob store has been walked."""
+        names = []
+        last_dir = self.state['position']
+        for directory in self._blob_directories(last_dir):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if self._is_blob_entry(entry):
+                        names.append(entry)
+            last_dir = os.path.relpath(directory, self.blob_store.root)
+            if len(names) >= self.BATCH_SIZE:
+                break
+        else:
+            if not names:
+                self._cleanup_temp(reclaim)
+                return False
+
+        sizes = self.db.get_blob_sizes(entry.name[:64] for entry in names)
+        if sizes is None:
+            raise RuntimeError("Blob-Abfrage fehlgeschlagen")
+        now = time.time()
+        for entry in names:
+            stat = entry.stat(follow_symlinks=False)
+            digest = entry.name[:64]
+            chunked = entry.name.endswith(CHUNKED_SUFFIX)
+            if digest not in sizes:
+                if now - stat.st_mtime < self.ORPHAN_GRACE:
+                    continue
+                self._problem('orphaned', entry.name, 0 if chunked else stat.st_size)
+                if reclaim and chunked:
+                    self.state['report']['reclaimed_bytes'] += self.blob_store.remove(digest)
+                elif reclaim and self._remove(entry.path):
+                    self.state['report']['reclaimed_bytes'] += stat.st_size
+            elif not chunked and sizes[digest] != stat.st_size:
+                self._problem('size_mismatch', entry.name, stat.st_size)
+        self.state['report']['scanned'] += len(names)
+        self.state['position'] = last_dir
+        return True
+
+    def _scan_blobs(self, reclaim):
+        rows = self.db.get_blobs_after(self.state['position'], self.BATCH_SIZE)
+        if rows is None:
+            raise RuntimeError("Blob-Abfrage fehlgeschlagen")
+        # Sizes of existing blobs were compared in the disk pass already
+        for row in rows:
+            if not self.blob_store.exists(row['hash']):
+                self._problem('missing', row['hash'], row['size'])
+        if rows:
+            self.state['position'] = rows[-1]['hash']
+        return len(rows) == self.BATCH_SIZE
+
+    def _scan_legacy(self, reclaim):
+        rows = self.db.get_unhashed_files_after(self.state['position'], self.BATCH_SIZE)
+        if rows is None:
+            raise RuntimeError("Datei-Abfrage fehlgeschlagen")
+        for row in rows:
+            try:
+                size = os.stat(row['path']).st_size if row['path'] else None
+            except OSError:
+                size = None
+            if size is None:
+                self._problem('missing', f"file {row['id']}: {row['path']}", row['size'] or 0)
+            elif row['size'] is not None and size != row['size']:
+                self._problem('size_mismatch', f"file {row['id']}: {row['path']}", size)
+        if rows:
+            self.state['position'] = rows[-1]['id']
+        return len(rows) == self.BATCH_SIZE
+
+    def _scan_legacy_disk(self, reclaim):
+        # The directory is listed once per run; the checkpoint counts the entries read so far
+        read = self.state['position'] or 0
+        if isinstance(read, str):
+            read = 0  # Checkpoint of the former name based scan
+        if self.legacy_entries is None:
+            self.legacy_entries = os.scandir(self.upload_root)
+            # A resumed scan skips what earlier runs covered (listing order is stable
+            # while the directory is unchanged; the next full scan catches the rest)
+            for _ in islice(self.legacy_entries, read):
+                pass
+        names = []
+        for entry in self.legacy_entries:
+            read += 1
+            if entry.is_file(follow_symlinks=False):
+                names.append(entry.name)
+                if len(names) >= self.BATCH_SIZE:
+                    break
+        else:
+            self._close_legacy_entries()
+        if not names:
+            return False
+
+        paths = {os.path.join(self.upload_root, name): name for name in names}
+        known = self.db.get_existing_file_paths(paths)
+        if known is None:
+            raise RuntimeError("Datei-Abfrage fehlgeschlagen")
+        now = time.time()
+        for path, name in paths.items():
+            if path in known:
+                continue
+            stat = os.stat(path)
+            if now - stat.st_mtime < self.ORPHAN_GRACE:
+                continue
+            self._problem('orphaned', name, stat.st_size)
+            if reclaim and self._remove(path):
+                self.state['report']['reclaimed_bytes'] += stat.st_size
+        self.state['report']['scanned'] += len(names)
+        self.state['position'] = read
+        return len(names) == self.BATCH_SIZE
+
+    def _close_legacy_entries(self):
+        if self.legacy_entries is not None:
+            self.legacy_entries.close()
+            self.legacy_entries = None
+
+    def _blob_directories(self, after):
+        """Leaf directories <root>/<ab>/<cd> in sorted order, starting behind after."""
+        for top in self._hex_subdirs(self.blob_store.root):
+            for leaf in self._hex_subdirs(os.path.join(self.blob_store.root, top)):
+                relative = os.path.join(top, leaf)
+                if after and relative <= after:
+                    continue
+                yield os.path.join(self.blob_store.root, relative)
+
+    @staticmethod
+    def _is_blob_entry(entry):
+        """<sha256>, <sha256>.gz / .xz for compressed blobs, or a <sha256>.chunks directory."""
+        if len(entry.name) < 64:
+            return False
+        if entry.name[64:] == CHUNKED_SUFFIX:
+            return entry.is_dir(follow_symlinks=False)
+        return entry.name[64:] in ('', *SUFFIXES.values()) and entry.is_file(follow_symlinks=False)
+
+    @staticmethod
+    def _hex_subdirs(path):
+        try:
+            with os.scandir(path) as entries:
+                names = [entry.name for entry in entries
+                         if entry.is_dir(follow_symlinks=False) and len(entry.name) == 2
+                         and set(entry.name) <= HEX_DIGITS]
+        except FileNotFoundError:
+            return []
+        return sorted(names)
+
+    def _cleanup_temp(self, reclaim):
+        """Temporary files of uploads that died before their rename into the store."""
+        now = time.time()
+        try:
+            with os.scandir(self.blob_store.temp_dir) as entries:
+                for entry in entries:
+                    stat = entry.stat(follow_symlinks=False)
+                    if not entry.is_file(follow_symlinks=False) or now - stat.st_mtime < self.ORPHAN_GRACE:
+                        continue
+                    self._problem('stale_temp', entry.name, stat.st_size)
+                    if reclaim and self._remove(entry.path):
+                        self.state['report']['reclaimed_bytes'] += stat.st_size
+        except FileNotFoundError:
+            pass
+
+    def _problem(self, kind, name, size):
+        counts = self.state['report']['problems'].setdefault(kind, {'count': 0, 'bytes': 0, 'examples': []})
+        counts['count'] += 1
+        counts['bytes'] += size or 0
+        if len(counts['examples']) < self.MAX_EXAMPLES:
+            counts['examples'].append(name)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError as e:
+            print(f"Datei konnte nicht gelöscht werden: {e}")
+            return False
+
+    def _next_pass(self):
+        index = self.PASSES.index(self.state['pass']) + 1
+        self.state['pass'] = self.PASSES[index] if index < len(self.PASSES) else None
+        self.state['position'] = None
+
+    def _new_state(self):
+        return {
+            'pass': self.PASSES[0],
+            'position': None,
+            'report': {'started_at': time.time(), 'scanned': 0, 'reclaimed_bytes': 0, 'problems': {}},
+        }
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('pass') in self.PASSES:
+                return state
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Checkpoint konnte nicht gelesen werden: {e}")
+        return self._new_state()
+
+    def _save_checkpoint(self):
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.checkpoint_path)
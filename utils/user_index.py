@@ -0,0 +1,271 @@
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+
+_WORD_SPLIT = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    """Lowercase and strip accents so 'Jörg' matches 'jorg'."""
+    text = unicodedata.normalize('NFKD', str(text or '')).casefold()
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Damerau-Levenshtein distance, or max_distance + 1 once it is exceeded.
+    Only the band of cells within max_distance of the diagonal is computed.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if a == b:
+        return 0
+    limit = max_distance + 1
+    previous2 = None
+    previous = [j if j < limit else limit for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        current = [limit] * (len(b) + 1)
+        if i < limit:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cb = b[j - 1]
+            d = previous[j - 1] + (ca != cb)
+            if previous[j] + 1 < d:
+                d = previous[j] + 1
+            if current[j - 1] + 1 < d:
+                d = current[j - 1] + 1
+            if previous2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb and previous2[j - 2] + 1 < d:
+                d = previous2[j - 2] + 1
+            if d > limit:
+                d = limit
+            current[j] = d
+            if d < row_min:
+                row_min = d
+        if row_min > max_distance:
+            return limit
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class UserSearchIndex:
+    """
+    In-memory typeahead index over users.
+    Results are ranked: exact username, username prefix, word prefix in any
+    field, substring in any field, and finally fuzzy (typo tolerant) username
+    matches. Within a rank users are ordered by username.
+    """
+    FIELDS = ('username', 'email', 'role', 'position', 'department', 'location')
+    MAX_GRAM = 3
+    FUZZY_THRESHOLD = 10  # Run the fuzzy stage when fewer results than this were found
+    FUZZY_PREFIX = 8  # Typos are matched against the start of the username
+    FUZZY_CANDIDATES = 64  # Edit distance is computed for at most this many username prefixes
+
+    def __init__(self, users=()):
+        self.rebuild(users)
+
+    def rebuild(self, users):
+        self.users = {}
+        self.names = {}  # user_id -> normalized username
+        self.texts = {}  # user_id -> normalized searchable text
+        self.name_keys = []  # sorted (username, user_id)
+        self.word_keys = []  # sorted (word, user_id) over all fields
+        self.grams = {}  # n-gram (1..MAX_GRAM) -> set of user_ids
+        self.prefix_users = {}  # username[:FUZZY_PREFIX] -> set of user_ids
+        self.prefix_bigrams = {}  # '^'-padded bigram -> set of username prefixes
+        for user in users:
+            self.add(user, keep_sorted=False)
+        self.name_keys.sort()
+        self.word_keys.sort()
+
+    def __len__(self):
+        return len(self.users)
+
+    def get(self, user_id):
+        return self.users.get(user_id)
+
+    def find_by_username(self, username):
+        name = normalize(username)
+        pos = bisect_left(self.name_keys, (name,))
+        if pos < len(self.name_keys) and self.name_keys[pos][0] == name:
+            return self.users[self.name_keys[pos][1]]
+        return None
+
+    def all_users(self):
+        """All users ordered by username."""
+        return [self.users[user_id] for _, user_id in self.name_keys]
+
+    def add(self, user, keep_sorted=True):
+        user_id = user['id']
+        if user_id in self.users:
+            self.remove(user_id)
+
+        name = normalize(user.get('username'))
+        text = '\n'.join(normalize(user.get(field)) for field in self.FIELDS if user.get(field))
+
+        self.users[user_id] = dict(user)
+        self.names[user_id] = name
+        self.texts[user_id] = text
+        # rebuild() appends and sorts once at the end
+        add_key = insort if keep_sorted else list.append
+        add_key(self.name_keys, (name, user_id))
+        for word in self._words(text):
+            add_key(self.word_keys, (word, user_id))
+        for gram in self._grams(text):
+            self.grams.setdefault(gram, set()).add(user_id)
+        prefix = name[:self.FUZZY_PREFIX]
+        if prefix not in self.prefix_users:
+            self.prefix_users[prefix] = set()
+            for bigram in self._bigrams(prefix):
+                self.prefix_bigrams.setdefault(bigram, set()).add(prefix)
+        self.prefix_users[prefix].add(user_id)
+
+    def update(self, user):
+        """Apply changed fields of an indexed user (matched by id)."""
+        current = self.users.get(user['id'], {})
+        self.add({**current, **user})
+
+    def remove(self, user_id):
+        if user_id not in self.users:
+            return
+        name = self.names.pop(user_id)
+        text = self.texts.pop(user_id)
+        del self.users[user_id]
+
+        self._remove_key(self.name_keys, (name, user_id))
+        for word in self._words(text):
+            self._remove_key(self.word_keys, (word, user_id))
+        for gram in self._grams(text):
+            self._discard(self.grams, gram, user_id)
+        prefix = name[:self.FUZZY_PREFIX]
+        self._discard(self.prefix_users, prefix, user_id)
+        if prefix not in self.prefix_users:
+            for bigram in self._bigrams(prefix):
+                self._discard(self.prefix_bigrams, bigram, prefix)
+
+    def search(self, query, limit=None, exclude=(), fuzzy=True):
+        """Return matching users, best matches first."""
+        query = normalize(query).strip()
+        if not query:
+            users = [u for u in self.all_users() if u['id'] not in exclude]
+            return users[:limit] if limit else users
+
+        results = []
+        seen = set(exclude)
+
+        def collect(user_ids):
+            for user_id in user_ids:
+                if user_id not in seen:
+                    seen.add(user_id)
+                    results.append(user_id)
+                    if limit and len(results) >= limit:
+                        return True
+            return False
+
+        # Exact username and username prefix
+        if collect(self._prefix(self.name_keys, query)):
+            return self._users(results)
+
+        # Prefix of any word in any field
+        if collect(self._prefix(self.word_keys, query)):
+            return self._users(results)
+
+        # Substring anywhere
+        if collect(self._substring(query, seen)):
+            return self._users(results)
+
+        # Typo tolerant username matches
+        if fuzzy and len(query) >= 3 and len(results) < (limit or self.FUZZY_THRESHOLD):
+            collect(self._fuzzy(query, seen))
+
+        return self._users(results)
+
+    def _users(self, user_ids):
+        return [self.users[user_id] for user_id in user_ids]
+
+    def _prefix(self, keys, query):
+        # An exact match sorts before every longer key with the same prefix
+        pos = bisect_left(keys, (query,))
+        while pos < len(keys) and keys[pos][0].startswith(query):
+            yield keys[pos][1]
+            pos += 1
+
+    def _substring(self, query, seen):
+        """Yield users containing query, ordered by username."""
+        if len(query) <= self.MAX_GRAM:
+            candidates = self.grams.get(query, set())
+            verify = False
+        else:
+            postings = []
+            for i in range(len(query) - self.MAX_GRAM + 1):
+                posting = self.grams.get(query[i:i + self.MAX_GRAM])
+                if not posting:
+                    return
+                postings.append(posting)
+            postings.sort(key=len)
+            candidates = postings[0].intersection(*postings[1:])
+            verify = True
+
+        if len(candidates) * 4 < len(self.name_keys):
+            ordered = sorted(candidates - seen, key=self.names.__getitem__)
+        else:
+            # Most users match: walk the sorted names so a limit stops early
+            ordered = (user_id for _, user_id in self.name_keys
+                       if user_id in candidates and user_id not in seen)
+        for user_id in ordered:
+            if not verify or query in self.texts[user_id]:
+                yield user_id
+
+    def _fuzzy(self, query, seen):
+        # Distances are computed once per distinct username prefix
+        query = query[:self.FUZZY_PREFIX]
+        max_distance = 1 if len(query) <= 5 else 2
+        bigrams = self._bigrams(query)
+        counts = Counter()
+        for bigram in bigrams:
+            counts.update(self.prefix_bigrams.get(bigram, ()))
+
+        # An edit destroys up to three bigrams (a transposition ab -> ba breaks xa, ab and by)
+        min_shared = max(1, len(bigrams) - 3 * max_distance)
+        matches = []
+        for prefix, shared in counts.most_common(self.FUZZY_CANDIDATES):
+            if shared < min_shared:
+                break
+            distance = edit_distance(query, prefix[:len(query)], max_distance)
+            if distance <= max_distance:
+                for user_id in self.prefix_users[prefix]:
+                    if user_id not in seen:
+                        matches.append((distance, self.names[user_id], user_id))
+        matches.sort()
+        return [user_id for _, _, user_id in matches]
+
+    def _words(self, text):
+        words = set(_WORD_SPLIT.split(text))
+        words.discard('')
+        return words
+
+    def _grams(self, text):
+        grams = set()
+        for part in text.split('\n'):
+            for n in range(1, self.MAX_GRAM + 1):
+                for i in range(len(part) - n + 1):
+                    grams.add(part[i:i + n])
+        return grams
+
+    def _bigrams(self, text):
+        padded = '^' + text
+        return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+    def _remove_key(self, keys, key):
+        pos = bisect_left(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            del keys[pos]
+
+    def _discard(self, postings, key, user_id):
+        posting = postings.get(key)
+        if posting is not None:
+            posting.discard(user_id)
+            if not posting:
+                del postings[key]